@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import subprocess  # nosec B404
+import sys
+import tempfile
+import time
+
+# subcommand arguments, the top-level packages it must not import and whether it runs as on GNOME
+COMMANDS = {
+    "random": (["random"], {"requests", "PIL", "asyncio", "gi"}, False),
+    "random --pinned": (["random", "--pinned"], {"requests", "PIL", "asyncio", "gi"}, False),
+    "random (GNOME)": (["random"], {"requests", "PIL", "asyncio"}, True),
+    "download --help": (["download", "--help"], {"requests", "PIL", "asyncio", "gi"}, False),
+    "slideshow --help": (["slideshow", "--help"], {"requests", "PIL", "asyncio", "gi"}, False),
+    "library": (["library"], {"requests", "PIL", "asyncio", "gi"}, False),
+}
+# cumulative import time allowed for any of the commands above, gi comes on top of it on GNOME
+DEFAULT_BUDGET_MS = 150
+DEFAULT_GI_BUDGET_MS = 100
+# one library image whose recorded size matches the monitor, so setting it needs no rendition
+SEED_SCRIPT = """
+import os
+from wallgarden import store, wallpaper
+from wallgarden.config import IMAGE_DIR_PATH, ensure_data_dirs
+ensure_data_dirs()
+path = os.path.join(IMAGE_DIR_PATH, "seed.png")
+open(path, "wb").close()
+width, height = wallpaper.get_monitor_resolutions()
+store.update_image_properties(path, width=width, height=height)
+"""
+
+
+def parse_importtime(stderr):
+    # lines look like "import time:  self [us] | cumulative | imported package"
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = int(self_us)
+    return modules
+
+
+def get_environment(home, gnome):
+    environment = dict(os.environ, HOME=home, XDG_CACHE_HOME=os.path.join(home, ".cache"))
+    if gnome:
+        # the real in-process Gio.Settings write, against a backend that never reaches dconf
+        environment.update(XDG_CURRENT_DESKTOP="GNOME", GSETTINGS_BACKEND="memory")
+    else:
+        environment.pop("XDG_CURRENT_DESKTOP", None)
+    return environment
+
+
+def seed_library(home):
+    subprocess.run([sys.executable, "-c", SEED_SCRIPT], env=get_environment(home, gnome=False), check=True)  # nosec B603
+
+
+def measure(arguments, home, gnome=False):
+    environment = get_environment(home, gnome)
+    start = time.perf_counter()
+    result = subprocess.run(  # nosec B603
+        [sys.executable, "-X", "importtime", "-m", "wallgarden.cli", *arguments], env=environment, capture_output=True, text=True
+    )
+    wall_s = time.perf_counter() - start
+    return wall_s, parse_importtime(result.stderr)
+
+
+def run(repeat=3):
+    results = []
+    with tempfile.TemporaryDirectory() as home:
+        seed_library(home)
+        for command, (arguments, forbidden, gnome) in COMMANDS.items():
+            best_wall_s, best_modules = None, None
+            for _ in range(repeat):
+                wall_s, modules = measure(arguments, home, gnome)
+                if best_wall_s is None or wall_s < best_wall_s:
+                    best_wall_s, best_modules = wall_s, modules
+            top_level = {name.split(".")[0] for name in best_modules}
+            results.append(
+                {
+                    "command": command,
+                    "wall_s": best_wall_s,
+                    "import_ms": sum(us for name, us in best_modules.items() if name.split(".")[0] != "gi") / 1000,
+                    "gi_ms": sum(us for name, us in best_modules.items() if name.split(".")[0] == "gi") / 1000,
+                    "modules": len(best_modules),
+                    "forbidden": sorted(top_level & forbidden),
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure wallgardenc import cost per subcommand.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--gi-budget-ms", type=float, default=DEFAULT_GI_BUDGET_MS)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    failures = [r for r in results if r["forbidden"] or r["import_ms"] > args.budget_ms or r["gi_ms"] > args.gi_budget_ms]
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        print(f"{'command':<18} {'wall':>8} {'imports':>9} {'gi':>9} {'modules':>8}  forbidden")
+        for r in results:
+            print(
+                f"{r['command']:<18} {r['wall_s']:>7.3f}s {r['import_ms']:>7.1f}ms {r['gi_ms']:>7.1f}ms {r['modules']:>8}  {', '.join(r['forbidden'])}"
+            )
+    if failures:
+        raise SystemExit(f"{len(failures)} commands over the {args.budget_ms}ms (gi {args.gi_budget_ms}ms) budget or importing forbidden modules")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import time
+from io import BytesIO
+
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+
+from wallgarden.core import scale_and_crop
+
+SOURCE_SIZES = [(2800, 1800), (4032, 3024), (6000, 4000), (8256, 5504), (10000, 6500)]
+TARGET_RESOLUTION = (2560, 1440)
+# mean absolute difference per channel, out of 255
+TOLERANCE = 2.0
+# sources at least this many times the target on both sides can be drafted and must get faster
+DRAFT_FACTOR = 2
+MIN_DRAFT_SPEEDUP = 1.5
+
+
+def reference_scale_and_crop(image, target_resolution):
+    # scale_and_crop before the draft/box resize path, kept for comparison
+    img_width, img_height = image.size
+    target_width, target_height = target_resolution
+    if img_width < target_width or img_height < target_height:
+        return None
+    scale_factor = max(target_width / img_width, target_height / img_height)
+    new_size = (int(img_width * scale_factor), int(img_height * scale_factor))
+    image = image.resize(new_size, Image.Resampling.LANCZOS)
+    left = (image.width - target_width) / 2
+    top = (image.height - target_height) / 2
+    right = (image.width + target_width) / 2
+    bottom = (image.height + target_height) / 2
+    return image.crop((left, top, right, bottom))
+
+
+def make_source(size):
+    gradient = Image.linear_gradient("L").resize(size)
+    # blurred noise gives photo-like detail without an unrealistic amount of high frequencies
+    noise = Image.effect_noise(size, 48).filter(ImageFilter.GaussianBlur(2))
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def time_function(function, source, target_resolution, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        image = Image.open(BytesIO(source))
+        start = time.perf_counter()
+        result = function(image, target_resolution)
+        result.load()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def mean_difference(a, b):
+    return max(ImageStat.Stat(ImageChops.difference(a.convert("RGB"), b.convert("RGB"))).mean)
+
+
+def run(repeat=3, target_resolution=TARGET_RESOLUTION):
+    results = []
+    for size in SOURCE_SIZES:
+        source = make_source(size)
+        reference_time, reference = time_function(reference_scale_and_crop, source, target_resolution, repeat)
+        fast_time, fast = time_function(scale_and_crop, source, target_resolution, repeat)
+        results.append(
+            {
+                "source": f"{size[0]}x{size[1]}",
+                "reference_s": reference_time,
+                "scale_and_crop_s": fast_time,
+                "speedup": reference_time / fast_time,
+                "mean_diff": mean_difference(reference, fast),
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare scale_and_crop against the original resize-then-crop implementation.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    errors = []
+    print(f"{'source':>10} {'reference':>10} {'current':>10} {'speedup':>8} {'diff':>6}")
+    for size, result in zip(SOURCE_SIZES, run(args.repeat)):
+        if result["mean_diff"] > TOLERANCE:
+            errors.append(f"{result['source']} differs from the reference by {result['mean_diff']:.2f}, over {TOLERANCE}")
+        draftable = all(side >= DRAFT_FACTOR * target for side, target in zip(size, TARGET_RESOLUTION))
+        if draftable and result["speedup"] < MIN_DRAFT_SPEEDUP:
+            errors.append(f"{result['source']} is only {result['speedup']:.2f}x faster, under {MIN_DRAFT_SPEEDUP}x")
+        print(
+            f"{result['source']:>10} {result['reference_s']:>9.3f}s {result['scale_and_crop_s']:>9.3f}s "
+            f"{result['speedup']:>7.2f}x {result['mean_diff']:>6.2f}"
+        )
+    if errors:
+        raise SystemExit("\n".join(errors))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+from benchmarks.stand_in import DEFAULT_IMAGE_SIZE, StandInServer, make_listing
+
+# wallgarden reads its paths and the reddit url from the environment at import time, so
+# every stage imports it lazily, after run() has pointed it at a temporary home and the stand-in
+STAGES = ("parse_reddit", "scale_and_crop", "store", "random_image", "thumbnails", "end_to_end")
+TARGET_RESOLUTION = (2560, 1440)
+SOURCE_SIZES = [(2800, 1800), (4032, 3024), (6000, 4000), (8256, 5504)]
+
+
+def parse_size(value):
+    width, _, height = value.partition("x")
+    return int(width), int(height)
+
+
+def best_of(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_parse_reddit(args):
+    from wallgarden.core import parse_reddit
+
+    results = {}
+    for posts in (100, 1000, 10000):
+        listing = make_listing("http://127.0.0.1", posts=posts, image_size=args.image_size)
+        results[f"{posts}_posts_s"] = best_of(lambda: parse_reddit(listing, TARGET_RESOLUTION), args.repeat)
+    return results
+
+
+def bench_scale_and_crop(args):
+    from benchmarks.bench_scale_and_crop import make_source
+    from wallgarden.core import scale_and_crop
+
+    results = {}
+    for size in SOURCE_SIZES:
+        source = make_source(size)
+
+        def run():
+            with Image.open(BytesIO(source)) as image:
+                scale_and_crop(image, TARGET_RESOLUTION).load()
+
+        results[f"{size[0]}x{size[1]}_s"] = best_of(run, args.repeat)
+    return results
+
+
+def bench_store(args):
+    from wallgarden import store
+    from wallgarden.config import IMAGE_DIR_PATH
+    from wallgarden.core import load_image_properties, update_image_properties
+
+    paths = [os.path.join(IMAGE_DIR_PATH, f"store_{index}.png") for index in range(args.store_size)]
+    start = time.perf_counter()
+    store.add_images(paths)
+    add_s = time.perf_counter() - start
+    load_s = best_of(load_image_properties, args.repeat)
+    sample = random.sample(paths, min(1000, len(paths)))  # nosec B311
+    start = time.perf_counter()
+    for path in sample:
+        update_image_properties(path, pinned=random.random() < 0.2)  # nosec B311
+    update_s = (time.perf_counter() - start) / len(sample)
+    return {"entries": len(paths), "add_images_s": add_s, "load_image_properties_s": load_s, "update_image_properties_s": update_s}
+
+
+def bench_random_image(args):
+    from wallgarden import store
+    from wallgarden.wallpaper import get_random_image, get_random_pinned_image
+
+    results = {"entries": len(store.find_images({}))}
+    for name, function in (("get_random_image", get_random_image), ("get_random_pinned_image", get_random_pinned_image)):
+        start = time.perf_counter()
+        first = function()
+        results[f"{name}_first_s"] = time.perf_counter() - start
+        draws = 1000
+        start = time.perf_counter()
+        for _ in range(draws):
+            image_path = function()
+            if image_path:
+                store.set_current_image(image_path)
+        results[f"{name}_s"] = (time.perf_counter() - start) / draws
+        results[f"{name}_found"] = first is not None
+    return results
+
+
+def bench_thumbnails(args):
+    # load_thumbnails without the GTK side: ensure_thumbnail on the GUI's worker pool,
+    # first against an empty thumbnail cache and then against the filled one
+    from wallgarden.config import IMAGE_DIR_PATH, ensure_data_dirs
+    from wallgarden.thumbnails import ensure_thumbnail
+
+    ensure_data_dirs()
+    image = Image.linear_gradient("L").convert("RGB").resize((1920, 1080))
+    paths = []
+    for index in range(args.library_size):
+        path = os.path.join(IMAGE_DIR_PATH, f"library_{index}.jpg")
+        image.save(path, "JPEG", quality=85)
+        paths.append(path)
+
+    def load():
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
+            list(executor.map(ensure_thumbnail, paths))
+
+    start = time.perf_counter()
+    load()
+    cold_s = time.perf_counter() - start
+    return {"images": len(paths), "cold_s": cold_s, "warm_s": best_of(load, args.repeat)}
+
+
+def bench_end_to_end(args, server):
+    from wallgarden import core
+
+    # every run must save a new image, an exists or duplicate result would skip the decode and encode
+    statuses = []
+    save_reddit_image = core.save_reddit_image
+
+    def record_status(*args, **kwargs):
+        status, image_path = save_reddit_image(*args, **kwargs)
+        statuses.append(status)
+        return status, image_path
+
+    results = {}
+    requests_before = dict(server.requests)
+    core.save_reddit_image = record_status
+    try:
+        for phase in ("cold", "cached_listing"):
+            timings = []
+            for run in range(args.downloads):
+                # the second phase draws untried posts of the first phase from the candidate index, no listing is queried
+                subreddit = f"bench{run}"
+                start = time.perf_counter()
+                image_path = core.get_random_reddit_image(subreddit, "top", "day", args.posts, core.DEFAULT_RESOLUTION)
+                timings.append(time.perf_counter() - start)
+                if not image_path:
+                    raise SystemExit(f"get_random_reddit_image found nothing on {server.base_url}")
+                if statuses[-1] != core.DownloadStatus.saved:
+                    raise SystemExit(f"get_random_reddit_image returned {image_path} as {statuses[-1].value}, not saved")
+            results[f"{phase}_mean_s"] = sum(timings) / len(timings)
+            results[f"{phase}_max_s"] = max(timings)
+    finally:
+        core.save_reddit_image = save_reddit_image
+    results["listing_requests"] = server.requests["listing"] - requests_before["listing"]
+    results["image_requests"] = server.requests["image"] - requests_before["image"]
+    return results
+
+
+def run(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as home, StandInServer(args.latency_ms / 1000, args.posts, args.image_size) as server:
+        os.environ.update(HOME=home, XDG_CACHE_HOME=os.path.join(home, ".cache"), WALLGARDEN_REDDIT_URL=server.base_url)
+        # never touch the real desktop settings
+        os.environ.pop("XDG_CURRENT_DESKTOP", None)
+        for stage in args.stages:
+            if stage == "end_to_end":
+                results[stage] = bench_end_to_end(args, server)
+            else:
+                results[stage] = globals()[f"bench_{stage}"](args)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the wallgarden benchmarks offline against a local reddit stand-in.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Delay the stand-in adds to every response")
+    parser.add_argument("--image-size", type=parse_size, default=DEFAULT_IMAGE_SIZE, help="Size of the served images, WIDTHxHEIGHT")
+    parser.add_argument("--posts", type=int, default=25, help="Posts per stand-in listing")
+    parser.add_argument("--downloads", type=int, default=3, help="End-to-end downloads per phase")
+    parser.add_argument("--store-size", type=int, default=10000)
+    parser.add_argument("--library-size", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = {
+        "started": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "parameters": {k: v for k, v in vars(args).items() if k not in ("json", "output")},
+        "results": run(args),
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        for stage, metrics in results["results"].items():
+            for metric, value in metrics.items():
+                print(f"{stage:<14} {metric:<34} {value:.6f}" if isinstance(value, float) else f"{stage:<14} {metric:<34} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from PIL import Image, ImageFilter
+
+LISTING_PATTERN = re.compile(r"^/r/(?P<subreddit>[\w-]+)/(?P<sort>\w+)\.json$")
+IMAGE_PATTERN = re.compile(r"^/images/(?P<subreddit>[\w-]+)/(?P<post>\d+)\.jpg$")
+DEFAULT_POSTS = 100
+DEFAULT_IMAGE_SIZE = (3840, 2160)
+LAYOUT_SIZE = (12, 9)
+
+
+def make_jpeg(size, seed=0):
+    # a random coarse layout of light and dark areas under blurred noise: the layout gives every
+    # post its own dHash, so none is dropped as a near duplicate, the noise keeps the decode realistic
+    rng = random.Random(seed)  # nosec B311
+    layout = Image.new("L", LAYOUT_SIZE)
+    layout.putdata([rng.randrange(256) for _ in range(LAYOUT_SIZE[0] * LAYOUT_SIZE[1])])
+    layout = layout.resize(size, Image.Resampling.BICUBIC)
+    noise = Image.effect_noise(size, 32 + seed % 32).filter(ImageFilter.GaussianBlur(2))
+    image = Image.merge("RGB", (layout, noise, layout.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def make_post(base_url, subreddit, index, image_size):
+    width, height = image_size
+    return {
+        "kind": "t3",
+        "data": {
+            "name": f"t3_{index:x}",
+            "subreddit": subreddit,
+            "url": f"{base_url}/images/{subreddit}/{index}.jpg",
+            "permalink": f"/r/{subreddit}/comments/{index:x}/{subreddit}_post_{index}/",
+            "preview": {"images": [{"source": {"url": f"{base_url}/images/{subreddit}/{index}.jpg", "width": width, "height": height}}]},
+        },
+    }
+
+
+def make_listing(base_url, subreddit="wallpapers", posts=DEFAULT_POSTS, image_size=DEFAULT_IMAGE_SIZE, start=0):
+    children = [make_post(base_url, subreddit, index, image_size) for index in range(start, start + posts)]
+    return {"kind": "Listing", "data": {"after": f"t3_{start + posts:x}", "children": children}}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # noqa: N802
+        server = self.server
+        time.sleep(server.latency_s)
+        path, _, query = self.path.partition("?")
+        server.count_request(path)
+        listing_match = LISTING_PATTERN.match(path)
+        image_match = IMAGE_PATTERN.match(path)
+        if listing_match:
+            parameters = dict(item.partition("=")[::2] for item in query.split("&") if item)
+            posts = min(int(parameters.get("limit") or server.posts), server.posts)
+            listing = make_listing(server.base_url, listing_match.group("subreddit"), posts, server.image_size)
+            self.send_body(json.dumps(listing).encode(), "application/json")
+        elif image_match:
+            self.send_body(server.get_image(image_match.group("subreddit"), int(image_match.group("post"))), "image/jpeg")
+        else:
+            self.send_error(404)
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    # serves synthetic reddit listings and the images they point to on 127.0.0.1
+    daemon_threads = True
+
+    def __init__(self, latency_s=0.0, posts=DEFAULT_POSTS, image_size=DEFAULT_IMAGE_SIZE):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.latency_s = latency_s
+        self.posts = posts
+        self.image_size = image_size
+        self.requests = {"listing": 0, "image": 0}
+        self._images = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self, path):
+        with self._lock:
+            self.requests["listing" if path.endswith(".json") else "image"] += 1
+
+    def get_image(self, subreddit, post):
+        key = f"{subreddit}/{post}"
+        with self._lock:
+            image = self._images.get(key)
+        if image is None:
+            image = make_jpeg(self.image_size, zlib.crc32(key.encode()))
+            with self._lock:
+                image = self._images.setdefault(key, image)
+        return image
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,7 @@
+#!/bin/bash
+set -euxo pipefail
+
+# offline benchmarks, results land in benchmark-results.json for regression tracking
+poetry run python -m benchmarks.bench_scale_and_crop
+poetry run python -m benchmarks.bench_cli_startup
+poetry run python -m benchmarks.bench_suite --output benchmark-results.json ${@-}
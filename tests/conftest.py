@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import tempfile
+
+# config resolves its paths from HOME at import time, so the whole session gets a scratch home
+# before any wallgarden module is imported
+_home = tempfile.mkdtemp(prefix="wallgarden-tests-")
+os.environ["HOME"] = _home
+os.environ["XDG_CACHE_HOME"] = os.path.join(_home, ".cache")
+
+import pytest  # noqa: E402
+
+from wallgarden import store  # noqa: E402
+
+
+def close_connection():
+    connection = getattr(store._local, "connection", None)
+    if connection is not None:
+        connection.close()
+        store._local.connection = None
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # a fresh database per test, opened lazily by store.get_connection
+    close_connection()
+    monkeypatch.setattr(store, "DB_PATH", str(tmp_path / "wallgarden.db"))
+    monkeypatch.setattr(store, "JSON_PATH", str(tmp_path / "wallgarden.json"))
+    yield tmp_path
+    close_connection()
+
+
+@pytest.fixture
+def create_database(db):
+    # builds a database as an older release left it, at the given schema version, seed(connection)
+    # adds rows in that version's schema; the next store.get_connection upgrades it
+    def create(version, seed=None):
+        connection = sqlite3.connect(store.DB_PATH, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        for script in store.MIGRATIONS[:version]:
+            for statement in script.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+        connection.execute(f"PRAGMA user_version = {version}")
+        if seed:
+            seed(connection)
+        connection.close()
+
+    return create
+
+
+@pytest.fixture
+def library(db, monkeypatch):
+    # scratch image, original and rendition directories for every module that reads them at import
+    from wallgarden import budget, core, library, wallpaper
+
+    paths = {name: str(db / name) for name in ("images", "original_images", "renditions")}
+    for path in paths.values():
+        os.makedirs(path)
+    for module in (budget, core, library):
+        monkeypatch.setattr(module, "IMAGE_DIR_PATH", paths["images"], raising=False)
+        monkeypatch.setattr(module, "ORIGINAL_IMAGE_DIR_PATH", paths["original_images"], raising=False)
+    for module in (budget, library, wallpaper):
+        monkeypatch.setattr(module, "RENDITION_DIR_PATH", paths["renditions"])
+    return paths
@@ -0,0 +1,108 @@
+import os
+
+from wallgarden import budget, store
+
+
+def write_file(path, size, mtime):
+    with open(path, "wb") as file:
+        file.write(b"\0" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def add_image(library, title, mtime, size=100):
+    path = write_file(os.path.join(library["images"], f"{title}.png"), size, mtime)
+    store.add_images([path])
+    return path
+
+
+def test_hidden_then_oldest_images_are_evicted(library):
+    old = add_image(library, "old", 1000)
+    hidden = add_image(library, "hidden", 3000)
+    new = add_image(library, "new", 2000)
+    store.update_image_properties(hidden, hidden=True)
+
+    evicted = budget.enforce_budgets(image_budget=150, original_budget=0)
+
+    assert evicted == [hidden, old]
+    assert os.listdir(library["images"]) == ["new.png"]
+    assert set(store.load_image_properties()) == {new}
+
+
+def test_pinned_current_and_kept_images_are_protected(library):
+    pinned = add_image(library, "pinned", 1000)
+    current = add_image(library, "current", 1100)
+    kept = add_image(library, "kept", 1200)
+    store.update_image_properties(pinned, pinned=True)
+    store.set_current_image(current)
+
+    assert budget.enforce_budgets(image_budget=1, original_budget=0, keep=(kept,)) == []
+
+
+def test_renditions_and_originals_go_with_their_image(library):
+    image = add_image(library, "a", 1000)
+    add_image(library, "b", 2000)
+    rendition_dir = os.path.join(library["renditions"], "1920x1080")
+    os.makedirs(rendition_dir)
+    rendition = write_file(os.path.join(rendition_dir, "a.png"), 50, 1000)
+    original = write_file(os.path.join(library["original_images"], "a.original.jpg"), 500, 1000)
+
+    evicted = budget.enforce_budgets(image_budget=100, original_budget=0)
+
+    assert evicted == [image, original]
+    assert not os.path.exists(rendition)
+
+
+def test_orphaned_originals_are_evicted_first(library):
+    add_image(library, "a", 1000)
+    owned = write_file(os.path.join(library["original_images"], "a.original.jpg"), 100, 1000)
+    orphan = write_file(os.path.join(library["original_images"], "gone.original.jpg"), 100, 2000)
+
+    assert budget.enforce_budgets(image_budget=0, original_budget=150) == [orphan]
+    assert os.path.exists(owned)
+
+
+def test_dry_run_removes_nothing(library):
+    image = add_image(library, "a", 1000)
+
+    assert budget.enforce_budgets(image_budget=1, original_budget=0, dry_run=True) == [image]
+    assert os.path.exists(image)
+    assert image in store.load_image_properties()
+
+
+def test_scan_is_skipped_while_the_totals_are_within_budget(library, monkeypatch):
+    add_image(library, "a", 1000)
+    assert budget.enforce_budgets(image_budget=1000, original_budget=1000) == []
+    assert store.get_disk_usage() == {"images": 100, "originals": 0}
+
+    def scan_library():
+        raise AssertionError("scanned")
+
+    monkeypatch.setattr(budget, "scan_library", scan_library)
+    image = add_image(library, "b", 2000)
+    budget.record_image(image)
+
+    assert budget.enforce_budgets(image_budget=1000, original_budget=1000) == []
+    assert store.get_disk_usage() == {"images": 200, "originals": 0}
+
+
+def test_recorded_image_over_budget_triggers_eviction(library):
+    old = add_image(library, "old", 1000)
+    budget.enforce_budgets(image_budget=250, original_budget=0)
+    new = add_image(library, "new", 2000, size=200)
+    write_file(os.path.join(library["original_images"], "new.original.jpg"), 50, 2000)
+    budget.record_image(new)
+
+    assert budget.enforce_budgets(image_budget=250, original_budget=0, keep=(new,)) == [old]
+    assert store.get_disk_usage() == {"images": 200, "originals": 50}
+
+
+def test_totals_are_recounted_after_invalidation(library):
+    add_image(library, "a", 1000)
+    budget.enforce_budgets(image_budget=1000, original_budget=0)
+    add_image(library, "b", 2000)
+    budget.invalidate_usage()
+
+    budget.enforce_budgets(image_budget=1000, original_budget=0)
+
+    assert store.get_disk_usage()["images"] == 200
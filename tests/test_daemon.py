@@ -0,0 +1,66 @@
+import json
+import os
+import signal
+
+import pytest
+
+from wallgarden import daemon, timing
+
+
+class FakeSlideshow:
+    def __init__(self, pinned=False, queue_size=1):
+        self.rotations = 0
+
+    def refill(self):
+        with timing.span("refill"):
+            pass
+
+    def rotate(self):
+        self.rotations += 1
+        return f"/images/{self.rotations}.png"
+
+
+@pytest.fixture
+def slideshow(monkeypatch):
+    monkeypatch.setattr(daemon, "is_gnome", lambda: True)
+    monkeypatch.setattr(daemon, "Slideshow", FakeSlideshow)
+    monkeypatch.setattr(timing, "_enabled", True)
+    previous_handler = signal.getsignal(signal.SIGTERM)
+    timing.reset()
+    yield
+    timing.reset()
+    signal.signal(signal.SIGTERM, previous_handler)
+
+
+def stop_after(monkeypatch, rotations):
+    # the sleep between rotations ends the slideshow after the given number of them
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == rotations:
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    monkeypatch.setattr(daemon.time, "sleep", sleep)
+
+
+def test_reports_are_written_and_cleared_every_rotation(slideshow, monkeypatch, tmp_path):
+    stop_after(monkeypatch, 3)
+    jsonl_path = tmp_path / "timings.jsonl"
+
+    with pytest.raises(SystemExit):
+        daemon.run_slideshow(10, reports={"breakdown": False, "jsonl_path": str(jsonl_path), "textfile_path": str(tmp_path / "timings.prom")})
+
+    entries = [json.loads(line) for line in jsonl_path.read_text().splitlines()]
+    assert [entry["name"] for entry in entries if entry["name"] == "rotation"] == ["rotation"] * 3
+    assert 'wallgarden_stage_count{stage="rotation"} 1' in (tmp_path / "timings.prom").read_text()
+    assert timing.get_spans() == []
+
+
+def test_sigterm_exits_normally(slideshow, monkeypatch):
+    stop_after(monkeypatch, 1)
+
+    with pytest.raises(SystemExit) as exit_info:
+        daemon.run_slideshow(10)
+
+    assert exit_info.value.code == 0
@@ -0,0 +1,75 @@
+import hashlib
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from wallgarden import store
+from wallgarden.dedup import NEAR_DUPLICATE_DISTANCE, dhash, file_sha256, find_duplicate, hamming_distance
+
+
+def make_image(shapes, size=(640, 360)):
+    image = Image.new("RGB", size, (30, 60, 90))
+    draw = ImageDraw.Draw(image)
+    for box, color in shapes:
+        draw.ellipse(box, fill=color)
+    return image
+
+
+def reencode(image, size, quality):
+    buffer = BytesIO()
+    image.resize(size).save(buffer, "JPEG", quality=quality)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+SUN = [((80, 40, 280, 240), (250, 200, 60)), ((380, 200, 620, 350), (20, 20, 20))]
+MOON = [((360, 20, 600, 200), (220, 220, 240)), ((40, 180, 200, 340), (120, 10, 60))]
+
+
+def test_resized_copies_are_near_duplicates():
+    original = make_image(SUN)
+
+    distance = hamming_distance(dhash(original), dhash(reencode(original, (320, 180), 60)))
+
+    assert distance <= NEAR_DUPLICATE_DISTANCE
+
+
+def test_different_pictures_are_not():
+    assert hamming_distance(dhash(make_image(SUN)), dhash(make_image(MOON))) > NEAR_DUPLICATE_DISTANCE
+
+
+def test_file_sha256_reads_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr("wallgarden.dedup.HASH_CHUNK_SIZE", 4)
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"wallgarden")
+
+    assert file_sha256(path) == hashlib.sha256(b"wallgarden").hexdigest()
+
+
+def test_exact_copy_is_found_by_sha256(db):
+    store.set_image_hashes("/images/a.png", "ab" * 32, dhash(make_image(SUN)))
+
+    assert find_duplicate("ab" * 32, dhash(make_image(MOON))) == "/images/a.png"
+
+
+def test_near_duplicate_is_found_by_phash(db):
+    original = make_image(SUN)
+    store.set_image_hashes("/images/sun.png", "ab" * 32, dhash(original))
+    store.set_image_hashes("/images/moon.png", "cd" * 32, dhash(make_image(MOON)))
+
+    assert find_duplicate("ef" * 32, dhash(reencode(original, (1280, 720), 70))) == "/images/sun.png"
+    assert find_duplicate("ef" * 32, dhash(reencode(make_image(MOON), (320, 180), 80))) == "/images/moon.png"
+
+
+def test_unrelated_image_is_not_a_duplicate(db):
+    store.set_image_hashes("/images/sun.png", "ab" * 32, dhash(make_image(SUN)))
+
+    assert find_duplicate("ef" * 32, dhash(make_image(MOON))) is None
+
+
+def test_high_bit_phash_round_trips(db):
+    # sqlite integers are signed, the top dHash bit must survive the store
+    phash = 2**63 + 5
+    store.set_image_hashes("/images/a.png", "ab" * 32, phash)
+
+    assert store.find_phash_candidates(phash) == [("/images/a.png", phash)]
@@ -0,0 +1,100 @@
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from wallgarden import core
+
+TARGET = (1920, 1080)
+
+
+class FakeResponse:
+    def __init__(self, body, content_length=None, chunk_size=1024):
+        self.body = body
+        self.headers = {} if content_length is None else {"Content-Length": str(content_length)}
+        self.chunk_size = chunk_size
+        self.chunks_read = 0
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), self.chunk_size):
+            self.chunks_read += 1
+            yield self.body[start : start + self.chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def make_png(size):
+    buffer = BytesIO()
+    Image.effect_noise(size, 64).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def originals(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "ORIGINAL_IMAGE_DIR_PATH", str(tmp_path))
+    return tmp_path
+
+
+def serve(monkeypatch, response):
+    monkeypatch.setattr(core.ratelimit, "get", lambda session, url, **kwargs: response)
+    return response
+
+
+def test_download_streams_to_a_temp_file(originals, monkeypatch):
+    body = make_png((1920, 1080))
+    serve(monkeypatch, FakeResponse(body, len(body)))
+    progress = []
+
+    path = core.download_image("https://i.redd.it/a.png", TARGET, lambda received, total: progress.append((received, total)))
+
+    assert os.path.dirname(path) == str(originals)
+    with open(path, "rb") as file:
+        assert file.read() == body
+    assert progress[-1] == (len(body), len(body))
+    assert [received for received, _ in progress] == sorted(received for received, _ in progress)
+
+
+def test_header_probe_stops_small_images_early(originals, monkeypatch):
+    body = make_png((1280, 720))
+    response = serve(monkeypatch, FakeResponse(body))
+
+    assert core.download_image("https://i.redd.it/a.png", TARGET) is None
+    assert response.chunks_read == 1
+    assert os.listdir(originals) == []
+
+
+def test_content_length_over_the_limit_is_refused(originals, monkeypatch):
+    serve(monkeypatch, FakeResponse(b"", core.MAX_IMAGE_BYTES + 1))
+
+    with pytest.raises(ValueError):
+        core.download_image("https://i.redd.it/a.png", TARGET)
+    assert os.listdir(originals) == []
+
+
+def test_body_over_the_limit_is_removed(originals, monkeypatch):
+    monkeypatch.setattr(core, "MAX_IMAGE_BYTES", 4096)
+    serve(monkeypatch, FakeResponse(make_png((1920, 1080))))
+
+    with pytest.raises(ValueError):
+        core.download_image("https://i.redd.it/a.png", TARGET)
+    assert os.listdir(originals) == []
+
+
+def test_progress_can_abort(originals, monkeypatch):
+    body = make_png((1920, 1080))
+    serve(monkeypatch, FakeResponse(body, len(body)))
+
+    def cancel(received, total):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        core.download_image("https://i.redd.it/a.png", TARGET, cancel)
+    assert os.listdir(originals) == []
@@ -0,0 +1,86 @@
+import os
+
+from wallgarden import index, store
+
+
+def write(path, content=b"image", mtime_ns=None):
+    with open(path, "wb") as file:
+        file.write(content)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+def touch_directory(directory, mtime_ns):
+    # an explicit directory mtime, so the test does not depend on the filesystem's timestamp granularity
+    os.utime(directory, ns=(mtime_ns, mtime_ns))
+
+
+def test_reconcile_registers_new_files(db, tmp_path):
+    directory = str(tmp_path / "images")
+    os.makedirs(directory)
+    a = write(os.path.join(directory, "a.png"))
+    write(os.path.join(directory, "notes.txt"))
+    write(os.path.join(directory, ".download-1.png"))
+
+    added, removed, modified = index.reconcile(directory)
+
+    assert (added, removed, modified) == ([a], [], [])
+    assert set(store.load_image_properties()) == {a}
+    assert index.get_library_files(directory) == [a]
+
+
+def test_unchanged_directory_is_not_scanned(db, tmp_path, monkeypatch):
+    directory = str(tmp_path / "images")
+    os.makedirs(directory)
+    write(os.path.join(directory, "a.png"))
+    index.reconcile(directory)
+
+    def scan_directory(directory):
+        raise AssertionError("scanned")
+
+    monkeypatch.setattr(index, "scan_directory", scan_directory)
+
+    assert index.reconcile(directory) == ([], [], [])
+
+
+def test_reconcile_applies_only_the_difference(db, tmp_path):
+    directory = str(tmp_path / "images")
+    os.makedirs(directory)
+    a = write(os.path.join(directory, "a.png"), mtime_ns=1_000_000_000)
+    b = write(os.path.join(directory, "b.png"))
+    touch_directory(directory, 1_000_000_000)
+    index.reconcile(directory)
+    store.update_image_properties(a, pinned=True)
+
+    os.remove(b)
+    c = write(os.path.join(directory, "c.png"))
+    write(a, b"rewritten", mtime_ns=2_000_000_000)
+    touch_directory(directory, 2_000_000_000)
+
+    assert index.reconcile(directory) == ([c], [b], [a])
+    assert set(store.load_image_properties()) == {a, c}
+    assert store.get_image_properties(a)["pinned"] is True
+
+
+def test_apply_change_follows_single_files(db, tmp_path):
+    directory = str(tmp_path / "images")
+    os.makedirs(directory)
+    index.reconcile(directory)
+    a = os.path.join(directory, "a.png")
+
+    assert index.apply_change(write(a), directory) == "added"
+    assert index.apply_change(a, directory) is None
+    assert index.apply_change(write(a, b"rewritten", mtime_ns=2_000_000_000), directory) == "modified"
+    os.remove(a)
+    assert index.apply_change(a, directory) == "removed"
+    assert index.apply_change(a, directory) is None
+    assert store.load_image_properties() == {}
+
+
+def test_apply_change_ignores_other_files(db, tmp_path):
+    directory = str(tmp_path / "images")
+    os.makedirs(os.path.join(directory, "nested"))
+
+    assert index.apply_change(write(os.path.join(directory, "notes.txt")), directory) is None
+    assert index.apply_change(write(os.path.join(directory, "nested", "a.png")), directory) is None
@@ -0,0 +1,138 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import ExifTags, Image, ImageDraw, ImageStat
+
+from wallgarden import store
+from wallgarden.core import DownloadStatus
+from wallgarden.dedup import dhash, file_dhash
+from wallgarden.library import import_file, import_images, migrate_format
+
+TARGET = (160, 90)
+
+
+def write_image(path, size=(64, 36), color=(200, 40, 40)):
+    Image.new("RGB", size, color).save(path)
+    return path
+
+
+def test_migrate_format_converts_images_and_keeps_properties(library, monkeypatch):
+    monkeypatch.setattr("wallgarden.library.set_gnome_background", lambda path: None)
+    png = write_image(os.path.join(library["images"], "a.png"))
+    original = write_image(os.path.join(library["original_images"], "a.original.png"))
+    rendition_dir = os.path.join(library["renditions"], "1920x1080")
+    os.makedirs(rendition_dir)
+    rendition = write_image(os.path.join(rendition_dir, "a.png"))
+    store.add_images([png])
+    store.update_image_properties(png, pinned=True)
+
+    results = migrate_format("jpeg", workers=1)
+
+    jpg = os.path.join(library["images"], "a.jpg")
+    assert results == [(png, jpg)]
+    assert os.listdir(library["images"]) == ["a.jpg"]
+    with Image.open(jpg) as image:
+        assert image.format == "JPEG"
+    assert set(store.load_image_properties()) == {jpg}
+    assert store.get_image_properties(jpg)["pinned"] is True
+    assert os.path.exists(original)
+    assert not os.path.exists(rendition)
+
+
+def test_migrate_format_converts_originals_on_request(library):
+    original = write_image(os.path.join(library["original_images"], "a.original.png"))
+
+    results = migrate_format("webp", workers=1, originals=True)
+
+    assert results == [(original, os.path.join(library["original_images"], "a.original.webp"))]
+    assert os.listdir(library["original_images"]) == ["a.original.webp"]
+
+
+def test_migrate_format_follows_the_current_wallpaper(library, monkeypatch):
+    backgrounds = []
+    monkeypatch.setattr("wallgarden.library.set_gnome_background", backgrounds.append)
+    png = write_image(os.path.join(library["images"], "a.png"))
+    store.add_images([png])
+    store.set_current_image(png)
+
+    migrate_format("jpeg", workers=1)
+
+    assert backgrounds == [os.path.join(library["images"], "a.jpg")]
+
+
+def test_migrate_format_never_overwrites(library):
+    png = write_image(os.path.join(library["images"], "a.png"))
+    jpg = write_image(os.path.join(library["images"], "a.jpg"), color=(0, 0, 255))
+    store.add_images([png, jpg])
+
+    assert migrate_format("jpeg", workers=1) == [(png, None)]
+    assert sorted(os.listdir(library["images"])) == ["a.jpg", "a.png"]
+
+
+def make_picture(size=(320, 180)):
+    # a bright disc on the left, so a wrong orientation changes the dHash
+    image = Image.new("RGB", size, (20, 30, 40))
+    ImageDraw.Draw(image).ellipse((size[0] // 10, size[1] // 4, size[0] // 2, size[1] * 3 // 4), fill=(250, 220, 90))
+    return image
+
+
+def write_sideways(path, image):
+    # stored rotated, with the EXIF orientation that turns it back upright
+    exif = Image.Exif()
+    exif[ExifTags.Base.Orientation] = 6
+    image.transpose(Image.Transpose.ROTATE_90).save(path, "JPEG", quality=95, exif=exif)
+    return path
+
+
+@pytest.fixture
+def importer(library, monkeypatch):
+    # one monitor, and workers in this process so they see the scratch library and database
+    monkeypatch.setattr("wallgarden.core.get_connected_resolutions", lambda: [])
+    monkeypatch.setattr("wallgarden.library.ProcessPoolExecutor", lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+    monkeypatch.setattr("wallgarden.library.budget.enforce_budgets", lambda: [])
+    return library
+
+
+def test_import_renders_hashes_and_registers_images(importer, tmp_path):
+    source = tmp_path / "source"
+    (source / "nested").mkdir(parents=True)
+    make_picture().save(source / "a.png")
+    make_picture().save(source / "nested" / "copy.png")
+    Image.new("RGB", (80, 45)).save(source / "small.png")
+
+    results = import_images(str(source), TARGET, workers=1)
+
+    statuses = sorted(status.value for _, status, _ in results)
+    assert statuses == sorted([DownloadStatus.saved.value, DownloadStatus.exists.value, DownloadStatus.too_small.value])
+    (image_path,) = store.load_image_properties()
+    with Image.open(image_path) as image:
+        assert image.size == TARGET
+    assert store.get_image_properties(image_path)["width"] == TARGET[0]
+    assert store.find_image_by_sha256(store.get_connection().execute("SELECT sha256 FROM images").fetchone()[0]) == image_path
+    assert len(os.listdir(importer["original_images"])) == 1
+
+
+def test_import_turns_sideways_photos_upright(importer, tmp_path):
+    upright_picture = make_picture()
+    path = write_sideways(str(tmp_path / "phone.jpg"), upright_picture)
+
+    status, image_path, _, phash, size = import_file(path, "phone", TARGET)
+
+    assert status == DownloadStatus.saved
+    assert size == TARGET
+    assert phash == file_dhash(path)
+    assert bin(phash ^ dhash(upright_picture)).count("1") <= 6
+    with Image.open(image_path) as image:
+        left, right = (ImageStat.Stat(image.convert("L").crop(box)).mean[0] for box in ((0, 0, 80, 90), (80, 0, 160, 90)))
+    assert left > right
+
+
+def test_import_finds_near_duplicates_of_the_library(importer, tmp_path):
+    picture = make_picture()
+    store.set_image_hashes("/images/existing.png", "ab" * 32, dhash(picture))
+    path = write_sideways(str(tmp_path / "phone.jpg"), picture)
+
+    status, duplicate_path, _, _, _ = import_file(path, "phone", TARGET)
+
+    assert (status, duplicate_path) == (DownloadStatus.duplicate, "/images/existing.png")
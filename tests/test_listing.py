@@ -0,0 +1,100 @@
+import threading
+
+from wallgarden import listing, store
+
+TARGET = (1920, 1080)
+PAGE_SIZE = 3
+
+
+def make_page(subreddit, sort, start, pages):
+    children = [
+        {
+            "kind": "t3",
+            "data": {
+                "name": f"t3_{index}",
+                "subreddit": subreddit,
+                "url": f"https://i.redd.it/{subreddit}-{sort}-{index}.jpg",
+                "permalink": f"/r/{subreddit}/comments/{index}/post_{index}/",
+                "preview": {"images": [{"source": {"url": "", "width": 3840, "height": 2160}}]},
+            },
+        }
+        for index in range(start, start + PAGE_SIZE)
+    ]
+    after = f"t3_{start + PAGE_SIZE}" if start + PAGE_SIZE < pages * PAGE_SIZE else None
+    return {"data": {"after": after, "children": children}}
+
+
+def fake_reddit(monkeypatch, pages=3):
+    # serves `pages` pages per listing and records every (subreddit, sort, after) requested
+    calls = []
+    lock = threading.Lock()
+
+    def query_reddit(subreddit, sort, timeframe, limit, after=None):
+        with lock:
+            calls.append((subreddit, sort, after))
+        start = int(after.split("_")[1]) if after else 0
+        return make_page(subreddit, sort, start, pages)
+
+    monkeypatch.setattr(listing, "query_reddit", query_reddit)
+    return calls
+
+
+def test_first_page_of_every_listing_without_count(db, monkeypatch):
+    calls = fake_reddit(monkeypatch)
+
+    candidates = listing.get_reddit_candidates(["pics", "wallpapers"], [("hot", "all"), ("top", "week")], TARGET)
+
+    assert sorted(calls) == [("pics", "hot", None), ("pics", "top", None), ("wallpapers", "hot", None), ("wallpapers", "top", None)]
+    assert len(candidates) == 4 * PAGE_SIZE
+
+
+def test_cursor_pagination_follows_after(db, monkeypatch):
+    calls = fake_reddit(monkeypatch, pages=3)
+
+    candidates = listing.get_reddit_candidates(["pics"], [("hot", "all")], TARGET, count=100)
+
+    assert calls == [("pics", "hot", None), ("pics", "hot", "t3_3"), ("pics", "hot", "t3_6")]
+    assert len(candidates) == 3 * PAGE_SIZE
+
+
+def test_count_stops_the_crawl(db, monkeypatch):
+    fake_reddit(monkeypatch, pages=100)
+
+    candidates = listing.get_reddit_candidates(["pics"], [("hot", "all")], TARGET, count=4)
+
+    assert len(candidates) == 4
+
+
+def test_failing_listing_does_not_stop_the_others(db, monkeypatch):
+    calls = fake_reddit(monkeypatch)
+    query_reddit = listing.query_reddit
+
+    def flaky(subreddit, *args):
+        if subreddit == "broken":
+            raise ConnectionError("boom")
+        return query_reddit(subreddit, *args)
+
+    monkeypatch.setattr(listing, "query_reddit", flaky)
+
+    candidates = listing.get_reddit_candidates(["broken", "pics"], [("hot", "all")], TARGET)
+
+    assert calls == [("pics", "hot", None)]
+    assert len(candidates) == PAGE_SIZE
+
+
+def test_candidates_are_indexed(db, monkeypatch):
+    fake_reddit(monkeypatch, pages=1)
+
+    candidates = listing.get_reddit_candidates(["pics"], [("hot", "all")], TARGET)
+
+    assert {row["url"] for row in store.find_pending_posts(TARGET, limit=10)} == set(candidates)
+
+
+def test_listing_and_rank_are_recorded(db, monkeypatch):
+    fake_reddit(monkeypatch, pages=2)
+
+    listing.get_reddit_candidates(["pics"], [("top", "week")], TARGET, count=100)
+
+    rows = store.get_connection().execute("SELECT url, subreddit, sort, timeframe, rank FROM post_listings ORDER BY rank").fetchall()
+    assert [tuple(row) for row in rows] == [(f"https://i.redd.it/pics-top-{index}.jpg", "pics", "top", "week", index) for index in range(2 * PAGE_SIZE)]
+    assert len(store.find_pending_posts(TARGET, ["pics"], [("top", "week")], max_rank=PAGE_SIZE, limit=100)) == PAGE_SIZE
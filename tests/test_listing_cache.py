@@ -0,0 +1,123 @@
+import os
+import time
+
+import pytest
+import requests
+
+from wallgarden import listing_cache
+
+URL = "https://www.reddit.com/r/pics/hot.json?t=all&limit=100"
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("not json")
+        return self.body
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(self.status_code)
+
+
+@pytest.fixture
+def reddit(tmp_path, monkeypatch):
+    # answers with the queued responses in order and records the headers of every request
+    monkeypatch.setattr(listing_cache, "LISTING_CACHE_DIR_PATH", str(tmp_path))
+    monkeypatch.setattr(listing_cache, "_last_prune", time.time())
+    responses, requests_made = [], []
+
+    def get(session, url, headers, timeout):
+        requests_made.append(headers)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(listing_cache.ratelimit, "get", get)
+    return responses, requests_made
+
+
+def age_entry(seconds):
+    entry = listing_cache.load_entry(URL)
+    entry["fetched_at"] -= seconds
+    listing_cache.save_entry(entry)
+
+
+def test_fresh_entry_is_served_without_a_request(reddit):
+    responses, requests_made = reddit
+    responses.append(FakeResponse(body={"page": 1}, headers={"ETag": '"v1"'}))
+
+    assert listing_cache.get_json(None, URL, {}, ttl=300) == {"page": 1}
+    assert listing_cache.get_json(None, URL, {}, ttl=300) == {"page": 1}
+    assert len(requests_made) == 1
+
+
+def test_stale_entry_is_revalidated(reddit):
+    responses, requests_made = reddit
+    responses += [FakeResponse(body={"page": 1}, headers={"ETag": '"v1"', "Last-Modified": "Sat, 17 Oct 2026 10:00:00 GMT"}), FakeResponse(304)]
+    listing_cache.get_json(None, URL, {"User-agent": "wallgarden"}, ttl=300)
+    age_entry(600)
+
+    assert listing_cache.get_json(None, URL, {"User-agent": "wallgarden"}, ttl=300) == {"page": 1}
+    assert requests_made[1] == {"User-agent": "wallgarden", "If-None-Match": '"v1"', "If-Modified-Since": "Sat, 17 Oct 2026 10:00:00 GMT"}
+    # the 304 restarts the ttl
+    assert listing_cache.get_json(None, URL, {}, ttl=300) == {"page": 1}
+    assert len(requests_made) == 2
+
+
+def test_changed_listing_replaces_the_entry(reddit):
+    responses, _ = reddit
+    responses += [FakeResponse(body={"page": 1}, headers={"ETag": '"v1"'}), FakeResponse(body={"page": 2}, headers={"ETag": '"v2"'})]
+    listing_cache.get_json(None, URL, {}, ttl=300)
+    age_entry(600)
+
+    assert listing_cache.get_json(None, URL, {}, ttl=300) == {"page": 2}
+    assert listing_cache.load_entry(URL)["etag"] == '"v2"'
+
+
+@pytest.mark.parametrize("failure", [requests.ConnectionError("offline"), FakeResponse(503), FakeResponse(200)])
+def test_stale_entry_is_served_when_reddit_fails(reddit, failure):
+    responses, _ = reddit
+    responses += [FakeResponse(body={"page": 1}), failure]
+    listing_cache.get_json(None, URL, {}, ttl=300)
+    age_entry(600)
+
+    assert listing_cache.get_json(None, URL, {}, ttl=300) == {"page": 1}
+
+
+def test_failure_without_an_entry_raises(reddit):
+    responses, _ = reddit
+    responses += [FakeResponse(503)]
+
+    with pytest.raises(requests.HTTPError):
+        listing_cache.get_json(None, URL, {}, ttl=300)
+    assert listing_cache.load_entry(URL) is None
+
+
+def test_old_entries_are_pruned(reddit, monkeypatch):
+    responses, _ = reddit
+    responses += [FakeResponse(body={"page": 1})]
+    listing_cache.get_json(None, URL, {}, ttl=300)
+    old_path = listing_cache.get_cache_path(URL)
+    os.utime(old_path, (0, 0))
+    monkeypatch.setattr(listing_cache, "_last_prune", 0.0)
+
+    listing_cache.save_entry({"url": URL + "&after=t3_1", "fetched_at": time.time(), "body": {}})
+
+    assert not os.path.exists(old_path)
+    assert os.path.exists(listing_cache.get_cache_path(URL + "&after=t3_1"))
+
+
+def test_ttl_depends_on_the_listing():
+    assert listing_cache.listing_ttl("new", "all") < listing_cache.listing_ttl("hot", "all") < listing_cache.listing_ttl("top", "all")
+    assert listing_cache.listing_ttl("top", "all") <= listing_cache.MAX_ENTRY_AGE
@@ -0,0 +1,110 @@
+from wallgarden.core import parse_posts, parse_reddit
+
+TARGET = (1920, 1080)
+
+
+def make_listing(*posts):
+    return {"data": {"children": [{"kind": "t3", "data": post} for post in posts]}}
+
+
+def make_post(url, post_hint=None, source=(4000, 3000), resolutions=(), **extra):
+    width, height = source
+    post = {
+        "name": "t3_abc",
+        "subreddit": "EarthPorn",
+        "url": url,
+        "permalink": "/r/EarthPorn/comments/abc/a_mountain/",
+        "preview": {
+            "images": [
+                {
+                    "source": {"url": "https://preview.redd.it/abc.jpg?s=1&amp;w=2", "width": width, "height": height},
+                    "resolutions": [{"url": f"https://preview.redd.it/abc-{x}.jpg", "width": x, "height": y} for x, y in resolutions],
+                }
+            ]
+        },
+        **extra,
+    }
+    if post_hint:
+        post["post_hint"] = post_hint
+    return post
+
+
+def test_direct_image_post():
+    posts = parse_posts(make_listing(make_post("https://i.redd.it/abc.jpg", "image")), TARGET)
+
+    assert posts == [
+        {
+            "post_id": "t3_abc",
+            "subreddit": "EarthPorn",
+            "title": "a_mountain",
+            "url": "https://i.redd.it/abc.jpg",
+            "width": 4000,
+            "height": 3000,
+            "download_url": "https://i.redd.it/abc.jpg",
+            "download_width": 4000,
+            "download_height": 3000,
+        }
+    ]
+
+
+def test_smallest_covering_rendition_is_downloaded():
+    post = make_post("https://i.redd.it/abc.jpg", "image", resolutions=[(1080, 810), (2160, 1620), (3840, 2880)])
+
+    (parsed,) = parse_posts(make_listing(post), TARGET)
+
+    assert (parsed["download_url"], parsed["download_width"], parsed["download_height"]) == ("https://preview.redd.it/abc-2160.jpg", 2160, 1620)
+
+
+def test_too_small_post_is_skipped():
+    assert parse_posts(make_listing(make_post("https://i.redd.it/abc.jpg", "image", source=(1280, 720))), TARGET) == []
+
+
+def test_video_and_self_posts_are_skipped():
+    listing = make_listing(
+        make_post("https://v.redd.it/abc", "hosted:video", is_video=True),
+        make_post("https://www.youtube.com/watch?v=abc", "rich:video"),
+        make_post("https://www.reddit.com/r/EarthPorn/comments/abc/", "self"),
+    )
+
+    assert parse_posts(listing, TARGET) == []
+
+
+def test_link_posts_only_use_the_preview_of_image_hosts():
+    listing = make_listing(
+        make_post("https://news.example.com/article", "link"),
+        make_post("https://imgur.com/a/album", "link"),
+    )
+
+    (parsed,) = parse_posts(listing, TARGET)
+
+    assert parsed["url"] == "https://imgur.com/a/album"
+    assert parsed["download_url"] == "https://preview.redd.it/abc.jpg?s=1&w=2"
+
+
+def test_gallery_images_are_parsed_individually():
+    gallery = {
+        "name": "t3_gal",
+        "subreddit": "wallpapers",
+        "url": "https://www.reddit.com/gallery/gal",
+        "permalink": "/r/wallpapers/comments/gal/two_views/",
+        "is_gallery": True,
+        "gallery_data": {"items": [{"media_id": "m1"}, {"media_id": "m2"}, {"media_id": "m3"}]},
+        "media_metadata": {
+            "m1": {"status": "valid", "e": "Image", "m": "image/png", "s": {"u": "https://i.redd.it/m1.png", "x": 3840, "y": 2160}, "p": []},
+            "m2": {"status": "valid", "e": "Image", "m": "image/jpg", "s": {"u": "https://i.redd.it/m2.jpg", "x": 800, "y": 600}},
+            "m3": {"status": "failed"},
+        },
+    }
+
+    posts = parse_posts(make_listing(gallery), TARGET)
+
+    assert [(post["url"], post["title"], post["post_id"], post["subreddit"]) for post in posts] == [
+        ("https://i.redd.it/m1.png", "two_views_1", "t3_gal", "wallpapers")
+    ]
+    assert posts[0]["download_url"] == "https://i.redd.it/m1.png"
+
+
+def test_parse_reddit_keeps_its_tuple_shape():
+    listing = make_listing(make_post("https://i.redd.it/abc.jpg", "image"))
+
+    assert parse_reddit(listing, TARGET) == {"https://i.redd.it/abc.jpg": (4000, 3000, "a_mountain", "https://i.redd.it/abc.jpg")}
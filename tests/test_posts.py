@@ -0,0 +1,129 @@
+import threading
+
+import pytest
+import requests
+
+from wallgarden import core, store
+
+TARGET = (1920, 1080)
+
+
+def make_listing(subreddit, sort, posts=3):
+    children = [
+        {
+            "kind": "t3",
+            "data": {
+                "name": f"t3_{sort}{index}",
+                "subreddit": subreddit,
+                "url": f"https://i.redd.it/{subreddit}-{sort}-{index}.jpg",
+                "permalink": f"/r/{subreddit}/comments/{index}/{sort}_{index}/",
+                "preview": {"images": [{"source": {"url": "", "width": 3840, "height": 2160}}]},
+            },
+        }
+        for index in range(posts)
+    ]
+    return {"data": {"after": None, "children": children}}
+
+
+@pytest.fixture
+def reddit(db, monkeypatch):
+    # listings served per (subreddit, sort), downloads that succeed unless the url is in failures
+    queries, downloads, failures = [], [], {}
+
+    def query_reddit(subreddit, sort, timeframe, limit, after=None):
+        queries.append((subreddit, sort, timeframe))
+        return make_listing(subreddit, sort)
+
+    def fetch_reddit_image(url, title, target_resolution, download_url=None, progress=None):
+        downloads.append(url)
+        if url in failures:
+            raise failures[url]
+        return core.DownloadStatus.saved, f"/images/{title}.png"
+
+    monkeypatch.setattr(core, "query_reddit", query_reddit)
+    monkeypatch.setattr(core, "fetch_reddit_image", fetch_reddit_image)
+    return queries, downloads, failures
+
+
+def get_status(url):
+    return store.get_connection().execute("SELECT status FROM posts WHERE url = ?", (url,)).fetchone()["status"]
+
+
+def test_unindexed_listing_is_fetched(reddit):
+    queries, downloads, _ = reddit
+    core.index_listing(make_listing("pics", "hot"), TARGET, "hot", "day")
+
+    image_path = core.get_random_reddit_image("pics", "top", "all", 25, TARGET)
+
+    assert queries == [("pics", "top", "all")]
+    assert "-top-" in downloads[0]
+    assert get_status(downloads[0]) == "done"
+    assert image_path.startswith("/images/top_")
+
+
+def test_indexed_listing_is_served_from_the_index(reddit):
+    queries, downloads, _ = reddit
+    core.get_random_reddit_image("pics", "top", "all", 25, TARGET)
+
+    core.get_random_reddit_image("pics", "top", "all", 25, TARGET)
+
+    assert len(queries) == 1
+    assert len(set(downloads)) == 2
+
+
+def test_limit_bounds_the_indexed_posts(reddit):
+    queries, downloads, _ = reddit
+    core.get_random_reddit_image("pics", "top", "all", 25, TARGET)
+
+    core.get_random_reddit_image("pics", "top", "all", 1, TARGET)
+    core.get_random_reddit_image("pics", "top", "all", 1, TARGET)
+
+    # only the first post is within the limit, once it is taken the listing is queried again
+    assert downloads.count("https://i.redd.it/pics-top-0.jpg") == 1
+    assert len(queries) >= 2
+
+
+def test_transient_errors_release_the_post(reddit):
+    _, downloads, failures = reddit
+    core.index_listing(make_listing("pics", "top", posts=1), TARGET, "top", "all")
+    url = "https://i.redd.it/pics-top-0.jpg"
+    failures[url] = requests.ConnectionError("offline")
+
+    assert core.save_pending_post(TARGET, ["pics"], [("top", "all")]) is None
+    assert get_status(url) == "pending"
+
+    failures[url] = ValueError("corrupt")
+    assert core.save_pending_post(TARGET, ["pics"], [("top", "all")]) is None
+    assert get_status(url) == "failed"
+    assert downloads == [url, url]
+
+
+def test_cancel_releases_the_post(reddit):
+    _, _, failures = reddit
+    core.index_listing(make_listing("pics", "top", posts=1), TARGET, "top", "all")
+    url = "https://i.redd.it/pics-top-0.jpg"
+    failures[url] = KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        core.save_pending_post(TARGET, ["pics"], [("top", "all")])
+    assert get_status(url) == "pending"
+
+
+def test_concurrent_claims_never_collide(db):
+    posts = 8
+    core.index_listing(make_listing("pics", "top", posts=posts), TARGET, "top", "all")
+    barrier = threading.Barrier(posts)
+    claimed = []
+
+    def claim():
+        barrier.wait()
+        claimed.append(store.claim_pending_post(TARGET, ["pics"], [("top", "all")])["url"])
+        store._local.connection.close()
+
+    threads = [threading.Thread(target=claim) for _ in range(posts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(claimed)) == posts
@@ -0,0 +1,37 @@
+import email.utils
+import time
+
+from wallgarden import ratelimit
+
+
+def test_retry_after_seconds():
+    assert ratelimit.parse_retry_after("7") == 7.0
+    assert ratelimit.parse_retry_after("-3") == 0.0
+
+
+def test_retry_after_http_date():
+    retry_at = email.utils.formatdate(time.time() + 60, usegmt=True)
+
+    assert 55 <= ratelimit.parse_retry_after(retry_at) <= 60
+
+
+def test_retry_after_invalid():
+    assert ratelimit.parse_retry_after(None) is None
+    assert ratelimit.parse_retry_after("soon") is None
+
+
+def test_host_groups():
+    assert ratelimit.get_host_group("https://www.reddit.com/r/a/top.json") == "reddit.com"
+    assert ratelimit.get_host_group("https://i.redd.it/a.jpg") == "redd.it"
+    assert ratelimit.get_host_group("https://example.com/a.jpg") == "example.com"
+
+
+def test_bucket_adapts_to_the_remaining_window():
+    bucket = ratelimit.TokenBucket(1.0, 4)
+
+    bucket.adapt(remaining=10, reset=100)
+    assert bucket.rate == 0.1
+
+    bucket.adapt(remaining=0, reset=30)
+    assert bucket.tokens == 0.0
+    assert bucket.blocked_until > time.monotonic() + 25
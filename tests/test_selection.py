@@ -0,0 +1,74 @@
+from wallgarden import selection, store
+
+PATHS = [f"/images/{number}.png" for number in range(6)]
+
+
+def test_draw_returns_every_image_once_per_cycle(db):
+    store.add_images(PATHS)
+
+    first_cycle = [selection.draw() for _ in PATHS]
+    second_cycle = [selection.draw() for _ in PATHS]
+
+    assert sorted(first_cycle) == sorted(PATHS)
+    assert sorted(second_cycle) == sorted(PATHS)
+
+
+def test_draw_skips_hidden_images(db):
+    store.add_images(PATHS)
+    store.update_image_properties(PATHS[0], hidden=True)
+
+    drawn = {selection.draw() for _ in range(len(PATHS) * 2)}
+
+    assert drawn == set(PATHS[1:])
+
+
+def test_draw_skips_the_current_wallpaper(db):
+    store.add_images(PATHS[:2])
+    store.set_current_image(PATHS[0])
+
+    assert [selection.draw() for _ in range(3)] == [PATHS[1]] * 3
+
+
+def test_draw_with_pinned_filter(db):
+    store.add_images(PATHS)
+    store.update_image_properties(PATHS[2], pinned=True)
+    store.update_image_properties(PATHS[3], pinned=True)
+
+    drawn = [selection.draw({"hidden": False, "pinned": True}) for _ in range(4)]
+
+    assert sorted(drawn) == sorted([PATHS[2], PATHS[3]] * 2)
+
+
+def test_refresh_image_keeps_bags_in_step(db):
+    store.add_images(PATHS[:3])
+    selection.draw()
+    store.update_image_properties(PATHS[1], hidden=True)
+    selection.refresh_image(PATHS[1])
+    store.add_images([PATHS[3]])
+    selection.refresh_image(PATHS[3])
+
+    drawn = {selection.draw() for _ in range(8)}
+
+    assert PATHS[1] not in drawn
+    assert PATHS[3] in drawn
+
+
+def test_draw_on_empty_library(db):
+    assert selection.draw() is None
+
+
+def test_refresh_image_does_not_redraw_within_a_cycle(db):
+    store.add_images(PATHS)
+    first = selection.draw()
+
+    # a property change of a drawn image, and one that drops and restores its match
+    store.update_image_properties(first, pinned=True)
+    selection.refresh_image(first)
+    store.update_image_properties(first, hidden=True)
+    selection.refresh_image(first)
+    store.update_image_properties(first, hidden=False)
+    selection.refresh_image(first)
+
+    rest = [selection.draw() for _ in PATHS[1:]]
+
+    assert sorted([first, *rest]) == sorted(PATHS)
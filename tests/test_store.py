@@ -0,0 +1,217 @@
+import json
+
+import pytest
+
+from wallgarden import store
+
+
+def get_tables(connection):
+    return {row["name"] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_json_properties_are_imported(db):
+    properties = {
+        "/images/a.png": {"hidden": True, "pinned": False, "width": 2560},
+        "/images/b.png": {"pinned": True},
+        "/images/bogus.png": {"fetch": False},
+    }
+    with open(store.JSON_PATH, "w") as file:
+        json.dump(properties, file)
+
+    loaded = store.load_image_properties()
+
+    assert set(loaded) == {"/images/a.png", "/images/b.png"}
+    assert loaded["/images/a.png"]["hidden"] is True
+    assert loaded["/images/a.png"]["width"] == 2560
+    assert loaded["/images/b.png"]["pinned"] is True
+    assert loaded["/images/b.png"]["hidden"] is False
+    with open(store.JSON_PATH + ".migrated") as file:
+        assert json.load(file) == properties
+
+
+def test_corrupt_json_is_ignored(db):
+    with open(store.JSON_PATH, "w") as file:
+        file.write("{not json")
+
+    assert store.load_image_properties() == {}
+
+
+def test_properties_are_merged(db):
+    store.update_image_properties("/images/a.png", pinned=True, width=1920)
+    store.update_image_properties("/images/a.png", hidden=True, height=1080)
+
+    properties = store.get_image_properties("/images/a.png")
+
+    assert (properties["pinned"], properties["hidden"], properties["width"], properties["height"]) == (True, True, 1920, 1080)
+
+
+def test_set_current_image_moves_the_flag(db):
+    store.add_images(["/images/a.png", "/images/b.png"])
+
+    store.set_current_image("/images/a.png")
+    store.set_current_image("/images/b.png")
+
+    assert store.get_set_image() == "/images/b.png"
+    assert store.find_images({"is_set": True}) == ["/images/b.png"]
+
+
+def test_nested_transactions_commit_once(db):
+    with store.transaction():
+        store.add_images(["/images/a.png"])
+        with store.transaction():
+            store.add_images(["/images/b.png"])
+
+    assert set(store.load_image_properties()) == {"/images/a.png", "/images/b.png"}
+
+
+@pytest.mark.parametrize("version", range(1, len(store.MIGRATIONS)))
+def test_schema_upgrades_to_latest(create_database, version):
+    create_database(version, lambda connection: store.write_properties(connection, "/images/a.png", {"pinned": True, "width": 1920}))
+
+    connection = store.get_connection()
+
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == len(store.MIGRATIONS)
+    assert {"images", "image_urls", "phash_bands", "shuffle_bags", "library_files", "library_directories", "posts"} <= get_tables(connection)
+    properties = store.get_image_properties("/images/a.png")
+    assert properties["pinned"] is True
+    assert properties["width"] == 1920
+
+
+def test_upgrade_from_v1_adds_hash_columns(create_database):
+    create_database(1, lambda connection: store.write_properties(connection, "/images/a.png", {}))
+
+    store.set_image_hashes("/images/a.png", "ab" * 32, 2**63 + 5, "https://i.redd.it/a.jpg")
+
+    assert store.find_image_by_sha256("ab" * 32) == "/images/a.png"
+    assert store.find_image_by_url("https://i.redd.it/a.jpg") == "/images/a.png"
+
+
+def test_upgrade_from_v2_adds_last_shown(create_database):
+    create_database(2, lambda connection: store.write_properties(connection, "/images/a.png", {}))
+
+    store.set_current_image("/images/a.png")
+
+    assert store.get_set_image() == "/images/a.png"
+    assert store.get_image_properties("/images/a.png")["last_shown"] > 0
+
+
+def test_upgrade_from_v3_adds_library_snapshot(create_database):
+    create_database(3)
+
+    store.update_library_snapshot("/images", {"/images/a.png": (10, 20)}, [], 30)
+
+    assert store.get_library_snapshot("/images") == ({"/images/a.png": (10, 20)}, 30)
+    assert "/images/a.png" in store.load_image_properties()
+
+
+def test_upgrade_from_v5_keeps_shuffle_bags(create_database):
+    def seed(connection):
+        store.write_properties(connection, "/images/a.png", {})
+        store.write_properties(connection, "/images/b.png", {})
+        connection.execute("""INSERT INTO shuffle_bags VALUES ('{"filter": {}}', 1.0, '/images/a.png')""")
+
+    create_database(5, seed)
+
+    assert store.pop_shuffle_bag('{"filter": {}}', {}) == "/images/a.png"
+    assert store.pop_shuffle_bag('{"filter": {}}', {}) is None
+
+
+def test_upgrade_from_v4_seeds_posts_and_drops_failed_downloads(create_database):
+    def seed(connection):
+        store.write_properties(connection, "/images/good.png", {"width": 2560})
+        store.write_properties(connection, "/images/bogus.png", {"fetch": False})
+        connection.execute("INSERT INTO shuffle_bags VALUES ('bag', 1.0, '/images/bogus.png')")
+        connection.execute("INSERT INTO image_urls VALUES ('https://i.redd.it/good.jpg', '/images/good.png')")
+
+    create_database(4, seed)
+
+    assert set(store.load_image_properties()) == {"/images/good.png"}
+    assert store.get_shuffle_bags() == []
+    assert store.find_settled_urls(["https://i.redd.it/good.jpg", "https://i.redd.it/new.jpg"]) == {"https://i.redd.it/good.jpg"}
+
+
+def test_rename_image_moves_every_reference(db):
+    store.add_images(["/images/a.png"])
+    store.set_image_hashes("/images/a.png", "cd" * 32, 7, "https://i.redd.it/a.jpg")
+    store.set_post_status("https://i.redd.it/a.jpg", "done", "/images/a.png")
+
+    store.rename_image("/images/a.png", "/images/a.webp")
+
+    assert store.find_image_by_url("https://i.redd.it/a.jpg") == "/images/a.webp"
+    assert [path for path, _ in store.find_phash_candidates(7)] == ["/images/a.webp"]
+    row = store.get_connection().execute("SELECT path FROM posts WHERE url = ?", ("https://i.redd.it/a.jpg",)).fetchone()
+    assert row["path"] == "/images/a.webp"
+
+
+def make_post(url, download_size=(2560, 1440), size=(4000, 3000), subreddit="EarthPorn", rank=0):
+    return {
+        "url": url,
+        "post_id": f"t3_{url}",
+        "subreddit": subreddit,
+        "title": url,
+        "width": size[0],
+        "height": size[1],
+        "download_url": f"{url}-download",
+        "download_width": download_size[0],
+        "download_height": download_size[1],
+        "rank": rank,
+    }
+
+
+def find_pending_urls(*args, **kwargs):
+    return {post["url"] for post in store.find_pending_posts(*args, limit=100, **kwargs)}
+
+
+def test_pending_posts_cover_the_target(db):
+    store.add_posts([make_post("u1"), make_post("u2", download_size=(1280, 960)), make_post("u3", download_size=(1000, 800), size=(1000, 800))])
+    store.set_post_status("u1", "too-small")
+
+    assert find_pending_urls((1920, 1080), ["earthporn"]) == set()
+    assert find_pending_urls((1280, 720), ["earthporn"]) == {"u2"}
+    assert find_pending_urls((1280, 720), ["wallpapers"]) == set()
+
+
+def test_pending_posts_come_from_the_requested_listing(db):
+    store.add_posts([make_post("hot1"), make_post("both", rank=5)], "hot", "day")
+    store.add_posts([make_post("top1", rank=3), make_post("both", rank=0)], "top", "all")
+    store.add_posts([make_post("wallpapers1", subreddit="wallpapers")], "top", "all")
+    target = (1920, 1080)
+
+    assert find_pending_urls(target, ["EarthPorn"], [("top", "all")]) == {"top1", "both"}
+    assert find_pending_urls(target, ["earthporn"], [("top", "week")]) == set()
+    # the timeframe of a hot listing means nothing to reddit
+    assert find_pending_urls(target, ["earthporn"], [("hot", "all")]) == {"hot1", "both"}
+    assert find_pending_urls(target, ["earthporn"], [("hot", "all")], max_rank=1) == {"hot1"}
+    assert find_pending_urls(target, None, [("top", "all")], max_rank=1) == {"both", "wallpapers1"}
+
+
+def test_claimed_posts_are_not_offered_again(db):
+    store.add_posts([make_post("u1"), make_post("u2")])
+
+    first = store.claim_pending_post((1920, 1080))
+    second = store.claim_pending_post((1920, 1080))
+
+    assert {first["url"], second["url"]} == {"u1", "u2"}
+    assert store.claim_pending_post((1920, 1080)) is None
+    assert store.find_settled_urls(["u1", "u2"]) == {"u1", "u2"}
+    store.release_post(first["url"])
+    assert store.claim_pending_post((1920, 1080))["url"] == first["url"]
+
+
+def test_settled_posts_are_not_released(db):
+    store.add_posts([make_post("u1")])
+    store.claim_pending_post((1920, 1080))
+    store.set_post_status("u1", "done", "/images/u1.png")
+
+    store.release_post("u1")
+
+    assert store.claim_pending_post((1920, 1080)) is None
+
+
+def test_stale_claims_expire(db, monkeypatch):
+    store.add_posts([make_post("u1")])
+    store.claim_pending_post((1920, 1080))
+    monkeypatch.setattr(store, "CLAIM_TIMEOUT", -1)
+
+    assert store.find_settled_urls(["u1"]) == set()
+    assert store.claim_pending_post((1920, 1080))["url"] == "u1"
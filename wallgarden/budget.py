@@ -0,0 +1,163 @@
+import glob
+import os
+import threading
+
+from wallgarden import store
+from wallgarden.config import IMAGE_DIR_BUDGET, IMAGE_DIR_PATH, ORIGINAL_DIR_BUDGET, ORIGINAL_IMAGE_DIR_PATH, RENDITION_DIR_PATH, ensure_data_dirs
+
+ORIGINAL_MARKER = ".original."
+
+_lock = threading.Lock()
+
+
+def get_title(filename):
+    # images are stored as "<title><ext>" and originals as "<title>.original<ext>"
+    if ORIGINAL_MARKER in filename:
+        return filename.rpartition(ORIGINAL_MARKER)[0]
+    return os.path.splitext(filename)[0]
+
+
+def scan_files(directory):
+    files = {}
+    if not os.path.isdir(directory):
+        return files
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            stat = entry.stat()
+            files[entry.path] = (stat.st_size, stat.st_mtime)
+    return files
+
+
+def scan_library():
+    # image size includes the per-monitor renditions, which go together with it
+    images = scan_files(IMAGE_DIR_PATH)
+    renditions = {}
+    if os.path.isdir(RENDITION_DIR_PATH):
+        for entry in os.scandir(RENDITION_DIR_PATH):
+            if entry.is_dir():
+                for rendition_path, (size, _) in scan_files(entry.path).items():
+                    renditions.setdefault(os.path.basename(rendition_path), []).append((rendition_path, size))
+    originals = {get_title(os.path.basename(path)): (path, size) for path, (size, _) in scan_files(ORIGINAL_IMAGE_DIR_PATH).items()}
+    return images, renditions, originals
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def get_image_usage(image_path):
+    # (bytes of an image with its renditions, bytes of its original) from a few stats instead of a scan
+    filename = os.path.basename(image_path)
+    image_bytes = file_size(image_path)
+    if os.path.isdir(RENDITION_DIR_PATH):
+        image_bytes += sum(file_size(os.path.join(entry.path, filename)) for entry in os.scandir(RENDITION_DIR_PATH) if entry.is_dir())
+    originals = glob.glob(os.path.join(glob.escape(ORIGINAL_IMAGE_DIR_PATH), f"{glob.escape(get_title(filename))}{ORIGINAL_MARKER}*"))
+    return image_bytes, sum(file_size(path) for path in originals)
+
+
+def record_usage(image_bytes=0, original_bytes=0):
+    # keeps the stored totals current as files are written, so enforce_budgets can skip its scan
+    store.add_disk_usage({"images": image_bytes, "originals": original_bytes})
+
+
+def record_image(image_path):
+    record_usage(*get_image_usage(image_path))
+
+
+def invalidate_usage():
+    # after bulk changes the totals are recounted by the next enforce_budgets
+    store.set_disk_usage({})
+
+
+def within_budgets(image_budget, original_budget):
+    usage = store.get_disk_usage()
+    if "images" not in usage or "originals" not in usage:
+        return False
+    return (not image_budget or usage["images"] <= image_budget) and (not original_budget or usage["originals"] <= original_budget)
+
+
+def eviction_order(images, rows, keep):
+    # hidden images go first, then the least recently shown; never shown images
+    # count from when they were downloaded
+    protected = set(keep)
+    candidates = []
+    for path, (_, mtime) in images.items():
+        row = rows.get(path)
+        if row is not None and (row["pinned"] or row["is_set"]):
+            protected.add(path)
+            continue
+        if path in protected:
+            continue
+        last_used = row["last_shown"] if row is not None and row["last_shown"] else mtime
+        hidden = bool(row is not None and row["hidden"])
+        candidates.append((not hidden, last_used, path))
+    candidates.sort()
+    return [path for _, _, path in candidates], protected
+
+
+def remove_file(path, dry_run):
+    if not dry_run:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def enforce_budgets(image_budget=IMAGE_DIR_BUDGET, original_budget=ORIGINAL_DIR_BUDGET, keep=(), dry_run=False, rescan=False):
+    # budgets are in bytes, 0 disables a budget; returns the evicted file paths. The library is
+    # only scanned when the running totals are unknown or over a budget, or on rescan
+    if not image_budget and not original_budget:
+        return []
+    ensure_data_dirs()
+    with _lock:
+        if not rescan and within_budgets(image_budget, original_budget):
+            return []
+        images, renditions, originals = scan_library()
+        rows = store.get_eviction_rows()
+        order, protected = eviction_order(images, rows, keep)
+        image_titles = {get_title(os.path.basename(path)): path for path in images}
+        evicted = []
+
+        original_usage = sum(size for _, size in originals.values())
+        image_usage = sum(size for size, _ in images.values()) + sum(size for entries in renditions.values() for _, size in entries)
+
+        if original_budget:
+            # originals are only needed for new monitor resolutions, so they are dropped
+            # first, starting with those whose image is already gone
+            orphans = [title for title in originals if title not in image_titles]
+            owned = [get_title(os.path.basename(path)) for path in order]
+            for title in orphans + owned:
+                if original_usage <= original_budget:
+                    break
+                if title not in originals:
+                    continue
+                original_path, size = originals.pop(title)
+                remove_file(original_path, dry_run)
+                original_usage -= size
+                evicted.append(original_path)
+
+        if image_budget:
+            for path in order:
+                if image_usage <= image_budget:
+                    break
+                for rendition_path, size in renditions.get(os.path.basename(path), []):
+                    remove_file(rendition_path, dry_run)
+                    image_usage -= size
+                remove_file(path, dry_run)
+                image_usage -= images[path][0]
+                evicted.append(path)
+                original = originals.pop(get_title(os.path.basename(path)), None)
+                if original:
+                    remove_file(original[0], dry_run)
+                    original_usage -= original[1]
+                    evicted.append(original[0])
+                if not dry_run:
+                    store.remove_image(path)
+            if image_usage > image_budget and protected:
+                print(f"Image budget exceeded by {image_usage - image_budget} bytes of pinned or current wallpapers.")
+        if not dry_run:
+            store.set_disk_usage({"images": image_usage, "originals": original_usage})
+        return evicted
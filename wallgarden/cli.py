@@ -1,7 +1,23 @@
 import argparse
+import itertools
+import os
 
-from wallgarden.core import Sort, Timeframe, get_random_image, get_random_pinned_image, get_random_reddit_image, set_gnome_background
-from wallgarden.slideshow import install_service_files, install_timer_files, toggle_service
+# subcommand dependencies are imported inside each handler so that e.g.
+# "wallgardenc random" never loads requests or PIL, see benchmarks/bench_cli_startup.py
+from wallgarden.config import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_DOWNLOAD_WORKERS,
+    DEFAULT_QUEUE_SIZE,
+    IMAGE_DIR_BUDGET,
+    IMAGE_QUALITY,
+    ORIGINAL_DIR_BUDGET,
+    PNG_COMPRESS_LEVEL,
+    PROFILE,
+    PROFILE_JSONL_PATH,
+    PROFILE_TEXTFILE_PATH,
+)
+from wallgarden.enums import ImageFormat, Sort, Timeframe
+from wallgarden.selection import WEIGHTINGS
 
 
 def positive_integer(value):
@@ -16,21 +32,52 @@ def positive_integer(value):
 
 
 def handle_download(args):
-    subreddit = args.subreddit
-    sort = args.sort
-    timeframe = args.timeframe
+    from wallgarden.core import DEFAULT_RESOLUTION, download_candidates, get_pending_candidates
+    from wallgarden.listing import get_reddit_candidates
+    from wallgarden.wallpaper import get_monitor_resolutions, set_gnome_background
+
+    subreddits = args.subreddit
+    listings = list(itertools.product(args.sort, args.timeframe))
     limit = args.limit
-    target_resolution = (2560, 1440)  # Example resolution
+    target_resolution = get_monitor_resolutions()
+    if not all(target_resolution):
+        target_resolution = DEFAULT_RESOLUTION
+
+    # untried posts from earlier runs of the same listings go first, within the posts a crawl would
+    # consider, and the listings are only crawled for what they cannot cover
+    max_rank = limit if args.candidates is None else None
+    pending = get_pending_candidates(target_resolution, subreddits, args.count, listings, max_rank)
+    results = download_candidates(pending, target_resolution, args.count, workers=args.workers) if pending else []
+    missing = args.count - sum(1 for _, _, image_path in results if image_path)
+    if missing > 0:
+        candidates = get_reddit_candidates(
+            subreddits, listings, target_resolution, count=args.candidates, page_limit=limit, concurrency=args.concurrency
+        )
+        results += download_candidates(candidates, target_resolution, missing, workers=args.workers)
+    print_download_summary(results)
+
+    if args.count == 1:
+        image_paths = [image_path for _, _, image_path in results if image_path]
+        if image_paths:
+            set_gnome_background(image_paths[0])
 
-    image_path = get_random_reddit_image(subreddit, sort, timeframe, limit, target_resolution)
-    set_gnome_background(image_path)
+
+def print_download_summary(results):
+    from wallgarden.core import DownloadStatus
+
+    for url, status, image_path in results:
+        print(f"{status.value:>10}  {image_path or url}")
+    counts = {status: sum(1 for _, s, _ in results if s == status) for status in DownloadStatus}
+    print(", ".join(f"{count} {status.value}" for status, count in counts.items()))
 
 
 def handle_random(args):
+    from wallgarden.wallpaper import get_random_image, get_random_pinned_image, set_gnome_background
+
     if args.pinned:
-        image_path = get_random_pinned_image()
+        image_path = get_random_pinned_image(weighting=args.weighting)
     else:
-        image_path = get_random_image()
+        image_path = get_random_image(weighting=args.weighting)
 
     if image_path:
         set_gnome_background(image_path)
@@ -39,6 +86,21 @@ def handle_random(args):
 
 
 def handle_slideshow(args):
+    from wallgarden.slideshow import install_service_files, install_timer_files, toggle_daemon, toggle_service
+
+    if args.run:
+        from wallgarden.daemon import run_slideshow
+
+        run_slideshow(args.timer, pinned=args.pinned, queue_size=args.queue, reports=get_report_options(args) if is_profiling(args) else None)
+        return
+    if args.daemon:
+        install_service_files(pinned=args.pinned, daemon=True, minutes=args.timer)
+        if args.start:
+            toggle_daemon(enable=True)
+        if args.stop:
+            toggle_daemon(enable=False)
+        return
+
     if args.start:
         toggle_service(enable=True)
     if args.stop:
@@ -49,40 +111,192 @@ def handle_slideshow(args):
         install_timer_files(minutes=args.timer)
 
 
+def handle_import(args):
+    from wallgarden.core import DEFAULT_RESOLUTION
+    from wallgarden.library import import_images
+    from wallgarden.wallpaper import get_monitor_resolutions
+
+    if not os.path.isdir(args.directory):
+        print(f"{args.directory} is not a directory.")
+        return
+    target_resolution = get_monitor_resolutions()
+    if not all(target_resolution):
+        target_resolution = DEFAULT_RESOLUTION
+    results = import_images(args.directory, target_resolution, workers=args.workers)
+    if not results:
+        print(f"No images found in {args.directory}.")
+
+
+def handle_library(args):
+    if args.library_command == "migrate-format":
+        from wallgarden.library import migrate_format
+
+        results = migrate_format(
+            args.format, workers=args.workers, originals=args.originals, quality=args.quality, compress_level=args.compress_level
+        )
+        converted = sum(1 for _, new_path in results if new_path)
+        print(f"Converted {converted} of {len(results)} images to {args.format}.")
+    elif args.library_command == "index":
+        from wallgarden.core import init_image_properties
+        from wallgarden.library import index_hashes
+
+        init_image_properties()
+        print(f"Indexed {index_hashes(workers=args.workers)} images.")
+    elif args.library_command == "gc":
+        from wallgarden.budget import enforce_budgets
+
+        image_budget = IMAGE_DIR_BUDGET if args.images_mb is None else args.images_mb * 1024 * 1024
+        original_budget = ORIGINAL_DIR_BUDGET if args.originals_mb is None else args.originals_mb * 1024 * 1024
+        evicted = enforce_budgets(image_budget, original_budget, dry_run=args.dry_run, rescan=True)
+        for path in evicted:
+            print(path)
+        print(f"{'Would evict' if args.dry_run else 'Evicted'} {len(evicted)} files.")
+    else:
+        print("No valid library command provided. Use 'migrate-format', 'index' or 'gc'.")
+
+
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Wallgarden cli -- download and manage reddit images as desktop backgrounds.")
+    parser.add_argument("--profile", action="store_true", help="Print how long each stage took")
+    parser.add_argument("--profile-jsonl", type=str, default=PROFILE_JSONL_PATH, help="Append the stage timings to this JSON lines file")
+    parser.add_argument("--profile-textfile", type=str, default=PROFILE_TEXTFILE_PATH, help="Write the stage timings to this Prometheus textfile")
     subparsers = parser.add_subparsers(dest="command", help="Commands")
 
     parser_dl = subparsers.add_parser("download", help="Download a random wallpaper from Reddit.")
-    parser_dl.add_argument("subreddit", type=str, help="Subreddit name (default: earthporn)")
-    parser_dl.add_argument("--sort", "-s", type=str, choices=[sort.value for sort in Sort], default="hot", help="Sort method (default: hot)")
+    parser_dl.add_argument("subreddit", type=str, nargs="+", help="One or more subreddit names")
+    parser_dl.add_argument(
+        "--sort", "-s", type=str, nargs="+", choices=[sort.value for sort in Sort], default=["hot"], help="One or more sort methods (default: hot)"
+    )
+    parser_dl.add_argument(
+        "--timeframe",
+        "-t",
+        type=str,
+        nargs="+",
+        choices=[timeframe.value for timeframe in Timeframe],
+        default=["day"],
+        help="One or more timeframes (default: day)",
+    )
+    parser_dl.add_argument(
+        "--limit", "-l", type=positive_integer, default=10, help="Positive integer for the limit of posts to fetch per page (default: 10)"
+    )
     parser_dl.add_argument(
-        "--timeframe", "-t", type=str, choices=[timeframe.value for timeframe in Timeframe], default="day", help="Timeframe (default: day)"
+        "--candidates", type=positive_integer, help="Page through the listings until this many candidates are found (default: first page only)"
+    )
+    parser_dl.add_argument(
+        "--concurrency",
+        type=positive_integer,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Maximum concurrent listing requests (default: {DEFAULT_CONCURRENCY})",
+    )
+    parser_dl.add_argument("--count", "-c", type=positive_integer, default=1, help="Number of images to download (default: 1)")
+    parser_dl.add_argument(
+        "--workers",
+        "-w",
+        type=positive_integer,
+        default=DEFAULT_DOWNLOAD_WORKERS,
+        help=f"Parallel download workers (default: {DEFAULT_DOWNLOAD_WORKERS})",
     )
-    parser_dl.add_argument("--limit", "-l", type=positive_integer, default=10, help="Positive integer for the limit of posts to fetch (default: 10)")
 
     parser_random = subparsers.add_parser("random", help="Set a random wallpaper.")
     parser_random.add_argument("--pinned", action="store_true", help="Choose only from pinned wallpapers")
+    parser_random.add_argument(
+        "--weighting", type=str, choices=WEIGHTINGS, default="uniform", help="Favour wallpapers not shown recently with 'recency' (default: uniform)"
+    )
 
     parser_slideshow = subparsers.add_parser("slideshow", help="")
     parser_slideshow.add_argument("--start", action="store_true", help="Start the slideshow.")
     parser_slideshow.add_argument("--stop", action="store_true", help="Stop the slideshow.")
     parser_slideshow.add_argument("--timer", type=positive_integer, default=10, help="Set a timer for the wallpaper duration in minutes")
     parser_slideshow.add_argument("--pinned", action="store_true", help="Choose only from pinned wallpapers")
+    parser_slideshow.add_argument("--daemon", action="store_true", help="Use a resident slideshow service instead of the systemd timer")
+    parser_slideshow.add_argument("--run", action="store_true", help="Run the resident slideshow in the foreground")
+    parser_slideshow.add_argument(
+        "--queue",
+        type=positive_integer,
+        default=DEFAULT_QUEUE_SIZE,
+        help=f"Wallpapers rendered ahead by the resident slideshow (default: {DEFAULT_QUEUE_SIZE})",
+    )
+
+    parser_import = subparsers.add_parser("import", help="Import the images in a local folder and its subfolders.")
+    parser_import.add_argument("directory", type=str, help="Folder to import")
+    parser_import.add_argument("--workers", "-w", type=positive_integer, help="Worker processes (default: one per CPU)")
+
+    parser_library = subparsers.add_parser("library", help="Maintain the local wallpaper library.")
+    library_subparsers = parser_library.add_subparsers(dest="library_command", help="Library commands")
+    parser_migrate = library_subparsers.add_parser("migrate-format", help="Convert the stored wallpapers to another image format.")
+    parser_migrate.add_argument(
+        "--format", "-f", type=str, choices=[image_format.value for image_format in ImageFormat], required=True, help="Target format"
+    )
+    parser_migrate.add_argument("--quality", "-q", type=positive_integer, default=IMAGE_QUALITY, help=f"JPEG/WebP quality (default: {IMAGE_QUALITY})")
+    parser_migrate.add_argument(
+        "--compress-level", type=int, choices=range(10), default=PNG_COMPRESS_LEVEL, help=f"PNG compress level (default: {PNG_COMPRESS_LEVEL})"
+    )
+    parser_migrate.add_argument("--originals", action="store_true", help="Also convert the stored originals")
+    parser_migrate.add_argument(
+        "--workers",
+        "-w",
+        type=positive_integer,
+        default=DEFAULT_DOWNLOAD_WORKERS,
+        help=f"Parallel conversion workers (default: {DEFAULT_DOWNLOAD_WORKERS})",
+    )
+
+    parser_index = library_subparsers.add_parser("index", help="Hash existing wallpapers for duplicate detection.")
+    parser_index.add_argument(
+        "--workers",
+        "-w",
+        type=positive_integer,
+        default=DEFAULT_DOWNLOAD_WORKERS,
+        help=f"Parallel hashing workers (default: {DEFAULT_DOWNLOAD_WORKERS})",
+    )
+
+    parser_gc = library_subparsers.add_parser("gc", help="Evict least recently shown wallpapers until the library fits its disk budget.")
+    parser_gc.add_argument(
+        "--images-mb", type=int, help="Budget for the wallpapers and their renditions in MiB, 0 is unlimited (default: WALLGARDEN_IMAGE_BUDGET_MB)"
+    )
+    parser_gc.add_argument(
+        "--originals-mb", type=int, help="Budget for the originals in MiB, 0 is unlimited (default: WALLGARDEN_ORIGINAL_BUDGET_MB)"
+    )
+    parser_gc.add_argument("--dry-run", action="store_true", help="List the files that would be evicted without removing them")
 
     args = parser.parse_args()
     return args
 
 
+def is_profiling(args):
+    return bool(args.profile or PROFILE or args.profile_jsonl or args.profile_textfile)
+
+
+def get_report_options(args):
+    return {"breakdown": args.profile or PROFILE, "jsonl_path": args.profile_jsonl, "textfile_path": args.profile_textfile}
+
+
 def main():
     args = parse_arguments()
+    if not is_profiling(args):
+        run_command(args)
+        return
+
+    from wallgarden import timing
+
+    timing.enable()
+    try:
+        with timing.span(args.command or "cli"):
+            run_command(args)
+    finally:
+        timing.write_reports(**get_report_options(args))
+
 
+def run_command(args):
     if args.command == "download":
         handle_download(args)
     elif args.command == "random":
         handle_random(args)
     elif args.command == "slideshow":
         handle_slideshow(args)
+    elif args.command == "import":
+        handle_import(args)
+    elif args.command == "library":
+        handle_library(args)
     else:
         print("No valid command provided. Use 'download' to download or 'random' to set a random wallpaper.")
 
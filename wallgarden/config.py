@@ -8,10 +8,44 @@ IMAGE_DIR_NAME = "images"
 ORIGINAL_IMAGE_DIR_NAME = "original_images"
 IMAGE_DIR_PATH = os.path.join(DATA_DIR_PATH, IMAGE_DIR_NAME)
 ORIGINAL_IMAGE_DIR_PATH = os.path.join(DATA_DIR_PATH, ORIGINAL_IMAGE_DIR_NAME)
+RENDITION_DIR_NAME = "renditions"
+RENDITION_DIR_PATH = os.path.join(DATA_DIR_PATH, RENDITION_DIR_NAME)
 JSON_NAME = "wallgarden.json"
 JSON_PATH = os.path.join(DATA_DIR_PATH, JSON_NAME)
-if not os.path.exists(IMAGE_DIR_PATH):
-    os.makedirs(IMAGE_DIR_PATH)
+DB_NAME = "wallgarden.db"
+DB_PATH = os.path.join(DATA_DIR_PATH, DB_NAME)
+CACHE_DIR_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), PROJECT_NAME)
+THUMBNAIL_DIR_PATH = os.path.join(CACHE_DIR_PATH, "thumbnails")
+LISTING_CACHE_DIR_PATH = os.path.join(CACHE_DIR_PATH, "listings")
+# base url for the listing api, overridable to point at a local stand-in
+REDDIT_URL = os.environ.get("WALLGARDEN_REDDIT_URL", "https://www.reddit.com").rstrip("/")
+# storage format for the cropped wallpapers: png, jpeg or webp
+IMAGE_FORMAT = os.environ.get("WALLGARDEN_IMAGE_FORMAT", "png").lower()
+IMAGE_QUALITY = int(os.environ.get("WALLGARDEN_IMAGE_QUALITY", 92))
+PNG_COMPRESS_LEVEL = int(os.environ.get("WALLGARDEN_PNG_COMPRESS_LEVEL", 6))
+# downloads bigger than either ceiling are aborted before they are decoded
+MAX_IMAGE_PIXELS = int(os.environ.get("WALLGARDEN_MAX_IMAGE_PIXELS", 100_000_000))
+MAX_IMAGE_BYTES = int(os.environ.get("WALLGARDEN_MAX_IMAGE_BYTES", 64 * 1024 * 1024))
+# disk budgets in MiB for the wallpapers (with their renditions) and the originals, 0 is unlimited
+IMAGE_DIR_BUDGET = int(os.environ.get("WALLGARDEN_IMAGE_BUDGET_MB", 0)) * 1024 * 1024
+ORIGINAL_DIR_BUDGET = int(os.environ.get("WALLGARDEN_ORIGINAL_BUDGET_MB", 0)) * 1024 * 1024
+# memory cap in MiB for the decoded thumbnail textures the gui keeps around
+TEXTURE_CACHE_BUDGET = int(os.environ.get("WALLGARDEN_TEXTURE_CACHE_MB", 64)) * 1024 * 1024
+# per-stage timings, also enabled by the cli --profile flags
+PROFILE = os.environ.get("WALLGARDEN_PROFILE", "") not in ("", "0")
+PROFILE_JSONL_PATH = os.environ.get("WALLGARDEN_PROFILE_JSONL")
+PROFILE_TEXTFILE_PATH = os.environ.get("WALLGARDEN_PROFILE_TEXTFILE")
+DEFAULT_DOWNLOAD_WORKERS = 4
+DEFAULT_CONCURRENCY = 4
+DEFAULT_QUEUE_SIZE = 3
 
-if not os.path.exists(ORIGINAL_IMAGE_DIR_PATH):
-    os.makedirs(ORIGINAL_IMAGE_DIR_PATH)
+_data_dirs_ready = False
+
+
+def ensure_data_dirs():
+    # called by whatever first writes to the library, importing config stays free of I/O
+    global _data_dirs_ready
+    if not _data_dirs_ready:
+        for path in (IMAGE_DIR_PATH, ORIGINAL_IMAGE_DIR_PATH, THUMBNAIL_DIR_PATH):
+            os.makedirs(path, exist_ok=True)
+        _data_dirs_ready = True
@@ -1,37 +1,86 @@
-import json
+import glob
+import html
+import math
 import os
 import random
-import re
-import subprocess  # nosec B404
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from enum import Enum
-from io import BytesIO
+from urllib.parse import urlsplit
 
 import requests
-from PIL import Image
-
-from wallgarden.config import IMAGE_DIR_PATH, JSON_PATH, ORIGINAL_IMAGE_DIR_PATH
-from wallgarden.utils import ESCAPE_FLATPAK, is_gnome
-
-
-class Timeframe(Enum):
-    all = "all"
-    day = "day"
-    hour = "hour"
-    month = "month"
-    week = "week"
-    year = "year"
-
+from PIL import Image, ImageFile
+from requests.adapters import HTTPAdapter
+
+from wallgarden import budget, index, listing_cache, ratelimit, selection, store, timing
+from wallgarden.config import (
+    DEFAULT_DOWNLOAD_WORKERS,
+    IMAGE_DIR_PATH,
+    IMAGE_FORMAT,
+    IMAGE_QUALITY,
+    MAX_IMAGE_BYTES,
+    MAX_IMAGE_PIXELS,
+    ORIGINAL_IMAGE_DIR_PATH,
+    PNG_COMPRESS_LEVEL,
+    REDDIT_URL,
+    ensure_data_dirs,
+)
+from wallgarden.dedup import file_dhash, file_sha256, find_duplicate, upright
+from wallgarden.enums import ImageFormat, Sort, Timeframe  # noqa: F401
+from wallgarden.index import IMAGE_FILE_EXTENSIONS
+from wallgarden.wallpaper import (  # noqa: F401
+    apply_gnome_background,
+    get_connected_resolutions,
+    get_current_wallgarden_background,
+    get_monitor_resolutions,
+    get_random_image,
+    get_random_pinned_image,
+    get_rendition_path,
+    set_gnome_background,
+)
+
+
+class DownloadStatus(Enum):
+    saved = "saved"
+    exists = "exists"
+    duplicate = "duplicate"
+    too_small = "too-small"
+    failed = "failed"
+
+
+class PostStatus(Enum):
+    pending = "pending"
+    in_progress = "in-progress"
+    done = "done"
+    too_small = "too-small"
+    failed = "failed"
+
+
+# how a finished download settles its post in the candidate index
+POST_STATUSES = {
+    DownloadStatus.saved: PostStatus.done,
+    DownloadStatus.exists: PostStatus.done,
+    DownloadStatus.duplicate: PostStatus.done,
+    DownloadStatus.too_small: PostStatus.too_small,
+    DownloadStatus.failed: PostStatus.failed,
+}
+# pending posts tried per pick before giving up on the local index
+PICK_ATTEMPTS = 5
 
-class Sort(Enum):
-    hot = "hot"
-    new = "new"
-    rising = "rising"
-    controversial = "controversial"
-    top = "top"
-    best = "best"
 
+IMAGE_EXTENSIONS = {ImageFormat.png: ".png", ImageFormat.jpeg: ".jpg", ImageFormat.webp: ".webp"}
+# link targets that are fetched directly, anything else goes through the reddit preview
+IMAGE_URL_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+GALLERY_MIME_EXTENSIONS = {"image/jpg": ".jpg", "image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+NON_IMAGE_POST_HINTS = ("hosted:video", "rich:video", "self")
+# hosts whose html pages stand for an image, so their reddit preview is the image itself;
+# for any other link the preview is only the page's og:image
+IMAGE_HOSTS = ("i.redd.it", "imgur.com")
+ORIGINAL_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
 
-DEFAULT_IMAGE_PROPS = {"hidden": False, "pinned": False, "attempt_download": True, "is_set": False}
+DEFAULT_IMAGE_PROPS = store.DEFAULT_IMAGE_PROPS
+DEFAULT_RESOLUTION = (2560, 1440)
 
 headers = {
     "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
@@ -46,31 +95,202 @@ headers = {
     "Cache-Control": "no-cache",
 }
 
+# connections kept alive per host, shared by every download worker
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 8
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# the JPEG draft is asked for exactly the scaled size, a gap above 1.0 would keep a larger DCT scale;
+# whatever reduction the draft leaves is done by resize() through RESIZE_REDUCING_GAP
+RESIZE_DRAFT_GAP = 1.0
+RESIZE_REDUCING_GAP = 3.0
 
-def query_reddit(subreddit, sort, timeframe, limit):
-    url = f"http://reddit.com/r/{subreddit}/{sort}.json?t={timeframe}&limit={limit}"
-    response = requests.get(url, headers=headers, timeout=10)
-    return response.json()
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE, pool_block=True)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def query_reddit(subreddit, sort, timeframe, limit, after=None):
+    url = f"{REDDIT_URL}/r/{subreddit}/{sort}.json?t={timeframe}&limit={limit}"
+    if after:
+        url += f"&after={after}"
+    with timing.span("query_reddit"):
+        return listing_cache.get_json(get_session(), url, headers, listing_cache.listing_ttl(sort, timeframe))
 
 
 def parse_reddit(data, target_resolution):
-    filtered = {}
+    # {url: (width, height, title, download_url)}, url identifies the image for
+    # deduplication while download_url is the smallest variant covering the target
+    return to_candidates(parse_posts(data, target_resolution))
+
+
+def to_candidates(posts):
+    return {post["url"]: (post["width"], post["height"], post["title"], post["download_url"]) for post in posts}
+
+
+def parse_posts(data, target_resolution):
+    # one row per image covering target_resolution, in the shape of the store's posts table
+    posts = []
     for item in data["data"]["children"]:
         img_data = item["data"]
-        url = img_data.get("url")
-        width = img_data.get("preview", {}).get("images", [{}])[0].get("source", {}).get("width")
-        height = img_data.get("preview", {}).get("images", [{}])[0].get("source", {}).get("height")
         permalink = img_data.get("permalink", "")
         title = permalink.rstrip("/").split("/")[-1]  # Extract title from permalink
+        post = {"post_id": img_data.get("name"), "subreddit": img_data.get("subreddit"), "title": title}
+        if img_data.get("is_gallery"):
+            posts += [{**post, **image} for image in parse_gallery(img_data, title, target_resolution)]
+            continue
+        url = img_data.get("url")
+        if not url or img_data.get("is_video") or img_data.get("post_hint") in NON_IMAGE_POST_HINTS:
+            continue
+        direct = os.path.splitext(urlsplit(url).path)[1].lower() in IMAGE_URL_EXTENSIONS
+        if not direct and img_data.get("post_hint") != "image" and not is_image_host(url):
+            continue
+        preview = (img_data.get("preview", {}).get("images") or [{}])[0]
+        source = preview.get("source", {})
+        width, height = source.get("width"), source.get("height")
+        if not width or not height or not covers((width, height), target_resolution):
+            continue
+
+        rendition = pick_rendition(preview.get("resolutions", []), target_resolution)
+        if not rendition:
+            # links to an image page (imgur albums) are fetched through the preview instead
+            rendition = (url if direct else html.unescape(source.get("url", "")), width, height)
+        download_url, download_width, download_height = rendition
+        if download_url:
+            posts.append(
+                {
+                    **post,
+                    "url": url,
+                    "width": width,
+                    "height": height,
+                    "download_url": download_url,
+                    "download_width": download_width,
+                    "download_height": download_height,
+                }
+            )
+    return posts
+
+
+def is_image_host(url):
+    host = (urlsplit(url).hostname or "").lower()
+    return any(host == image_host or host.endswith("." + image_host) for image_host in IMAGE_HOSTS)
+
+
+def parse_gallery(img_data, title, target_resolution):
+    images = []
+    media_metadata = img_data.get("media_metadata") or {}
+    gallery_items = (img_data.get("gallery_data") or {}).get("items", [])
+    for number, gallery_item in enumerate(gallery_items, start=1):
+        media = media_metadata.get(gallery_item.get("media_id"), {})
+        source = media.get("s", {})
+        if media.get("status") != "valid" or media.get("e") != "Image" or "u" not in source:
+            continue
+        if not covers((source.get("x", 0), source.get("y", 0)), target_resolution):
+            continue
+        extension = GALLERY_MIME_EXTENSIONS.get(media.get("m"), ".jpg")
+        url = f"https://i.redd.it/{gallery_item['media_id']}{extension}"
+        resolutions = [{"url": r["u"], "width": r["x"], "height": r["y"]} for r in media.get("p", []) if {"u", "x", "y"} <= set(r)]
+        download_url, download_width, download_height = pick_rendition(resolutions, target_resolution) or (
+            html.unescape(source["u"]),
+            source["x"],
+            source["y"],
+        )
+        images.append(
+            {
+                "url": url,
+                "title": f"{title}_{number}",
+                "width": source["x"],
+                "height": source["y"],
+                "download_url": download_url,
+                "download_width": download_width,
+                "download_height": download_height,
+            }
+        )
+    return images
+
+
+def covers(size, target_resolution):
+    return size[0] >= target_resolution[0] and size[1] >= target_resolution[1]
+
+
+def pick_rendition(resolutions, target_resolution):
+    # (url, width, height) of the smallest pre-scaled preview covering the target; the urls
+    # are html escaped unless the listing was requested with raw_json=1
+    for resolution in sorted(resolutions, key=lambda r: r.get("width", 0) * r.get("height", 0)):
+        if resolution.get("url") and covers((resolution.get("width", 0), resolution.get("height", 0)), target_resolution):
+            return html.unescape(resolution["url"]), resolution["width"], resolution["height"]
+    return None
+
 
-        if url and width and height and width > target_resolution[0] and height > target_resolution[1]:
-            filtered[url] = (width, height, title)
-    return filtered
+def index_listing(data, target_resolution, sort=None, timeframe=None, offset=0):
+    # records every candidate post of a listing page, with the listing and its rank there when
+    # sort is given, and returns them as parse_reddit does; offset is the rank of the page's first post
+    posts = parse_posts(data, target_resolution)
+    if posts:
+        ranks = {item["data"].get("name"): offset + number for number, item in enumerate(data["data"]["children"])}
+        store.add_posts([{**post, "rank": ranks.get(post["post_id"], offset)} for post in posts], sort, timeframe)
+    return to_candidates(posts)
+
+
+@timing.span("fetch")
+def download_image(url, target_resolution=None, progress=None):
+    # streams the body to a temp file next to the originals and returns its path,
+    # or None once the header shows the image is smaller than target_resolution;
+    # progress(received, total) is called per chunk, total is 0 when unknown, and
+    # may raise to abort the download
+    with ratelimit.get(get_session(), url, stream=True) as response:
+        response.raise_for_status()
+        content_length = int(response.headers.get("Content-Length") or 0)
+        if content_length > MAX_IMAGE_BYTES:
+            raise ValueError(f"{url} is {content_length} bytes, over the {MAX_IMAGE_BYTES} byte limit")
+
+        ensure_data_dirs()
+        fd, temp_path = tempfile.mkstemp(prefix=".download-", dir=ORIGINAL_IMAGE_DIR_PATH)
+        try:
+            acceptable = True
+            with os.fdopen(fd, "wb") as temp_file:
+                header_parser = ImageFile.Parser()
+                size = 0
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > MAX_IMAGE_BYTES:
+                        raise ValueError(f"{url} is over the {MAX_IMAGE_BYTES} byte limit")
+                    temp_file.write(chunk)
+                    if progress:
+                        progress(size, content_length)
+                    if header_parser is not None:
+                        header_parser.feed(chunk)
+                        if header_parser.image:
+                            acceptable = image_size_acceptable(header_parser.image.size, target_resolution, url)
+                            if not acceptable:
+                                break
+                            header_parser = None
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    if not acceptable:
+        os.remove(temp_path)
+        return None
+    return temp_path
 
 
-def download_image(url):
-    response = requests.get(url, timeout=10)
-    return Image.open(BytesIO(response.content))
+def image_size_acceptable(size, target_resolution, url=""):
+    width, height = size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValueError(f"{url} is {width}x{height}, over the {MAX_IMAGE_PIXELS} pixel limit")
+    if target_resolution and (width < target_resolution[0] or height < target_resolution[1]):
+        return False
+    return True
 
 
 def scale_and_crop(image, target_resolution):
@@ -82,158 +302,271 @@ def scale_and_crop(image, target_resolution):
     # Determine scaling factor
     scale_factor = max(target_width / img_width, target_height / img_height)
 
-    # Scale the image
-    new_size = (int(img_width * scale_factor), int(img_height * scale_factor))
-    image = image.resize(new_size, Image.Resampling.LANCZOS)
+    # Let JPEG decode at the smallest DCT scale that still covers the scaled size,
+    # this is a no-op for other formats and for already loaded images
+    draft_size = (math.ceil(img_width * scale_factor * RESIZE_DRAFT_GAP), math.ceil(img_height * scale_factor * RESIZE_DRAFT_GAP))
+    # draft() returns a truthy tuple even when it keeps the full size
+    image.draft(image.mode, draft_size)
+    if image.size != (img_width, img_height):
+        img_width, img_height = image.size
+        scale_factor = max(target_width / img_width, target_height / img_height)
+    with timing.span("decode"):
+        image.load()
+
+    # Centre the target box in the scaled image and map it back to source pixels,
+    # so only the cropped region is resampled
+    scaled_width = max(target_width, int(img_width * scale_factor))
+    scaled_height = max(target_height, int(img_height * scale_factor))
+    left = round((scaled_width - target_width) / 2)
+    top = round((scaled_height - target_height) / 2)
+    scale_x = scaled_width / img_width
+    scale_y = scaled_height / img_height
+    box = (left / scale_x, top / scale_y, (left + target_width) / scale_x, (top + target_height) / scale_y)
+
+    # reducing_gap does a cheap integer reduce() first when the source is much larger
+    with timing.span("resize"):
+        return image.resize(target_resolution, Image.Resampling.LANCZOS, box=box, reducing_gap=RESIZE_REDUCING_GAP)
+
+
+def get_image_paths(title, original_extension=".png"):
+    # Format and sanitize the title for filename
+    safe_title = "".join(c for c in title if c.isalnum() or c in [" ", "-", "_"]).rstrip()
+    image_path = os.path.join(IMAGE_DIR_PATH, f"{safe_title}{IMAGE_EXTENSIONS[ImageFormat(IMAGE_FORMAT)]}")
+    image_path_original = os.path.join(ORIGINAL_IMAGE_DIR_PATH, f"{safe_title}.original{original_extension}")
+    return image_path, image_path_original
+
+
+def find_existing_image(image_path):
+    stem = os.path.splitext(image_path)[0]
+    for extension in IMAGE_FILE_EXTENSIONS:
+        if os.path.exists(stem + extension):
+            return stem + extension
+    return None
 
-    # Crop the image
-    left = (image.width - target_width) / 2
-    top = (image.height - target_height) / 2
-    right = (image.width + target_width) / 2
-    bottom = (image.height + target_height) / 2
 
-    image = image.crop((left, top, right, bottom))
-    return image
+def save_image(image, path, quality=IMAGE_QUALITY, compress_level=PNG_COMPRESS_LEVEL):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jpg", ".jpeg"):
+        image.convert("RGB").save(path, "JPEG", quality=quality, optimize=True)
+    elif extension == ".webp":
+        image.save(path, "WEBP", quality=quality, method=4)
+    else:
+        image.save(path, "PNG", compress_level=compress_level)
 
 
-def set_gnome_background(image_path):
-    if not is_gnome():
-        return
+@timing.span("save_reddit_image")
+def save_reddit_image(url, title, target_resolution, download_url=None, progress=None):
+    # settles the post in the candidate index; connection problems, throttling, server errors
+    # and a canceled download say nothing about the post, so it stays pending
     try:
-        subprocess.run(
-            ESCAPE_FLATPAK + ["gsettings", "set", "org.gnome.desktop.background", "picture-uri", f"file://{image_path}"], check=True
-        )  # nosec B607, B603
-        subprocess.run(
-            ESCAPE_FLATPAK + ["gsettings", "set", "org.gnome.desktop.background", "picture-uri-dark", f"file://{image_path}"], check=True
-        )  # nosec B607, B603
-    except subprocess.CalledProcessError as e:
-        print(f"Error setting GNOME background: {e}")
-    else:
-        current_image_path = get_current_wallgarden_background()
-        if current_image_path:
-            update_image_properties(current_image_path, is_set=False)
-        update_image_properties(image_path, is_set=True)
+        status, image_path = fetch_reddit_image(url, title, target_resolution, download_url, progress)
+    except (OSError, ValueError) as e:
+        response = getattr(e, "response", None)
+        transient = response is None or response.status_code >= 500 or response.status_code in ratelimit.RETRY_STATUSES
+        if not isinstance(e, requests.RequestException) or not transient:
+            store.set_post_status(url, PostStatus.failed.value)
+        raise
+    store.set_post_status(url, POST_STATUSES[status].value, image_path)
+    return status, image_path
+
+
+def fetch_reddit_image(url, title, target_resolution, download_url=None, progress=None):
+    known_image_path = store.find_image_by_url(url)
+    if known_image_path and os.path.exists(known_image_path):
+        return DownloadStatus.exists, known_image_path
+    image_path, _ = get_image_paths(title)
+    # Check if image already exists
+    existing_image_path = find_existing_image(image_path)
+    if existing_image_path:
+        return DownloadStatus.exists, existing_image_path
+
+    temp_path = download_image(download_url or url, target_resolution, progress)
+    if not temp_path:
+        return DownloadStatus.too_small, None
+    try:
+        # drop exact and near duplicates before the expensive resize and encode
+        with timing.span("hash"):
+            sha256 = file_sha256(temp_path)
+            phash = file_dhash(temp_path)
+            duplicate_path = find_duplicate(sha256, phash)
+        if duplicate_path:
+            store.add_image_url(url, duplicate_path)
+            return DownloadStatus.duplicate, duplicate_path
+
+        with Image.open(temp_path) as image:
+            original_extension = get_original_extension(image)
+            final_image = render_image(upright(image), image_path, target_resolution)
+            if not final_image:
+                return DownloadStatus.too_small, None
+        # the original is kept byte for byte instead of being re-encoded
+        _, image_path_original = get_image_paths(title, original_extension)
+        os.replace(temp_path, image_path_original)
+        with timing.span("store"):
+            store.set_image_hashes(image_path, sha256, phash, url)
+            update_image_properties(image_path, width=final_image.width, height=final_image.height)
+            selection.refresh_image(image_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    with timing.span("gc"):
+        budget.record_image(image_path)
+        budget.enforce_budgets(keep=(image_path,))
+    return DownloadStatus.saved, image_path
+
+
+def get_original_extension(image):
+    return ORIGINAL_EXTENSIONS.get(image.format, f".{(image.format or 'img').lower()}")
+
+
+def render_image(image, image_path, target_resolution):
+    # saves image cropped to target_resolution and a rendition for every other connected
+    # monitor from one decode, largest first so a JPEG draft suits all of them; returns
+    # the target sized image or None when the source is too small
+    resolutions = sorted({tuple(target_resolution), *get_connected_resolutions()}, key=lambda r: r[0] * r[1], reverse=True)
+    renditions = {resolution: scale_and_crop(image, resolution) for resolution in resolutions}
+    final_image = renditions.pop(tuple(target_resolution))
+    if not final_image:
+        return None
+    with timing.span("encode"):
+        save_image(final_image, image_path)
+    with timing.span("renditions"):
+        for resolution, rendition in renditions.items():
+            if rendition:
+                save_image(rendition, ensure_rendition_dir(image_path, resolution))
+    return final_image
+
+
+def get_original_image_path(image_path):
+    title = os.path.splitext(os.path.basename(image_path))[0]
+    originals = glob.glob(os.path.join(glob.escape(ORIGINAL_IMAGE_DIR_PATH), f"{glob.escape(title)}.original.*"))
+    return originals[0] if originals else None
+
+
+def ensure_rendition_dir(image_path, resolution):
+    rendition_path = get_rendition_path(image_path, resolution)
+    os.makedirs(os.path.dirname(rendition_path), exist_ok=True)
+    return rendition_path
+
+
+def save_renditions(image, image_path, resolutions):
+    # largest first, so a JPEG draft is chosen for the biggest target and reused by the rest
+    rendition_paths = {}
+    for resolution in sorted(resolutions, key=lambda r: r[0] * r[1], reverse=True):
+        rendition = scale_and_crop(image, resolution)
+        if rendition:
+            rendition_path = ensure_rendition_dir(image_path, resolution)
+            save_image(rendition, rendition_path)
+            budget.record_usage(image_bytes=budget.file_size(rendition_path))
+            rendition_paths[resolution] = rendition_path
+    return rendition_paths
+
+
+def get_rendition(image_path, resolution):
+    # returns the image rendered for resolution, creating it from the original
+    # the first time a resolution is seen; falls back to image_path itself
+    if not resolution or not all(resolution):
+        return image_path
+    resolution = tuple(resolution)
+    rendition_path = get_rendition_path(image_path, resolution)
+    if os.path.exists(rendition_path):
+        return rendition_path
+    with Image.open(image_path) as image:
+        if image.size == resolution:
+            update_image_properties(image_path, width=image.width, height=image.height)
+            return image_path
+    original_path = get_original_image_path(image_path)
+    if not original_path:
+        return image_path
+    with Image.open(original_path) as original:
+        return save_renditions(upright(original), image_path, [resolution]).get(resolution, image_path)
 
 
 def get_random_reddit_image(subreddit, sort, timeframe, limit, target_resolution):
-    json_data = query_reddit(subreddit, sort, timeframe, limit)
-    filtered_images = parse_reddit(json_data, target_resolution)
-
-    if filtered_images:
-        selected_url = random.choice(list(filtered_images.keys()))  # nosec B311
-        _, _, title = filtered_images[selected_url]
-        # Format and sanitize the title for filename
-        safe_title = "".join(c for c in title if c.isalnum() or c in [" ", "-", "_"]).rstrip()
-        image_path = os.path.join(IMAGE_DIR_PATH, f"{safe_title}.png")
-        image_path_original = os.path.join(ORIGINAL_IMAGE_DIR_PATH, f"{safe_title}.original.png")
-        # Check if image already exists
-        if not os.path.exists(image_path):
-            image = download_image(selected_url)
-            image.save(image_path_original, "PNG")
-            final_image = scale_and_crop(image, target_resolution)
-            if final_image:
-                final_image.save(image_path, "PNG")
-            else:
-                update_image_properties(image_path, fetch=False)
-                return None
-        else:
-            print(f"Image '{image_path}' already exists.")
-
+    # the listing is only queried once the candidate index has no untried post among its first limit posts,
+    # which includes a listing that was never indexed
+    listings = [(sort, timeframe)]
+    image_path = save_pending_post(target_resolution, [subreddit], listings, max_rank=limit)
+    if image_path:
         return image_path
+    index_listing(query_reddit(subreddit, sort, timeframe, limit), target_resolution, sort, timeframe)
+    return save_pending_post(target_resolution, [subreddit], listings, max_rank=limit)
+
+
+def save_pending_post(target_resolution, subreddits=None, listings=None, max_rank=None, progress=None):
+    # every post is claimed before it is downloaded; one that is not settled, because of a transient
+    # error or a cancel, is released for the next job
+    tried = []
+    for _ in range(PICK_ATTEMPTS):
+        post = store.claim_pending_post(target_resolution, subreddits, listings, max_rank, exclude=tried)
+        if not post:
+            return None
+        tried.append(post["url"])
+        try:
+            _, image_path = save_reddit_image(post["url"], post["title"], target_resolution, post["download_url"], progress)
+        except (OSError, ValueError) as e:
+            print(f"Error downloading {post['url']}: {e}")
+            continue
+        finally:
+            store.release_post(post["url"])
+        if image_path:
+            return image_path
     return None
 
 
-def get_current_wallgarden_background():
-    image_properties = load_image_properties()
-    for image in image_properties:
-        if image_properties[image]["is_set"]:
-            return image
+def get_pending_candidates(target_resolution, subreddits=None, count=1, listings=None, max_rank=None):
+    # untried posts from earlier listings, in the shape of parse_reddit
+    return to_candidates(store.find_pending_posts(target_resolution, subreddits, listings, max_rank, limit=count))
 
 
-def get_monitor_resolutions():
-    drm_dir = "/sys/class/drm/"
+def save_random_candidate(filtered_images, target_resolution, progress=None):
+    # posts that were already downloaded, too small or failed are never tried again
+    settled_urls = store.find_settled_urls(filtered_images)
+    candidates = [url for url in filtered_images if url not in settled_urls]
+    if candidates:
+        selected_url = random.choice(candidates)  # nosec B311
+        _, _, title, download_url = filtered_images[selected_url]
+        status, image_path = save_reddit_image(selected_url, title, target_resolution, download_url, progress)
+        if status == DownloadStatus.exists:
+            print(f"Image '{image_path}' already exists.")
+        return image_path
+    return None
 
-    # Regex to extract resolution
-    resolution_pattern = re.compile(r"(\d+)x(\d+)")
 
-    width, height = (0, 0)
-    for card in os.listdir(drm_dir):
-        modes_path = os.path.join(drm_dir, card, "modes")
-        if os.path.exists(modes_path):
-            with open(modes_path, "r") as file:
-                for mode in file:
-                    match = resolution_pattern.match(mode.strip())
-                    if match:
-                        this_width, this_height = match.groups()
-                        this_width = int(this_width)
-                        this_height = int(this_height)
-                        if this_width * this_height > width * height:
-                            width = this_width
-                            height = this_height
+def download_candidates(filtered_images, target_resolution, count, workers=DEFAULT_DOWNLOAD_WORKERS):
+    settled_urls = store.find_settled_urls(filtered_images)
+    filtered_images = {url: props for url, props in filtered_images.items() if url not in settled_urls}
+    selected_urls = random.sample(list(filtered_images.keys()), min(count, len(filtered_images)))  # nosec B311
 
-    return width, height
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(save_reddit_image, url, filtered_images[url][2], target_resolution, filtered_images[url][3]): url for url in selected_urls
+        }
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                status, image_path = future.result()
+            except Exception as e:
+                print(f"Error downloading {url}: {e}")
+                status, image_path = DownloadStatus.failed, None
+            results.append((url, status, image_path))
+    return results
 
 
 def update_image_properties(filepath, **properties):
-    data = load_image_properties()
-    if filepath not in data:
-        data[filepath] = DEFAULT_IMAGE_PROPS
-    data[filepath].update(properties)
-    save_json_data(data)
+    store.update_image_properties(filepath, **properties)
+    if "pinned" in properties or "hidden" in properties:
+        selection.refresh_image(filepath)
 
 
 def init_image_properties():
-    data = load_image_properties()
-
-    # Specify the directory where your images are stored
-    for filename in os.listdir(IMAGE_DIR_PATH):
-        filepath = os.path.join(IMAGE_DIR_PATH, filename)
-        if filepath.lower().endswith((".jpg", ".png", ".jpeg")):
-            if filepath not in data:
-                data[filepath] = DEFAULT_IMAGE_PROPS
-            else:
-                for prop in DEFAULT_IMAGE_PROPS:
-                    if prop not in data[filepath]:
-                        data[filepath][prop] = DEFAULT_IMAGE_PROPS[prop]
-
-    save_json_data(data)
-    return data
-
-
-def get_random_image(filter_dict=None):
-    if filter_dict is None:
-        filter_dict = {"is_set": False}
-    images_dict = load_image_properties()
-    filtered_list = []
-    for image in images_dict:
-        image_props = images_dict[image]
-        image_props_subset = {k: image_props[k] for k in filter_dict.keys() if k in image_props}
-        if image_props_subset == filter_dict:
-            filtered_list.append(image)
-
-    return random.choice(filtered_list)  # nosec B311
-
-
-def get_random_pinned_image():
-    return get_random_image(filter_dict={"is_set": False, "pinned": True})
+    index.reconcile(IMAGE_DIR_PATH)
+    return load_image_properties()
 
 
 def load_image_properties():
-    # Check if the file exists
-    if not os.path.exists(JSON_PATH):
-        # If not, create an empty JSON file
-        with open(JSON_PATH, "w") as file:
-            json.dump({}, file)
-
-    # Now, safely load the file
-    try:
-        with open(JSON_PATH, "r") as file:
-            return json.load(file)
-    except json.JSONDecodeError:
-        # Handle the case where the file is empty or corrupted
-        return {}
+    return store.load_image_properties()
 
 
-def save_json_data(data):
-    with open(JSON_PATH, "w") as file:
-        json.dump(data, file, indent=4)
+def get_image_properties(filepath):
+    return store.get_image_properties(filepath)
@@ -0,0 +1,86 @@
+import os
+import signal
+import time
+from collections import deque
+
+from wallgarden import timing
+from wallgarden.config import DEFAULT_QUEUE_SIZE
+from wallgarden.core import get_rendition
+from wallgarden.utils import is_gnome
+from wallgarden.wallpaper import apply_gnome_background, get_current_wallgarden_background, get_monitor_resolutions, get_random_image
+
+# attempts to find an image that is neither current nor already queued
+SELECTION_ATTEMPTS = 10
+
+
+class Slideshow:
+    def __init__(self, pinned=False, queue_size=DEFAULT_QUEUE_SIZE):
+        self.pinned = pinned
+        self.queue_size = queue_size
+        # (image_path, picture_path, resolution) rendered ahead of time
+        self.queue = deque()
+
+    def select_image(self):
+        filter_dict = {"hidden": False, "pinned": True} if self.pinned else None
+        taken = {image_path for image_path, _, _ in self.queue}
+        taken.add(get_current_wallgarden_background())
+        image_path = None
+        for _ in range(SELECTION_ATTEMPTS):
+            image_path = get_random_image(filter_dict)
+            if image_path not in taken:
+                break
+        return image_path
+
+    def prepare(self, image_path, resolution):
+        return image_path, get_rendition(image_path, resolution), resolution
+
+    def refill(self):
+        resolution = get_monitor_resolutions()
+        while len(self.queue) < self.queue_size:
+            image_path = self.select_image()
+            if not image_path:
+                break
+            try:
+                self.queue.append(self.prepare(image_path, resolution))
+            except OSError as e:
+                print(f"Error preparing {image_path}: {e}")
+                break
+
+    def rotate(self):
+        resolution = get_monitor_resolutions()
+        while self.queue:
+            image_path, picture_path, rendered_resolution = self.queue.popleft()
+            if not os.path.exists(picture_path):
+                continue
+            if rendered_resolution != resolution:
+                # a monitor was swapped since the queue was filled
+                image_path, picture_path, _ = self.prepare(image_path, resolution)
+            apply_gnome_background(image_path, picture_path)
+            return image_path
+        return None
+
+
+def stop(signum, frame):
+    # systemd stops the service with SIGTERM, exiting through SystemExit runs the pending finally blocks
+    raise SystemExit(0)
+
+
+def run_slideshow(minutes, pinned=False, queue_size=DEFAULT_QUEUE_SIZE, reports=None):
+    # reports are timing.write_reports options, written and cleared after every rotation
+    if not is_gnome():
+        print("The slideshow requires a GNOME session.")
+        return
+    signal.signal(signal.SIGTERM, stop)
+    slideshow = Slideshow(pinned=pinned, queue_size=queue_size)
+    slideshow.refill()
+    while True:
+        started = time.monotonic()
+        with timing.span("rotation"):
+            if not slideshow.rotate():
+                print("No images available to set as wallpaper.")
+            # render the next wallpapers while waiting so the next rotation is a single settings write
+            slideshow.refill()
+        if reports is not None:
+            timing.write_reports(**reports)
+            timing.reset()
+        time.sleep(max(0, minutes * 60 - (time.monotonic() - started)))
@@ -0,0 +1,60 @@
+import hashlib
+
+from PIL import ExifTags, Image, ImageOps
+
+from wallgarden import store
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# dHash bits that may differ between two copies of the same photo, must stay
+# below store.PHASH_BANDS for the band lookup to find every match
+NEAR_DUPLICATE_DISTANCE = 6
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dhash(image, hash_size=8):
+    # difference hash: compares neighbouring pixels of a tiny grayscale copy,
+    # a JPEG is drafted so only a 1/8 scale DCT decode is needed
+    image.draft("L", (hash_size * 8, hash_size * 8))
+    pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BOX).getdata())
+    value = 0
+    for row in range(hash_size):
+        for column in range(hash_size):
+            offset = row * (hash_size + 1) + column
+            value = (value << 1) | (pixels[offset] > pixels[offset + 1])
+    return value
+
+
+def upright(image):
+    # camera photos can be stored sideways with an EXIF orientation; transposing loads the
+    # whole image, so upright ones are returned untouched and keep their JPEG draft
+    if image.getexif().get(ExifTags.Base.Orientation, 1) != 1:
+        return ImageOps.exif_transpose(image)
+    return image
+
+
+def file_dhash(path, hash_size=8):
+    with Image.open(path) as image:
+        # the draft is requested before upright() loads a rotated image
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        return dhash(upright(image), hash_size)
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def find_duplicate(sha256, phash):
+    exact = store.find_image_by_sha256(sha256)
+    if exact:
+        return exact
+    for path, candidate_phash in store.find_phash_candidates(phash):
+        if hamming_distance(phash, candidate_phash) <= NEAR_DUPLICATE_DISTANCE:
+            return path
+    return None
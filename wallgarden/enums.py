@@ -0,0 +1,25 @@
+from enum import Enum
+
+
+class Timeframe(Enum):
+    all = "all"
+    day = "day"
+    hour = "hour"
+    month = "month"
+    week = "week"
+    year = "year"
+
+
+class Sort(Enum):
+    hot = "hot"
+    new = "new"
+    rising = "rising"
+    controversial = "controversial"
+    top = "top"
+    best = "best"
+
+
+class ImageFormat(Enum):
+    png = "png"
+    jpeg = "jpeg"
+    webp = "webp"
@@ -1,53 +1,116 @@
 import os
 import random
-import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import gi
 
-from wallgarden.config import IMAGE_DIR_PATH, PROJECT_PATH
+from wallgarden import timing
+from wallgarden.config import DEFAULT_DOWNLOAD_WORKERS, IMAGE_DIR_PATH, PROFILE_JSONL_PATH, PROFILE_TEXTFILE_PATH, PROJECT_PATH, TEXTURE_CACHE_BUDGET
 from wallgarden.core import (
     Sort,
     Timeframe,
+    get_image_properties,
     get_monitor_resolutions,
-    get_random_reddit_image,
     init_image_properties,
+    save_pending_post,
+    save_random_candidate,
     set_gnome_background,
     update_image_properties,
 )
+from wallgarden.index import apply_change, get_library_files
+from wallgarden.listing import get_reddit_candidates
+from wallgarden.thumbnails import THUMBNAIL_WIDTH, ensure_thumbnail
 
 gi.require_version("Gtk", "4.0")
 gi.require_version("Gdk", "4.0")
 
 from gi.repository import Gdk, GdkPixbuf, Gio, GLib, GObject, Gtk  # noqa: E402
 
+THUMBNAIL_WORKERS = os.cpu_count() or 4
+# label and maximum age in seconds of the date filter
+DATE_FILTERS = [("Any time", None), ("Past day", 24 * 3600), ("Past week", 7 * 24 * 3600), ("Past month", 30 * 24 * 3600)]
+
+
+class TextureCache:
+    # least recently used textures of the cached thumbnail files, bounded by their decoded size;
+    # an evicted texture is freed once no bound row still shows it
+    def __init__(self, budget=TEXTURE_CACHE_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self.textures = OrderedDict()
+
+    def get(self, thumbnail):
+        key = (thumbnail.filepath, thumbnail.last_modified)
+        if key in self.textures:
+            self.textures.move_to_end(key)
+            return self.textures[key][0]
+        with timing.span("texture"):
+            texture = Gdk.Texture.new_for_pixbuf(GdkPixbuf.Pixbuf.new_from_file(thumbnail.thumbnail_path))
+        size = texture.get_width() * texture.get_height() * 4
+        self.textures[key] = (texture, size)
+        self.size += size
+        while self.size > self.budget and len(self.textures) > 1:
+            _, (_, evicted_size) = self.textures.popitem(last=False)
+            self.size -= evicted_size
+        return texture
+
+    def discard(self, filepath):
+        for key in [key for key in self.textures if key[0] == filepath]:
+            self.size -= self.textures.pop(key)[1]
+
+    def clear(self):
+        self.textures.clear()
+        self.size = 0
+
 
 class Thumbnail(GObject.Object):
-    def __init__(self, pixbuf, filepath, hidden=False, pinned=False):
+    # only the path and metadata are kept, pixels are decoded on demand by the texture cache
+    def __init__(self, filepath, thumbnail_path, aspect_ratio, hidden=False, pinned=False, width=None, height=None):
         super().__init__()
-        self.pixbuf = pixbuf
         self.filepath = filepath
+        self.thumbnail_path = thumbnail_path
+        self.aspect_ratio = aspect_ratio
         self.hidden = hidden
         self.pinned = pinned
+        # size of the stored wallpaper, None for images saved before it was recorded
+        self.width = width
+        self.height = height
         self.last_modified = os.path.getmtime(filepath)
 
     def toggle_pinned(self):
         self.pinned = not self.pinned
         # update_image_properties(self.filename, pinned=self.pinned)
 
+    def toggle_hidden(self):
+        self.hidden = not self.hidden
+
     def set_wallpaper(self):
         set_gnome_background(self.filepath)
 
 
+def compare_thumbnails(a, b, *user_data):
+    # pinned first, then newest first; the path breaks ties so positions can be bisected
+    if a.pinned != b.pinned:
+        return -1 if a.pinned else 1
+    if a.last_modified != b.last_modified:
+        return -1 if a.last_modified > b.last_modified else 1
+    return (a.filepath > b.filepath) - (a.filepath < b.filepath)
+
+
 class ThumbnailRow(Gtk.Overlay):
-    def __init__(self, thumbnail_single_selection):
+    width = THUMBNAIL_WIDTH
+
+    def __init__(self, window, texture_cache):
         super().__init__()
-        self.thumbnail_single_selection = thumbnail_single_selection
+        self.window = window
+        self.texture_cache = texture_cache
         self.picture = Gtk.Picture()
         self.thumbnail = None
         self.add_overlay(self.picture)
         self.set_vexpand(False)
         self.set_hexpand(False)
-        self.width = 200
 
         # Create the button and add it to the box, but make it initially invisible
         self.pin_button = Gtk.Button(icon_name="view-pin")
@@ -58,6 +121,14 @@ class ThumbnailRow(Gtk.Overlay):
         self.pin_button.connect("clicked", self.on_pin_button_clicked)
         self.add_overlay(self.pin_button)
 
+        self.hide_button = Gtk.Button(icon_name="view-conceal")
+        self.hide_button.set_halign(Gtk.Align.START)
+        self.hide_button.set_valign(Gtk.Align.START)
+        self.hide_button.set_visible(False)
+        self.hide_button.get_style_context().add_class("overlay-button")
+        self.hide_button.connect("clicked", self.on_hide_button_clicked)
+        self.add_overlay(self.hide_button)
+
         self.set_button = Gtk.Button(icon_name="zoom-fit-best")  # or document-send
         self.set_button.set_halign(Gtk.Align.CENTER)
         self.set_button.set_valign(Gtk.Align.CENTER)
@@ -75,61 +146,153 @@ class ThumbnailRow(Gtk.Overlay):
 
     def set_thumbnail(self, thumbnail):
         self.thumbnail = thumbnail
-        if thumbnail.pinned:
-            self.pin_button.set_visible(True)
-        pixbuf_ratio = thumbnail.pixbuf.get_height() / thumbnail.pixbuf.get_width()
-        height = self.width * pixbuf_ratio
-        self.set_size_request(self.width, height)
-        self.picture.set_pixbuf(thumbnail.pixbuf)
-        texture = Gdk.Texture.new_for_pixbuf(thumbnail.pixbuf)
-        self.picture.set_paintable(texture)
+        # rows are recycled, so every flag dependent widget is reset here
+        self.pin_button.set_visible(thumbnail.pinned)
+        self.hide_button.set_visible(thumbnail.hidden)
+        if thumbnail.hidden:
+            self.add_css_class("hidden-thumbnail")
+        else:
+            self.remove_css_class("hidden-thumbnail")
+        self.set_size_request(self.width, self.width * thumbnail.aspect_ratio)
+        try:
+            self.picture.set_paintable(self.texture_cache.get(thumbnail))
+        except GLib.Error as e:
+            print(f"Error loading thumbnail {os.path.basename(thumbnail.filepath)}: {e}")
+            self.picture.set_paintable(None)
+
+    def clear_thumbnail(self):
+        # drops the row's reference so the texture cache alone decides what stays decoded
+        self.thumbnail = None
+        self.picture.set_paintable(None)
 
     def on_mouse_enter(self, controller, x, y):
         self.pin_button.set_visible(True)
+        self.hide_button.set_visible(True)
         self.set_button.set_visible(True)
 
     def on_mouse_leave(self, controller):
         self.set_button.set_visible(False)
+        if not self.thumbnail:
+            return
         if not self.thumbnail.pinned:
             self.pin_button.set_visible(False)
+        if not self.thumbnail.hidden:
+            self.hide_button.set_visible(False)
 
     def on_pin_button_clicked(self, button):
         if self.thumbnail:
             self.thumbnail.toggle_pinned()
             update_image_properties(self.thumbnail.filepath, pinned=self.thumbnail.pinned, hidden=self.thumbnail.hidden)
+            self.window.thumbnail_changed(self.thumbnail)
+
+    def on_hide_button_clicked(self, button):
+        if self.thumbnail:
+            self.thumbnail.toggle_hidden()
+            update_image_properties(self.thumbnail.filepath, pinned=self.thumbnail.pinned, hidden=self.thumbnail.hidden)
+            self.window.thumbnail_changed(self.thumbnail)
 
     def on_set_button_clicked(self, button):
         if self.thumbnail:
             self.thumbnail.set_wallpaper()
-            # Find the index of this thumbnail in the model and set the selection
-            for index, item in enumerate(self.thumbnail_single_selection.get_model()):
-                if item == self.thumbnail:
-                    self.thumbnail_single_selection.set_selected(index)
-                    break
+            self.window.select_thumbnail(self.thumbnail)
+
+
+class DownloadRow(Gtk.Box):
+    # one queued download: the parameters are read from the widgets on the main loop when it is
+    # queued, the worker only reports through report_progress and GLib.idle_add
+    update_interval = 0.2
+
+    def __init__(self, subreddits, sort, timeframe, limit, candidates, target_resolution, set_when_done=False):
+        super().__init__(spacing=6)
+        self.subreddits = subreddits
+        self.sort = sort
+        self.timeframe = timeframe
+        self.limit = limit
+        # candidates to gather across the subreddits' pages, None for the first page of each
+        self.candidates = candidates
+        self.target_resolution = target_resolution
+        self.set_when_done = set_when_done
+        self.cancellable = Gio.Cancellable()
+        self.started = None
+        self.last_update = 0.0
+
+        self.label = Gtk.Label(label=f"r/{', r/'.join(subreddits)}: queued", hexpand=True, xalign=0)
+        self.append(self.label)
+        self.progress_bar = Gtk.ProgressBar(valign=Gtk.Align.CENTER)
+        self.append(self.progress_bar)
+        self.cancel_button = Gtk.Button(icon_name="process-stop")
+        self.cancel_button.connect("clicked", self.on_cancel_clicked)
+        self.append(self.cancel_button)
+
+    def on_cancel_clicked(self, button):
+        self.cancellable.cancel()
+        self.cancel_button.set_sensitive(False)
+        self.set_status("canceling")
+
+    def set_status(self, status):
+        self.label.set_text(f"r/{', r/'.join(self.subreddits)}: {status}")
+        return GLib.SOURCE_REMOVE
+
+    def report_progress(self, received, total):
+        # called per chunk on the worker, raises GLib.Error once the job is canceled
+        self.cancellable.set_error_if_cancelled()
+        now = time.monotonic()
+        if self.started is None:
+            self.started = now
+        if now - self.last_update < self.update_interval and received != total:
+            return
+        self.last_update = now
+        GLib.idle_add(self.show_progress, received, total, received / max(now - self.started, 1e-3))
+
+    def show_progress(self, received, total, throughput):
+        if total:
+            self.progress_bar.set_fraction(received / total)
+            self.set_status(f"{received / 1e6:.1f} of {total / 1e6:.1f} MB, {throughput / 1e6:.1f} MB/s")
+        else:
+            self.progress_bar.pulse()
+            self.set_status(f"{received / 1e6:.1f} MB, {throughput / 1e6:.1f} MB/s")
+        return GLib.SOURCE_REMOVE
 
 
 class WallgardenWindow(Gtk.ApplicationWindow):
     def __init__(self, **kargs):
         super().__init__(**kargs, title="Wallgarden")
         self.image_props = init_image_properties()
+        self.closing = False
+        # path of a downloaded image to select once its thumbnail is in the grid
+        self.pending_selection = None
+        self.thumbnail_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+        self.texture_cache = TextureCache()
+        self.download_executor = ThreadPoolExecutor(max_workers=DEFAULT_DOWNLOAD_WORKERS)
+        self.download_rows = set()
+        self.connect("close-request", self.on_close_request)
         box_main = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
         box_main.set_name("box_main")
         self.set_child(box_main)
-        # ListModel for Thumbnails
+        # ListModel for Thumbnails, in path order; the grid sees it through a filter and a sort layer
+        # that only re-evaluate the items reported as changed
         self.thumbnail_model = Gio.ListStore(item_type=Thumbnail)
+        self.thumbnails = {}
+        self.thumbnail_filter = Gtk.CustomFilter.new(self.filter_thumbnail, None)
+        self.filter_model = Gtk.FilterListModel(model=self.thumbnail_model, filter=self.thumbnail_filter, incremental=True)
+        self.thumbnail_sorter = Gtk.CustomSorter.new(compare_thumbnails, None)
+        self.sort_model = Gtk.SortListModel(model=self.filter_model, sorter=self.thumbnail_sorter)
         self.load_thumbnails()
+        self.start_library_monitor()
+
+        box_main.append(self._create_filter_bar())
 
         # ScrolledWindow for GridView
         scrolled_window = Gtk.ScrolledWindow(vexpand=True)
 
         # GridView for Thumbnails
-        self.thumbnail_single_selection = Gtk.SingleSelection.new(model=self.thumbnail_model)
+        self.thumbnail_single_selection = Gtk.SingleSelection.new(model=self.sort_model)
         self.thumbnail_single_selection.connect("notify::selected-item", self.on_selection_changed)
         self.grid_view = Gtk.GridView(model=self.thumbnail_single_selection)
-        self.sort_thumbnails()
         thumb_factory = Gtk.SignalListItemFactory()
         thumb_factory.connect("setup", self.setup_thumb_factory)
         thumb_factory.connect("bind", self.bind_thumb_factory)
+        thumb_factory.connect("unbind", self.unbind_thumb_factory)
         self.grid_view.set_factory(thumb_factory)
         scrolled_window.set_child(self.grid_view)
         box_main.append(scrolled_window)
@@ -169,6 +332,7 @@ class WallgardenWindow(Gtk.ApplicationWindow):
         self.dropdown_sort.set_selected(sum([i for i, x in enumerate(Sort) if x == Sort.top]))
         self.dropdown_sort.connect("notify::selected", self.print_selected)
         self.entry_limit = Gtk.Entry(text="25")
+        self.entry_candidates = Gtk.Entry(placeholder_text="first page")
 
         # Dictionary of labels and corresponding inputs
         label_input_reddit = {
@@ -176,6 +340,7 @@ class WallgardenWindow(Gtk.ApplicationWindow):
             "Timeframe:": self.dropdown_timeframe,
             "Sort:": self.dropdown_sort,
             "Limit:": self.entry_limit,
+            "Candidates:": self.entry_candidates,
         }
         grid_reddit = self._create_input_grid(label_input_reddit)
         frame_reddit.set_child(grid_reddit)
@@ -189,6 +354,8 @@ class WallgardenWindow(Gtk.ApplicationWindow):
         self.connect("realize", self.on_realize)
         self.width_entry = Gtk.Entry(text="None")
         self.height_entry = Gtk.Entry(text="None")
+        self.width_entry.connect("changed", self.on_resolution_changed)
+        self.height_entry.connect("changed", self.on_resolution_changed)
 
         label_input_resolution = {"width:": self.width_entry, "height:": self.height_entry}
         grid_resolution = self._create_input_grid(label_input_resolution)
@@ -211,6 +378,10 @@ class WallgardenWindow(Gtk.ApplicationWindow):
         self.label_status = Gtk.Label()
         box_dl_status.append(self.label_status)
 
+        # Download queue, a row per job until shortly after it finishes
+        self.box_downloads = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
+        box_main.append(self.box_downloads)
+
         # Set wallpaper
         box_set_wallpaper = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
         box_main.append(box_set_wallpaper)
@@ -226,39 +397,81 @@ class WallgardenWindow(Gtk.ApplicationWindow):
     def print_selected(self, x, _):
         print(x.get_selected_item().get_string())
 
-    def on_download_clicked(self, widget):
-        self.label_status.set_text("Downloading...")
-
-        # Start the download in a separate thread
-        download_thread = threading.Thread(target=self.download_wallpaper)
-        download_thread.start()
-
-    def download_wallpaper(self):
-        subreddit = self.entry_subreddit.get_text()
+    def on_download_clicked(self, widget, set_when_done=False):
+        # widgets are only read here on the main loop, the job carries its own copy of the settings
+        subreddits = [subreddit.strip() for subreddit in self.entry_subreddit.get_text().split(",") if subreddit.strip()]
         sort = self.dropdown_sort.get_selected_item().get_string()
         timeframe = self.dropdown_timeframe.get_selected_item().get_string()
-        limit = int(self.entry_limit.get_text())
-        target_resolution = (int(self.width_entry.get_text()), int(self.height_entry.get_text()))
-
-        image_path = get_random_reddit_image(subreddit, sort, timeframe, limit, target_resolution)
-        if image_path and image_path not in self.image_props:
-            update_image_properties(image_path)
-            GLib.idle_add(self.download_complete, image_path)
+        try:
+            limit = int(self.entry_limit.get_text())
+            candidates = int(self.entry_candidates.get_text()) if self.entry_candidates.get_text().strip() else None
+            target_resolution = (int(self.width_entry.get_text()), int(self.height_entry.get_text()))
+        except ValueError:
+            self.label_status.set_text("Limit, candidates, width and height must be numbers")
+            return
+        if not subreddits:
+            self.label_status.set_text("No subreddit given")
+            return
+        if candidates is not None and candidates <= 0:
+            self.label_status.set_text("Candidates must be positive")
+            return
+
+        row = DownloadRow(subreddits, sort, timeframe, limit, candidates, target_resolution, set_when_done)
+        self.download_rows.add(row)
+        self.box_downloads.append(row)
+        self.update_download_status()
+        self.download_executor.submit(self.download_wallpaper, row)
+
+    def download_wallpaper(self, row):
+        # runs on the download pool; the outcome goes back to the main loop through download_complete
+        image_path, error = None, None
+        try:
+            row.cancellable.set_error_if_cancelled()
+            # untried posts seen earlier in the same listing go first, it is only crawled once none is left
+            max_rank = row.limit if row.candidates is None else None
+            image_path = save_pending_post(row.target_resolution, row.subreddits, [(row.sort, row.timeframe)], max_rank, row.report_progress)
+            if not image_path:
+                GLib.idle_add(row.set_status, "fetching listing")
+                filtered_images = get_reddit_candidates(
+                    row.subreddits, [(row.sort, row.timeframe)], row.target_resolution, count=row.candidates, page_limit=row.limit
+                )
+                row.cancellable.set_error_if_cancelled()
+                image_path = save_random_candidate(filtered_images, row.target_resolution, row.report_progress)
+            if image_path:
+                update_image_properties(image_path)
+        except GLib.Error as e:
+            error = "canceled" if e.matches(Gio.io_error_quark(), Gio.IOErrorEnum.CANCELLED) else f"failed: {e.message}"
+        except Exception as e:
+            error = f"failed: {e}"
+        GLib.idle_add(self.download_complete, row, image_path, error)
+
+    def download_complete(self, row, image_path, error):
+        row.cancel_button.set_sensitive(False)
+        if error:
+            row.set_status(error)
+        elif image_path and os.path.exists(image_path):
+            row.progress_bar.set_fraction(1.0)
+            row.set_status("complete")
+            self.add_thumbnail(image_path, select=True)
+            # only the job that asked for it sets its own image, whatever is selected by now
+            if row.set_when_done:
+                set_gnome_background(image_path)
         else:
-            self.label_status.set_text("")
-
-    def download_complete(self, image_path):
-        if os.path.exists(image_path):
-            self.add_thumbnail(image_path)
-            self.thumbnail_single_selection.set_selected(self.thumbnail_single_selection.get_n_items() - 1)
-            # self.on_set_selected_clicked(None)
-            self.label_status.set_text("Complete!")
-        else:
-            self.label_status.set_text("Download failed or canceled")
+            row.set_status("no new image found")
+        GLib.timeout_add_seconds(5, self.remove_download_row, row)
+        return GLib.SOURCE_REMOVE
+
+    def remove_download_row(self, row):
+        self.download_rows.discard(row)
+        self.box_downloads.remove(row)
+        self.update_download_status()
+        return GLib.SOURCE_REMOVE
+
+    def update_download_status(self):
+        self.label_status.set_text(f"{len(self.download_rows)} download(s)" if self.download_rows else "")
 
     def on_download_set_clicked(self, widget):
-        self.on_download_clicked(widget)
-        self.on_set_selected_clicked(widget)
+        self.on_download_clicked(widget, set_when_done=True)
 
     def on_set_selected_clicked(self, widget):
         selected_wallpaper = self.thumbnail_single_selection.get_selected_item()
@@ -268,7 +481,9 @@ class WallgardenWindow(Gtk.ApplicationWindow):
             print("No item selected")
 
     def on_selection_changed(self, selection, param):
-        self.label_selected.set_text(os.path.basename(selection.get_selected_item().filepath))
+        # the selected item can be filtered out of the view
+        thumbnail = selection.get_selected_item()
+        self.label_selected.set_text(os.path.basename(thumbnail.filepath) if thumbnail else "")
 
     def select_random_thumb(self):
         random_index = random.randint(0, self.thumbnail_single_selection.get_n_items() - 1)
@@ -286,7 +501,7 @@ class WallgardenWindow(Gtk.ApplicationWindow):
             print("No item selected")
 
     def setup_thumb_factory(self, factory, list_item):
-        list_item.set_child(ThumbnailRow(self.thumbnail_single_selection))
+        list_item.set_child(ThumbnailRow(self, self.texture_cache))
 
     def bind_thumb_factory(self, factory, list_item):
         row = list_item.get_child()
@@ -294,44 +509,196 @@ class WallgardenWindow(Gtk.ApplicationWindow):
         if thumbnail:
             row.set_thumbnail(thumbnail)
 
+    def unbind_thumb_factory(self, factory, list_item):
+        list_item.get_child().clear_thumbnail()
+
     def load_thumbnails(self):
+        # the library index was just reconciled by init_image_properties, no directory listing needed
         self.thumbnail_model.remove_all()
-        for filename in os.listdir(IMAGE_DIR_PATH):
-            if filename.lower().endswith((".jpg", ".png", ".jpeg")):
-                filepath = os.path.join(IMAGE_DIR_PATH, filename)
-                try:
-                    pixbuf = GdkPixbuf.Pixbuf.new_from_file(filepath)  # Load the image without scaling
-                    hidden = False
-                    pinned = False
-                    if filepath in self.image_props:
-                        hidden = self.image_props[filepath]["hidden"]
-                        pinned = self.image_props[filepath]["pinned"]
-                    thumbnail = Thumbnail(pixbuf, filepath, hidden, pinned)
-                    self.thumbnail_model.append(thumbnail)
-                except Exception as e:
-                    print(f"Error loading image {filename}: {e}")
-
-    def sort_thumbnails(self):
-        # Create a new ListStore for sorted thumbnails
-        sorted_thumbnail_model = Gio.ListStore(item_type=Thumbnail)
-
-        # First, add all pinned thumbnails, sorted by last modified date
-        for thumbnail in sorted([t for t in self.thumbnail_model if t.pinned], key=lambda t: t.last_modified, reverse=True):
-            sorted_thumbnail_model.append(thumbnail)
-
-        # Then, add all unpinned thumbnails
-        for thumbnail in [t for t in self.thumbnail_model if not t.pinned]:
-            sorted_thumbnail_model.append(thumbnail)
-
-        # Replace the original model with the sorted one
-        self.thumbnail_model = sorted_thumbnail_model
-        self.thumbnail_single_selection.set_model(self.thumbnail_model)
-        self.grid_view.set_model(self.thumbnail_single_selection)
-
-    def add_thumbnail(self, filepath):
-        pixbuf = GdkPixbuf.Pixbuf.new_from_file(filepath)  # Load the image without scaling
-        thumbnail = Thumbnail(pixbuf, filepath)
-        self.thumbnail_model.append(thumbnail)
+        self.thumbnails.clear()
+        for filepath in get_library_files(IMAGE_DIR_PATH):
+            self.thumbnail_executor.submit(self.load_thumbnail, filepath, self.image_props.get(filepath, {}))
+
+    def start_library_monitor(self):
+        # files written by the cli or the slideshow timer while the window is open arrive as deltas;
+        # the monitor stops once garbage collected, so it is kept on the window
+        self.library_monitor = Gio.File.new_for_path(IMAGE_DIR_PATH).monitor_directory(Gio.FileMonitorFlags.WATCH_MOVES, None)
+        self.library_monitor.connect("changed", self.on_library_changed)
+
+    def on_library_changed(self, monitor, file, other_file, event_type):
+        # a created file is picked up at CHANGES_DONE_HINT, once it is completely written
+        events = Gio.FileMonitorEvent
+        if event_type in (events.CHANGES_DONE_HINT, events.DELETED, events.MOVED_IN, events.MOVED_OUT):
+            self.apply_library_change(file.get_path())
+        elif event_type == events.RENAMED:
+            self.apply_library_change(file.get_path())
+            self.apply_library_change(other_file.get_path())
+
+    def apply_library_change(self, filepath):
+        change = apply_change(filepath, IMAGE_DIR_PATH)
+        if change == "removed":
+            self.remove_thumbnail(filepath)
+        elif change:
+            self.thumbnail_executor.submit(self.load_thumbnail, filepath, get_image_properties(filepath) or {})
+
+    def find_view_position(self, thumbnail):
+        # the sorted view is ordered by compare_thumbnails, so a visible thumbnail is bisected
+        # instead of scanning the grid
+        low, high = 0, self.sort_model.get_n_items()
+        while low < high:
+            middle = (low + high) // 2
+            if compare_thumbnails(self.sort_model.get_item(middle), thumbnail) < 0:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.sort_model.get_n_items() and self.sort_model.get_item(low) is thumbnail:
+            return low
+        return None
+
+    def select_thumbnail(self, thumbnail):
+        position = self.find_view_position(thumbnail)
+        if position is not None:
+            self.thumbnail_single_selection.set_selected(position)
+
+    def find_model_position(self, filepath):
+        # the base store is kept in path order, a path never changes while pinned and hidden do,
+        # so entries are bisected instead of found by a linear scan
+        low, high = 0, self.thumbnail_model.get_n_items()
+        while low < high:
+            middle = (low + high) // 2
+            if self.thumbnail_model.get_item(middle).filepath < filepath:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find_model_item(self, thumbnail):
+        position = self.find_model_position(thumbnail.filepath)
+        if position < self.thumbnail_model.get_n_items() and self.thumbnail_model.get_item(position) is thumbnail:
+            return position
+        return None
+
+    def thumbnail_changed(self, thumbnail):
+        # reporting the single item as changed makes the filter and sort layers re-evaluate only it
+        position = self.find_model_item(thumbnail)
+        if position is not None:
+            self.thumbnail_model.items_changed(position, 1, 1)
+
+    def remove_thumbnail(self, filepath):
+        thumbnail = self.thumbnails.pop(filepath, None)
+        if thumbnail is None:
+            return
+        self.texture_cache.discard(filepath)
+        position = self.find_model_item(thumbnail)
+        if position is not None:
+            self.thumbnail_model.remove(position)
+
+    def filter_thumbnail(self, thumbnail, *user_data):
+        if thumbnail.hidden and not self.check_show_hidden.get_active():
+            return False
+        if self.check_pinned_only.get_active() and not thumbnail.pinned:
+            return False
+        max_age = DATE_FILTERS[self.dropdown_date.get_selected()][1]
+        if max_age is not None and thumbnail.last_modified < time.time() - max_age:
+            return False
+        if self.check_fits_screen.get_active() and thumbnail.width is not None:
+            # images saved before their size was recorded are kept
+            try:
+                target_resolution = (int(self.width_entry.get_text()), int(self.height_entry.get_text()))
+            except ValueError:
+                return True
+            return (thumbnail.width, thumbnail.height) == target_resolution
+        return True
+
+    def on_show_hidden_toggled(self, check):
+        # a flag toggled one way only ever adds (or only removes) items, which lets the filter
+        # model skip re-checking the ones it already knows about
+        self.thumbnail_filter.changed(Gtk.FilterChange.LESS_STRICT if check.get_active() else Gtk.FilterChange.MORE_STRICT)
+
+    def on_restriction_toggled(self, check):
+        self.thumbnail_filter.changed(Gtk.FilterChange.MORE_STRICT if check.get_active() else Gtk.FilterChange.LESS_STRICT)
+
+    def on_filter_changed(self, *args):
+        self.thumbnail_filter.changed(Gtk.FilterChange.DIFFERENT)
+
+    def on_resolution_changed(self, entry):
+        if self.check_fits_screen.get_active():
+            self.on_filter_changed()
+
+    def _create_filter_bar(self):
+        box_filter = Gtk.Box(spacing=10)
+        self.check_show_hidden = Gtk.CheckButton(label="Show hidden")
+        self.check_show_hidden.connect("toggled", self.on_show_hidden_toggled)
+        box_filter.append(self.check_show_hidden)
+        self.check_pinned_only = Gtk.CheckButton(label="Pinned only")
+        self.check_pinned_only.connect("toggled", self.on_restriction_toggled)
+        box_filter.append(self.check_pinned_only)
+        self.check_fits_screen = Gtk.CheckButton(label="Fits screen")
+        self.check_fits_screen.connect("toggled", self.on_restriction_toggled)
+        box_filter.append(self.check_fits_screen)
+        self.dropdown_date = Gtk.DropDown(model=Gtk.StringList.new([label for label, _ in DATE_FILTERS]))
+        self.dropdown_date.connect("notify::selected", self.on_filter_changed)
+        box_filter.append(self.dropdown_date)
+        return box_filter
+
+    def load_thumbnail(self, filepath, properties=None):
+        # runs on the thumbnail worker pool, the model is only touched from the main loop
+        if self.closing:
+            return
+        if properties is None:
+            properties = get_image_properties(filepath) or {}
+        try:
+            with timing.span("thumbnail"):
+                with timing.span("cache"):
+                    thumbnail_path = ensure_thumbnail(filepath, ThumbnailRow.width)
+                # only the header is read, the texture is decoded when a row shows it
+                with timing.span("info"):
+                    _, thumbnail_width, thumbnail_height = GdkPixbuf.Pixbuf.get_file_info(thumbnail_path)
+                aspect_ratio = thumbnail_height / thumbnail_width
+        except Exception as e:
+            print(f"Error loading image {os.path.basename(filepath)}: {e}")
+            return
+        GLib.idle_add(self.insert_thumbnail, filepath, thumbnail_path, aspect_ratio, properties)
+
+    def insert_thumbnail(self, filepath, thumbnail_path, aspect_ratio, properties):
+        # replaces the entry of a modified file, and the watcher and a finished download may both add one;
+        # the base store stays in path order, the sort layer places the new item in the view
+        if not os.path.exists(filepath):
+            return GLib.SOURCE_REMOVE
+        self.remove_thumbnail(filepath)
+        thumbnail = Thumbnail(
+            filepath,
+            thumbnail_path,
+            aspect_ratio,
+            properties.get("hidden", False),
+            properties.get("pinned", False),
+            properties.get("width"),
+            properties.get("height"),
+        )
+        self.thumbnails[filepath] = thumbnail
+        self.thumbnail_model.insert(self.find_model_position(filepath), thumbnail)
+        if filepath == self.pending_selection:
+            self.pending_selection = None
+            self.select_thumbnail(thumbnail)
+        return GLib.SOURCE_REMOVE
+
+    def on_close_request(self, window):
+        self.closing = True
+        self.library_monitor.cancel()
+        self.thumbnail_executor.shutdown(wait=False)
+        for row in self.download_rows:
+            row.cancellable.cancel()
+        self.download_executor.shutdown(wait=False)
+        self.texture_cache.clear()
+        if timing.is_enabled():
+            timing.write_reports(jsonl_path=PROFILE_JSONL_PATH, textfile_path=PROFILE_TEXTFILE_PATH)
+        return False
+
+    def add_thumbnail(self, filepath, select=False):
+        # the thumbnail is rendered on the worker pool like any other, insert_thumbnail selects it
+        if select:
+            self.pending_selection = filepath
+        self.thumbnail_executor.submit(self.load_thumbnail, filepath)
 
     def on_realize(self, widget):
         width, height = get_monitor_resolutions()
@@ -0,0 +1,59 @@
+import os
+
+from wallgarden import store
+from wallgarden.config import IMAGE_DIR_PATH, ensure_data_dirs
+
+IMAGE_FILE_EXTENSIONS = (".jpg", ".png", ".jpeg", ".webp")
+
+
+def is_image_file(path):
+    return path.lower().endswith(IMAGE_FILE_EXTENSIONS) and not os.path.basename(path).startswith(".")
+
+
+def scan_directory(directory):
+    files = {}
+    for entry in os.scandir(directory):
+        if is_image_file(entry.name) and entry.is_file():
+            stat = entry.stat()
+            files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def reconcile(directory=IMAGE_DIR_PATH):
+    # compares the directory with the stored snapshot and applies only the difference;
+    # an unchanged directory mtime means no file was added, removed or renamed
+    ensure_data_dirs()
+    snapshot, snapshot_mtime_ns = store.get_library_snapshot(directory)
+    directory_mtime_ns = os.stat(directory).st_mtime_ns
+    if directory_mtime_ns == snapshot_mtime_ns:
+        return [], [], []
+
+    files = scan_directory(directory)
+    added = [path for path in files if path not in snapshot]
+    removed = [path for path in snapshot if path not in files]
+    modified = [path for path in files if path in snapshot and files[path] != snapshot[path]]
+    store.update_library_snapshot(directory, {path: files[path] for path in added + modified}, removed, directory_mtime_ns)
+    return added, removed, modified
+
+
+def apply_change(path, directory=IMAGE_DIR_PATH):
+    # single file delta from a directory watcher: returns "added", "modified", "removed" or None
+    if not is_image_file(path) or os.path.dirname(path) != directory:
+        return None
+    snapshot_entry = store.get_library_file(path)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        if snapshot_entry is None:
+            return None
+        store.update_library_snapshot(directory, {}, [path])
+        return "removed"
+    entry = (stat.st_size, stat.st_mtime_ns)
+    if entry == snapshot_entry:
+        return None
+    store.update_library_snapshot(directory, {path: entry}, [])
+    return "added" if snapshot_entry is None else "modified"
+
+
+def get_library_files(directory=IMAGE_DIR_PATH):
+    return list(store.get_library_snapshot(directory)[0])
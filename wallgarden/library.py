@@ -0,0 +1,200 @@
+import multiprocessing
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from PIL import Image
+
+from wallgarden import budget, selection, store
+from wallgarden.config import IMAGE_DIR_PATH, IMAGE_QUALITY, ORIGINAL_IMAGE_DIR_PATH, PNG_COMPRESS_LEVEL, RENDITION_DIR_PATH, ensure_data_dirs
+from wallgarden.core import (
+    DEFAULT_DOWNLOAD_WORKERS,
+    IMAGE_EXTENSIONS,
+    IMAGE_FILE_EXTENSIONS,
+    DownloadStatus,
+    ImageFormat,
+    get_image_paths,
+    get_original_extension,
+    get_original_image_path,
+    render_image,
+    save_image,
+    set_gnome_background,
+    update_image_properties,
+)
+from wallgarden.dedup import file_dhash, file_sha256, find_duplicate, upright
+
+PROGRESS_INTERVAL = 100
+
+
+def list_images(directory):
+    ensure_data_dirs()
+    return [entry.path for entry in os.scandir(directory) if entry.is_file() and entry.name.lower().endswith(IMAGE_FILE_EXTENSIONS)]
+
+
+def convert_image(path, extension, quality=IMAGE_QUALITY, compress_level=PNG_COMPRESS_LEVEL):
+    new_path = os.path.splitext(path)[0] + extension
+    if os.path.exists(new_path):
+        raise FileExistsError(f"{new_path} already exists")
+    with Image.open(path) as image:
+        save_image(image, new_path, quality, compress_level)
+    os.remove(path)
+    return new_path
+
+
+def remove_renditions(image_path):
+    if not os.path.isdir(RENDITION_DIR_PATH):
+        return
+    for entry in os.scandir(RENDITION_DIR_PATH):
+        rendition_path = os.path.join(entry.path, os.path.basename(image_path))
+        if os.path.exists(rendition_path):
+            os.remove(rendition_path)
+
+
+def migrate_format(image_format, workers=DEFAULT_DOWNLOAD_WORKERS, originals=False, quality=IMAGE_QUALITY, compress_level=PNG_COMPRESS_LEVEL):
+    extension = IMAGE_EXTENSIONS[ImageFormat(image_format)]
+    image_paths = [path for path in list_images(IMAGE_DIR_PATH) if not path.lower().endswith(extension)]
+    original_paths = [path for path in list_images(ORIGINAL_IMAGE_DIR_PATH) if not path.lower().endswith(extension)] if originals else []
+    current_image_path = store.get_set_image()
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(convert_image, path, extension, quality, compress_level): path for path in image_paths + original_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                new_path = future.result()
+            except Exception as e:
+                print(f"Error converting {path}: {e}")
+                results.append((path, None))
+                continue
+            if path in image_paths:
+                store.rename_image(path, new_path)
+                # renditions are rebuilt from the original the next time they are needed
+                remove_renditions(path)
+                if path == current_image_path:
+                    set_gnome_background(new_path)
+            results.append((path, new_path))
+    if any(new_path for _, new_path in results):
+        budget.invalidate_usage()
+    return results
+
+
+def hash_image(image_path):
+    # the original is what downloads are compared against, fall back to the rendition
+    source_path = get_original_image_path(image_path) or image_path
+    return file_sha256(source_path), file_dhash(source_path)
+
+
+def index_hashes(workers=DEFAULT_DOWNLOAD_WORKERS):
+    image_paths = [path for path in store.get_unhashed_images() if os.path.exists(path)]
+    indexed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(hash_image, path): path for path in image_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                sha256, phash = future.result()
+            except Exception as e:
+                print(f"Error hashing {path}: {e}")
+                continue
+            store.set_image_hashes(path, sha256, phash)
+            indexed += 1
+    return indexed
+
+
+def find_import_files(directory):
+    paths = []
+    for root, _, filenames in os.walk(directory):
+        paths.extend(os.path.join(root, filename) for filename in sorted(filenames) if filename.lower().endswith(IMAGE_FILE_EXTENSIONS))
+    return sorted(paths)
+
+
+def reserve_titles(paths):
+    # unique titles are handed out up front, so two workers never write the same file
+    taken = {os.path.splitext(entry.name)[0] for entry in os.scandir(IMAGE_DIR_PATH)}
+    titles = {}
+    for path in paths:
+        image_path, _ = get_image_paths(os.path.splitext(os.path.basename(path))[0])
+        base = os.path.splitext(os.path.basename(image_path))[0] or "imported"
+        title, counter = base, 1
+        while title in taken:
+            counter += 1
+            title = f"{base}_{counter}"
+        taken.add(title)
+        titles[path] = title
+    return titles
+
+
+def import_file(path, title, target_resolution):
+    # runs in a worker process; the store is only read here, the parent registers the result.
+    # The dHash and the render both see the image as displayed, after its EXIF orientation
+    sha256 = file_sha256(path)
+    existing_path = store.find_image_by_sha256(sha256)
+    if existing_path:
+        return DownloadStatus.exists, existing_path, sha256, None, None
+    phash = file_dhash(path)
+    duplicate_path = find_duplicate(sha256, phash)
+    if duplicate_path:
+        return DownloadStatus.duplicate, duplicate_path, sha256, phash, None
+
+    image_path, _ = get_image_paths(title)
+    with Image.open(path) as image:
+        original_extension = get_original_extension(image)
+        final_image = render_image(upright(image), image_path, target_resolution)
+        if not final_image:
+            return DownloadStatus.too_small, None, sha256, phash, None
+    _, original_path = get_image_paths(title, original_extension)
+    shutil.copyfile(path, original_path)
+    return DownloadStatus.saved, image_path, sha256, phash, final_image.size
+
+
+def discard_import(image_path):
+    for path in (image_path, get_original_image_path(image_path)):
+        if path and os.path.exists(path):
+            os.remove(path)
+    remove_renditions(image_path)
+
+
+def print_progress(done, total, counts):
+    # rewrites one line on a terminal, logs every PROGRESS_INTERVAL files otherwise
+    interactive = sys.stdout.isatty()
+    if not interactive and done % PROGRESS_INTERVAL and done != total:
+        return
+    summary = ", ".join(f"{count} {status.value}" for status, count in counts.items() if count)
+    print(f"\r{done}/{total} {summary}", end="\n" if done == total or not interactive else "", flush=True)
+
+
+def import_images(directory, target_resolution, workers=None):
+    # decoding and resizing is cpu bound, so files are spread over processes rather than threads;
+    # spawned workers start without the parent's sqlite connection
+    ensure_data_dirs()
+    paths = find_import_files(directory)
+    titles = reserve_titles(paths)
+    counts = {status: 0 for status in DownloadStatus}
+    results = []
+    imported_hashes = set()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {executor.submit(import_file, path, titles[path], target_resolution): path for path in paths}
+        for done, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                status, image_path, sha256, phash, size = future.result()
+            except Exception as e:
+                print(f"\nError importing {path}: {e}")
+                status, image_path, sha256, phash, size = DownloadStatus.failed, None, None, None, None
+            if status == DownloadStatus.saved and sha256 in imported_hashes:
+                # the same file twice in one import
+                discard_import(image_path)
+                status, image_path = DownloadStatus.exists, None
+            if status == DownloadStatus.saved:
+                imported_hashes.add(sha256)
+                store.set_image_hashes(image_path, sha256, phash)
+                update_image_properties(image_path, width=size[0], height=size[1])
+                selection.refresh_image(image_path)
+                budget.record_image(image_path)
+            counts[status] += 1
+            results.append((path, status, image_path))
+            print_progress(done, len(paths), counts)
+    budget.enforce_budgets()
+    return results
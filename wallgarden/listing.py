@@ -0,0 +1,78 @@
+import asyncio
+import itertools
+
+from wallgarden.config import DEFAULT_CONCURRENCY
+from wallgarden.core import index_listing, query_reddit
+
+# reddit never returns more than this many posts per listing page
+MAX_PAGE_LIMIT = 100
+
+
+async def walk_listing(subreddit, sort, timeframe, page_limit, semaphore, queue, max_pages=None):
+    # queues (sort, timeframe, rank of the page's first post, page)
+    loop = asyncio.get_running_loop()
+    after = None
+    offset = 0
+    for _ in itertools.count() if max_pages is None else range(max_pages):
+        async with semaphore:
+            data = await loop.run_in_executor(None, query_reddit, subreddit, sort, timeframe, page_limit, after)
+        if "data" not in data:
+            print(f"Unexpected listing response for r/{subreddit}: {data}")
+            break
+        await queue.put((sort, timeframe, offset, data))
+        offset += len(data["data"].get("children", []))
+        after = data["data"].get("after")
+        if not after:
+            break
+
+
+async def crawl_listings(subreddits, listings, target_resolution, count=None, page_limit=MAX_PAGE_LIMIT, concurrency=DEFAULT_CONCURRENCY):
+    # yields (url, (width, height, title, download_url)) as soon as each page is parsed;
+    # without a count only the first page of every listing is fetched
+    page_limit = min(page_limit, MAX_PAGE_LIMIT)
+    max_pages = 1 if count is None else None
+    semaphore = asyncio.Semaphore(concurrency)
+    queue = asyncio.Queue()
+    walkers = [
+        asyncio.ensure_future(walk_listing(subreddit, sort, timeframe, page_limit, semaphore, queue, max_pages))
+        for subreddit in subreddits
+        for sort, timeframe in listings
+    ]
+    pending = set(walkers)
+    seen = set()
+    try:
+        while pending or not queue.empty():
+            if queue.empty():
+                getter = asyncio.ensure_future(queue.get())
+                done, pending = await asyncio.wait(pending | {getter}, return_when=asyncio.FIRST_COMPLETED)
+                pending.discard(getter)
+                for walker in done - {getter}:
+                    if walker.exception():
+                        print(f"Error fetching listing: {walker.exception()}")
+                if getter not in done:
+                    getter.cancel()
+                    continue
+                sort, timeframe, offset, data = getter.result()
+            else:
+                sort, timeframe, offset, data = queue.get_nowait()
+
+            for url, props in index_listing(data, target_resolution, sort, timeframe, offset).items():
+                if url in seen:
+                    continue
+                seen.add(url)
+                yield url, props
+                if count is not None and len(seen) >= count:
+                    return
+    finally:
+        for walker in walkers:
+            walker.cancel()
+
+
+def get_reddit_candidates(subreddits, listings, target_resolution, count=None, page_limit=MAX_PAGE_LIMIT, concurrency=DEFAULT_CONCURRENCY):
+    async def collect():
+        candidates = {}
+        async for url, props in crawl_listings(subreddits, listings, target_resolution, count, page_limit, concurrency):
+            candidates[url] = props
+        return candidates
+
+    return asyncio.run(collect())
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import requests
+
+from wallgarden import ratelimit
+from wallgarden.config import LISTING_CACHE_DIR_PATH
+
+# seconds a cached listing is served without contacting reddit
+SORT_TTLS = {"new": 60, "rising": 120, "hot": 300, "best": 300, "controversial": 900}
+TOP_TTLS = {"hour": 300, "day": 1800, "week": 3 * 3600, "month": 12 * 3600, "year": 24 * 3600, "all": 24 * 3600}
+DEFAULT_TTL = 300
+# entries untouched for longer than any ttl are only kept as an offline fallback and are pruned,
+# every after cursor of a crawl is an entry of its own
+MAX_ENTRY_AGE = max(DEFAULT_TTL, *SORT_TTLS.values(), *TOP_TTLS.values())
+PRUNE_INTERVAL = 600
+
+_last_prune = 0.0
+
+
+def listing_ttl(sort, timeframe):
+    if sort == "top":
+        return TOP_TTLS.get(timeframe, DEFAULT_TTL)
+    return SORT_TTLS.get(sort, DEFAULT_TTL)
+
+
+def get_cache_path(url):
+    digest = hashlib.sha1(url.encode()).hexdigest()  # nosec B324
+    return os.path.join(LISTING_CACHE_DIR_PATH, f"{digest}.json")
+
+
+def load_entry(url):
+    try:
+        with open(get_cache_path(url), "r") as file:
+            entry = json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return entry if entry.get("url") == url else None
+
+
+def save_entry(entry):
+    os.makedirs(LISTING_CACHE_DIR_PATH, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=".json", dir=LISTING_CACHE_DIR_PATH)
+    with os.fdopen(fd, "w") as file:
+        json.dump(entry, file)
+    os.replace(temp_path, get_cache_path(entry["url"]))
+    prune_entries()
+
+
+def prune_entries(max_age=MAX_ENTRY_AGE):
+    global _last_prune
+    now = time.time()
+    if now - _last_prune < PRUNE_INTERVAL:
+        return
+    _last_prune = now
+    for entry in os.scandir(LISTING_CACHE_DIR_PATH):
+        try:
+            if entry.name.endswith(".json") and now - entry.stat().st_mtime > max_age:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def get_json(session, url, headers, ttl, timeout=ratelimit.REQUEST_TIMEOUT):
+    # fresh entries cost nothing, stale ones one conditional request, and the
+    # last good body is served when reddit is unreachable or erroring
+    entry = load_entry(url)
+    now = time.time()
+    if entry and now - entry["fetched_at"] < ttl:
+        return entry["body"]
+
+    request_headers = dict(headers)
+    if entry and entry.get("etag"):
+        request_headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        request_headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        response = ratelimit.get(session, url, headers=request_headers, timeout=timeout)
+    except requests.RequestException as e:
+        if entry:
+            print(f"Using cached listing, request failed: {e}")
+            return entry["body"]
+        raise
+
+    if response.status_code == 304 and entry:
+        entry["fetched_at"] = now
+        save_entry(entry)
+        return entry["body"]
+    if not response.ok and entry:
+        print(f"Using cached listing, reddit returned {response.status_code}")
+        return entry["body"]
+
+    response.raise_for_status()
+    try:
+        body = response.json()
+    except ValueError:
+        # an html error or login page served with a 200
+        if entry:
+            print("Using cached listing, reddit returned a non-JSON body")
+            return entry["body"]
+        raise
+    save_entry(
+        {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": now,
+            "body": body,
+        }
+    )
+    return body
@@ -0,0 +1,142 @@
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+# (requests per second, burst) per host group, reddit allows roughly 100 requests
+# per 10 minutes without oauth and says so in its x-ratelimit-* headers
+HOST_LIMITS = {"reddit.com": (1.0, 4), "redd.it": (8.0, 16), "imgur.com": (4.0, 8)}
+DEFAULT_HOST_LIMIT = (4.0, 8)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# the header driven rate never drops below this, so a bucket keeps trickling
+MIN_RATE = 0.05
+# (connect, read) seconds
+REQUEST_TIMEOUT = (5, 30)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.default_rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        # nothing is sent before this, set by Retry-After and backoff
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def block(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+    def adapt(self, remaining, reset):
+        # spread what is left of the window evenly over the time until it resets
+        with self.lock:
+            self.refill(time.monotonic())
+            if remaining < 1:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+                self.tokens = 0.0
+            self.rate = max(MIN_RATE, min(self.default_rate, remaining / max(reset, 1.0)))
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_host_group(url):
+    host = (urlsplit(url).hostname or "").lower()
+    for group in HOST_LIMITS:
+        if host == group or host.endswith("." + group):
+            return group
+    return host
+
+
+def get_bucket(url):
+    group = get_host_group(url)
+    with _buckets_lock:
+        if group not in _buckets:
+            _buckets[group] = TokenBucket(*HOST_LIMITS.get(group, DEFAULT_HOST_LIMIT))
+        return _buckets[group]
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    # full jitter keeps retrying workers from waking up together
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))  # nosec B311
+
+
+def request(session, method, url, **kwargs):
+    # sends through the host's token bucket, retrying 429/5xx and connection errors with
+    # jittered exponential backoff; the last response is returned once retries run out
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    bucket = get_bucket(url)
+    for attempt in range(MAX_RETRIES + 1):
+        bucket.acquire()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES:
+                raise
+            bucket.block(backoff_delay(attempt))
+            continue
+
+        remaining = parse_float(response.headers.get("x-ratelimit-remaining"))
+        reset = parse_float(response.headers.get("x-ratelimit-reset"))
+        if remaining is not None and reset is not None:
+            bucket.adapt(remaining, reset)
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return response
+
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        delay = backoff_delay(attempt) if retry_after is None else min(retry_after, BACKOFF_MAX * 5)
+        print(f"{response.status_code} from {get_host_group(url)}, retrying in {delay:.1f}s")
+        response.close()
+        bucket.block(delay)
+
+
+def get(session, url, **kwargs):
+    return request(session, "GET", url, **kwargs)
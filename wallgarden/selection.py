@@ -0,0 +1,68 @@
+import json
+import math
+import random
+import time
+
+from wallgarden import store
+
+DEFAULT_FILTER = {"hidden": False}
+WEIGHTINGS = ("uniform", "recency")
+# a wallpaper shown this many hours ago has regained half of its weight
+RECENCY_HALF_LIFE_HOURS = 24.0
+MIN_WEIGHT = 0.01
+
+
+def get_bag_name(filter_dict, weighting):
+    return json.dumps({"filter": filter_dict, "weighting": weighting}, sort_keys=True)
+
+
+def get_weight(last_shown, weighting, now):
+    if weighting != "recency" or not last_shown:
+        return 1.0
+    hours = max(0.0, now - last_shown) / 3600
+    return max(MIN_WEIGHT, 1 - 0.5 ** (hours / RECENCY_HALF_LIFE_HOURS))
+
+
+def get_position(weight):
+    # ordering by exponential arrival times -log(u)/w draws a weighted random
+    # permutation, with equal weights this is a plain shuffle
+    return -math.log(1.0 - random.random()) / weight  # nosec B311
+
+
+def fill_bag(bag, filter_dict, weighting):
+    now = time.time()
+    rows = store.find_image_rows(filter_dict)
+    store.fill_shuffle_bag(bag, [(row["path"], get_position(get_weight(row["last_shown"], weighting, now))) for row in rows])
+
+
+def draw(filter_dict=None, weighting="uniform"):
+    # every matching image is drawn once per cycle of the persisted bag; the
+    # current wallpaper is skipped rather than filtered, so setting one does not
+    # change bag membership
+    filter_dict = dict(DEFAULT_FILTER if filter_dict is None else filter_dict)
+    filter_dict.pop("is_set", None)
+    if any(key not in store.BOOLEAN_COLUMNS for key in filter_dict):
+        filtered_list = [path for path in store.find_images(filter_dict) if path != store.get_set_image()]
+        return random.choice(filtered_list) if filtered_list else None  # nosec B311
+
+    bag = get_bag_name(filter_dict, weighting)
+    current_image_path = store.get_set_image()
+    image_path = store.pop_shuffle_bag(bag, filter_dict, exclude=current_image_path)
+    if image_path is None:
+        fill_bag(bag, filter_dict, weighting)
+        image_path = store.pop_shuffle_bag(bag, filter_dict, exclude=current_image_path)
+    return image_path
+
+
+def refresh_image(filepath):
+    # keeps existing bags in step after a pin/hide change or a new download; an image already
+    # drawn this cycle stays in its bag as drawn, so it is not added again
+    now = time.time()
+    for bag in store.get_shuffle_bags():
+        settings = json.loads(bag)
+        if store.image_matches(filepath, settings["filter"]):
+            properties = store.get_image_properties(filepath) or {}
+            weight = get_weight(properties.get("last_shown"), settings["weighting"], now)
+            store.add_to_shuffle_bag(bag, filepath, get_position(weight))
+        else:
+            store.remove_from_shuffle_bag(bag, filepath)
@@ -11,6 +11,7 @@ PYTHON_INTERP_PATH = sys.executable
 DEFAULT_TIMER_MINUTES = "10"
 SERVICE_NAME = "wallgarden.service"
 TIMER_NAME = "wallgarden.timer"
+DAEMON_SERVICE_NAME = "wallgarden-daemon.service"
 TEMPLATE_SUFFIX = ".template"
 TEMPLATE_DIR = os.path.join(PROJECT_PATH, "service")
 CLI_PATH = os.path.join(PROJECT_PATH, "cli.py")
@@ -23,6 +24,8 @@ SERVICE_SRC_PATH = os.path.join(TEMPLATE_DIR, SERVICE_NAME)
 TIMER_SRC_PATH = os.path.join(TEMPLATE_DIR, TIMER_NAME)
 SERVICE_DEST_PATH = os.path.join(SYSTEMD_USER_DIR, SERVICE_NAME)
 TIMER_DEST_PATH = os.path.join(SYSTEMD_USER_DIR, TIMER_NAME)
+DAEMON_SERVICE_TEMPLATE_PATH = os.path.join(TEMPLATE_DIR, DAEMON_SERVICE_NAME + TEMPLATE_SUFFIX)
+DAEMON_SERVICE_DEST_PATH = os.path.join(SYSTEMD_USER_DIR, DAEMON_SERVICE_NAME)
 
 
 def prepare_service_template():
@@ -42,7 +45,7 @@ def prepare_timer_template(minutes):
         with open(TIMER_TEMPLATE_PATH, "r") as template_file:
             content = template_file.read()
 
-        content = content.replace("__minutes__", minutes)
+        content = content.replace("__minutes__", str(minutes))
 
         with open(TIMER_SRC_PATH, "w") as timer_file:
             timer_file.write(content)
@@ -59,10 +62,28 @@ def install_timer_files(minutes=None):
         shutil.copy(TIMER_SRC_PATH, TIMER_DEST_PATH)
 
 
-def install_service_files():
+def prepare_daemon_service(minutes, pinned):
+    with open(DAEMON_SERVICE_TEMPLATE_PATH, "r") as template_file:
+        content = template_file.read()
+
+    content = content.replace("__sys.executable__", sys.executable)
+    content = content.replace("__wallgarden.cli__", CLI_PATH)
+    content = content.replace("__minutes__", str(minutes))
+    content = content.replace("__pinned__", "--pinned" if pinned else "")
+    return content
+
+
+def install_service_files(pinned=False, daemon=False, minutes=None):
     # Ensure the systemd user directory exists
     os.makedirs(SYSTEMD_USER_DIR, exist_ok=True)
 
+    if daemon:
+        # the resident slideshow is written straight to the user dir since its options change the unit
+        with open(DAEMON_SERVICE_DEST_PATH, "w") as service_file:
+            service_file.write(prepare_daemon_service(minutes or DEFAULT_TIMER_MINUTES, pinned))
+        reload_systemd_daemon()
+        return
+
     if not os.path.exists(SERVICE_SRC_PATH):
         prepare_service_template()
     if not os.path.exists(SERVICE_DEST_PATH):
@@ -77,10 +98,25 @@ def is_service_active():
         return False
 
 
+def toggle_daemon(enable):
+    # the resident slideshow replaces the timer, never run both
+    if not os.path.exists(DAEMON_SERVICE_DEST_PATH):
+        install_service_files(daemon=True)
+
+    if enable:
+        subprocess.run(ESCAPE_FLATPAK + ["systemctl", "--user", "disable", "--now", "wallgarden.timer"])
+        subprocess.run(ESCAPE_FLATPAK + ["systemctl", "--user", "enable", "--now", DAEMON_SERVICE_NAME])
+    else:
+        subprocess.run(ESCAPE_FLATPAK + ["systemctl", "--user", "disable", "--now", DAEMON_SERVICE_NAME])
+
+
 def toggle_service(enable):
     # First, ensure the service files are in place and the service is enabled
     install_service_files()
     install_timer_files()
+    # the timer replaces the resident slideshow, never run both
+    if enable and os.path.exists(DAEMON_SERVICE_DEST_PATH):
+        subprocess.run(ESCAPE_FLATPAK + ["systemctl", "--user", "disable", "--now", DAEMON_SERVICE_NAME])
 
     subprocess.run(ESCAPE_FLATPAK + ["systemctl", "--user", "enable", "wallgarden.timer"])
 
@@ -0,0 +1,535 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from wallgarden.config import DB_PATH, JSON_PATH, ensure_data_dirs
+
+DEFAULT_IMAGE_PROPS = {"hidden": False, "pinned": False, "attempt_download": True, "is_set": False}
+BOOLEAN_COLUMNS = tuple(DEFAULT_IMAGE_PROPS)
+
+# each entry upgrades the schema by one version, tracked in PRAGMA user_version
+MIGRATIONS = [
+    """
+    CREATE TABLE images (
+        path TEXT PRIMARY KEY,
+        hidden INTEGER NOT NULL DEFAULT 0,
+        pinned INTEGER NOT NULL DEFAULT 0,
+        attempt_download INTEGER NOT NULL DEFAULT 1,
+        is_set INTEGER NOT NULL DEFAULT 0,
+        extra TEXT NOT NULL DEFAULT '{}'
+    );
+    CREATE INDEX images_pinned ON images (pinned, hidden);
+    CREATE INDEX images_hidden ON images (hidden);
+    CREATE INDEX images_is_set ON images (is_set) WHERE is_set = 1;
+    """,
+    """
+    ALTER TABLE images ADD COLUMN sha256 TEXT;
+    ALTER TABLE images ADD COLUMN phash INTEGER;
+    CREATE INDEX images_sha256 ON images (sha256);
+    CREATE TABLE image_urls (
+        url TEXT PRIMARY KEY,
+        path TEXT NOT NULL
+    );
+    CREATE INDEX image_urls_path ON image_urls (path);
+    CREATE TABLE phash_bands (
+        band INTEGER NOT NULL,
+        value INTEGER NOT NULL,
+        path TEXT NOT NULL,
+        PRIMARY KEY (band, value, path)
+    ) WITHOUT ROWID;
+    CREATE INDEX phash_bands_path ON phash_bands (path);
+    """,
+    """
+    ALTER TABLE images ADD COLUMN last_shown REAL;
+    CREATE TABLE shuffle_bags (
+        bag TEXT NOT NULL,
+        position REAL NOT NULL,
+        path TEXT NOT NULL,
+        PRIMARY KEY (bag, path)
+    ) WITHOUT ROWID;
+    CREATE INDEX shuffle_bags_position ON shuffle_bags (bag, position);
+    CREATE INDEX shuffle_bags_path ON shuffle_bags (path);
+    """,
+    """
+    CREATE TABLE library_files (
+        path TEXT PRIMARY KEY,
+        directory TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX library_files_directory ON library_files (directory);
+    CREATE TABLE library_directories (
+        directory TEXT PRIMARY KEY,
+        mtime_ns INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE posts (
+        url TEXT PRIMARY KEY,
+        post_id TEXT,
+        subreddit TEXT,
+        title TEXT,
+        width INTEGER,
+        height INTEGER,
+        download_url TEXT,
+        download_width INTEGER,
+        download_height INTEGER,
+        first_seen REAL NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        path TEXT
+    );
+    CREATE INDEX posts_pending ON posts (status, subreddit);
+    INSERT OR IGNORE INTO posts (url, first_seen, status, path)
+        SELECT url, CAST(strftime('%s', 'now') AS REAL), 'done', path FROM image_urls;
+    DELETE FROM shuffle_bags WHERE path IN (SELECT path FROM images WHERE json_extract(extra, '$.fetch') = 0);
+    DELETE FROM images WHERE json_extract(extra, '$.fetch') = 0;
+    """,
+    """
+    ALTER TABLE shuffle_bags ADD COLUMN drawn INTEGER NOT NULL DEFAULT 0;
+    DROP INDEX shuffle_bags_position;
+    CREATE INDEX shuffle_bags_undrawn ON shuffle_bags (bag, position) WHERE drawn = 0;
+    """,
+    """
+    CREATE TABLE disk_usage (
+        name TEXT PRIMARY KEY,
+        bytes INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """,
+    """
+    ALTER TABLE posts ADD COLUMN claimed_at REAL;
+    CREATE TABLE post_listings (
+        url TEXT NOT NULL,
+        subreddit TEXT NOT NULL,
+        sort TEXT NOT NULL,
+        timeframe TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        PRIMARY KEY (url, subreddit, sort, timeframe)
+    ) WITHOUT ROWID;
+    """,
+]
+# listings whose posts depend on the timeframe, every other sort is recorded without one
+TIMEFRAME_SORTS = ("top", "controversial")
+# seconds after which a claimed post that was never settled is offered again
+CLAIM_TIMEOUT = 3600
+# a 64-bit perceptual hash is split into this many bands; two hashes within
+# PHASH_BANDS - 1 bits of each other always share at least one band exactly
+PHASH_BANDS = 8
+PHASH_BAND_BITS = 64 // PHASH_BANDS
+
+_local = threading.local()
+
+
+def get_connection():
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        ensure_data_dirs()
+        connection = sqlite3.connect(DB_PATH, timeout=10, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        upgrade_schema(connection)
+        _local.connection = connection
+    return connection
+
+
+@contextmanager
+def transaction():
+    connection = get_connection()
+    if connection.in_transaction:
+        yield connection
+        return
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    else:
+        connection.execute("COMMIT")
+
+
+def upgrade_schema(connection):
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        for script in MIGRATIONS[version:]:
+            for statement in script.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+        connection.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+        if version == 0:
+            import_json_properties(connection)
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    else:
+        connection.execute("COMMIT")
+
+
+def import_json_properties(connection):
+    # one-time migration from the wallgarden.json store used before sqlite
+    if not os.path.exists(JSON_PATH):
+        return
+    try:
+        with open(JSON_PATH, "r") as file:
+            data = json.load(file)
+    except json.JSONDecodeError:
+        data = {}
+    for filepath, properties in data.items():
+        # failed downloads were once recorded with fetch=False under a path that was never written
+        if properties.get("fetch") is False:
+            continue
+        write_properties(connection, filepath, properties)
+    os.replace(JSON_PATH, JSON_PATH + ".migrated")
+
+
+def row_to_properties(row):
+    properties = json.loads(row["extra"])
+    for column in BOOLEAN_COLUMNS:
+        properties[column] = bool(row[column])
+    if row["last_shown"] is not None:
+        properties["last_shown"] = row["last_shown"]
+    return properties
+
+
+def write_properties(connection, filepath, properties):
+    columns = {k: int(bool(v)) for k, v in properties.items() if k in BOOLEAN_COLUMNS}
+    extra = {k: v for k, v in properties.items() if k not in BOOLEAN_COLUMNS}
+    connection.execute("INSERT OR IGNORE INTO images (path) VALUES (?)", (filepath,))
+    if columns:
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        connection.execute(f"UPDATE images SET {assignments} WHERE path = ?", (*columns.values(), filepath))  # nosec B608
+    if extra:
+        connection.execute("UPDATE images SET extra = json_patch(extra, ?) WHERE path = ?", (json.dumps(extra), filepath))
+
+
+def load_image_properties():
+    rows = get_connection().execute("SELECT * FROM images")
+    return {row["path"]: row_to_properties(row) for row in rows}
+
+
+def get_image_properties(filepath):
+    row = get_connection().execute("SELECT * FROM images WHERE path = ?", (filepath,)).fetchone()
+    return row_to_properties(row) if row else None
+
+
+def update_image_properties(filepath, **properties):
+    with transaction() as connection:
+        write_properties(connection, filepath, properties)
+
+
+def add_images(filepaths):
+    with transaction() as connection:
+        connection.executemany("INSERT OR IGNORE INTO images (path) VALUES (?)", ((filepath,) for filepath in filepaths))
+
+
+def set_current_image(filepath):
+    # moves the is_set flag in one transaction, touching only the old and new rows
+    with transaction() as connection:
+        connection.execute("INSERT OR IGNORE INTO images (path) VALUES (?)", (filepath,))
+        connection.execute("UPDATE images SET is_set = (path = ?) WHERE is_set = 1 OR path = ?", (filepath, filepath))
+        connection.execute("UPDATE images SET last_shown = ? WHERE path = ?", (time.time(), filepath))
+
+
+def get_set_image():
+    row = get_connection().execute("SELECT path FROM images WHERE is_set = 1 LIMIT 1").fetchone()
+    return row["path"] if row else None
+
+
+def filter_clause(filter_dict):
+    # only the indexed boolean columns can be filtered in sql
+    columns = {k: int(bool(v)) for k, v in filter_dict.items() if k in BOOLEAN_COLUMNS}
+    return " AND ".join(f"{column} = ?" for column in columns) or "1", tuple(columns.values())
+
+
+def find_images(filter_dict):
+    extra = {k: v for k, v in filter_dict.items() if k not in BOOLEAN_COLUMNS}
+    where, parameters = filter_clause(filter_dict)
+    rows = get_connection().execute(f"SELECT path, extra FROM images WHERE {where}", parameters)  # nosec B608
+    if not extra:
+        return [row["path"] for row in rows]
+    return [row["path"] for row in rows if all(json.loads(row["extra"]).get(k) == v for k, v in extra.items())]
+
+
+def rename_image(old_path, new_path):
+    with transaction() as connection:
+        connection.execute("UPDATE OR REPLACE images SET path = ? WHERE path = ?", (new_path, old_path))
+        connection.execute("UPDATE image_urls SET path = ? WHERE path = ?", (new_path, old_path))
+        connection.execute("UPDATE OR REPLACE phash_bands SET path = ? WHERE path = ?", (new_path, old_path))
+        connection.execute("UPDATE OR REPLACE shuffle_bags SET path = ? WHERE path = ?", (new_path, old_path))
+        connection.execute("UPDATE posts SET path = ? WHERE path = ?", (new_path, old_path))
+
+
+def remove_image(filepath):
+    # the url mapping is kept so an evicted post is not fetched again
+    with transaction() as connection:
+        connection.execute("DELETE FROM images WHERE path = ?", (filepath,))
+        connection.execute("DELETE FROM phash_bands WHERE path = ?", (filepath,))
+        connection.execute("DELETE FROM shuffle_bags WHERE path = ?", (filepath,))
+
+
+def get_eviction_rows():
+    rows = get_connection().execute("SELECT path, hidden, pinned, is_set, last_shown FROM images")
+    return {row["path"]: row for row in rows}
+
+
+def get_disk_usage():
+    # {name: bytes} as last counted by the disk budget, empty until its first scan
+    return {row["name"]: row["bytes"] for row in get_connection().execute("SELECT name, bytes FROM disk_usage")}
+
+
+def set_disk_usage(usage):
+    with transaction() as connection:
+        connection.execute("DELETE FROM disk_usage")
+        connection.executemany("INSERT INTO disk_usage (name, bytes) VALUES (?, ?)", usage.items())
+
+
+def add_disk_usage(usage):
+    # only totals that were counted are kept running, a missing one is left to the next scan
+    with transaction() as connection:
+        connection.executemany("UPDATE disk_usage SET bytes = bytes + ? WHERE name = ?", ((size, name) for name, size in usage.items()))
+
+
+def phash_bands(phash):
+    mask = (1 << PHASH_BAND_BITS) - 1
+    return [(band, (phash >> (band * PHASH_BAND_BITS)) & mask) for band in range(PHASH_BANDS)]
+
+
+def to_signed_int64(value):
+    # sqlite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def set_image_hashes(filepath, sha256, phash, url=None):
+    with transaction() as connection:
+        write_properties(connection, filepath, {})
+        connection.execute("UPDATE images SET sha256 = ?, phash = ? WHERE path = ?", (sha256, to_signed_int64(phash), filepath))
+        connection.execute("DELETE FROM phash_bands WHERE path = ?", (filepath,))
+        connection.executemany(
+            "INSERT OR IGNORE INTO phash_bands (band, value, path) VALUES (?, ?, ?)", ((band, value, filepath) for band, value in phash_bands(phash))
+        )
+        if url:
+            connection.execute("INSERT OR REPLACE INTO image_urls (url, path) VALUES (?, ?)", (url, filepath))
+
+
+def add_image_url(url, filepath):
+    with transaction() as connection:
+        connection.execute("INSERT OR REPLACE INTO image_urls (url, path) VALUES (?, ?)", (url, filepath))
+
+
+def find_image_by_url(url):
+    row = get_connection().execute("SELECT path FROM image_urls WHERE url = ?", (url,)).fetchone()
+    return row["path"] if row else None
+
+
+def get_listing_key(sort, timeframe):
+    # reddit only reads the timeframe of top and controversial listings
+    return sort, timeframe if sort in TIMEFRAME_SORTS else ""
+
+
+def add_posts(posts, sort=None, timeframe=None):
+    # posts seen in a listing; a pending post takes the newest download url, since that was
+    # picked for the current target resolution, a settled one is left alone. With a sort the
+    # listing is recorded too, with each post's optional "rank" in it
+    now = time.time()
+    with transaction() as connection:
+        connection.executemany(
+            """
+            INSERT INTO posts (url, post_id, subreddit, title, width, height, download_url, download_width, download_height, first_seen)
+            VALUES (:url, :post_id, :subreddit, :title, :width, :height, :download_url, :download_width, :download_height, :first_seen)
+            ON CONFLICT (url) DO UPDATE SET
+                post_id = COALESCE(posts.post_id, excluded.post_id),
+                subreddit = COALESCE(posts.subreddit, excluded.subreddit),
+                title = COALESCE(posts.title, excluded.title),
+                width = excluded.width,
+                height = excluded.height,
+                download_url = CASE WHEN posts.status = 'pending' THEN excluded.download_url ELSE posts.download_url END,
+                download_width = CASE WHEN posts.status = 'pending' THEN excluded.download_width ELSE posts.download_width END,
+                download_height = CASE WHEN posts.status = 'pending' THEN excluded.download_height ELSE posts.download_height END
+            """,
+            [{**post, "first_seen": now} for post in posts],
+        )
+        if sort:
+            sort, timeframe = get_listing_key(sort, timeframe)
+            connection.executemany(
+                """
+                INSERT INTO post_listings (url, subreddit, sort, timeframe, rank) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (url, subreddit, sort, timeframe) DO UPDATE SET rank = excluded.rank
+                """,
+                [(post["url"], (post.get("subreddit") or "").lower(), sort, timeframe, post.get("rank", 0)) for post in posts],
+            )
+
+
+def set_post_status(url, status, path=None):
+    with transaction() as connection:
+        connection.execute(
+            """
+            INSERT INTO posts (url, first_seen, status, path) VALUES (?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET status = excluded.status, path = COALESCE(excluded.path, posts.path)
+            """,
+            (url, time.time(), status, path),
+        )
+
+
+def claim_pending_post(target_resolution, subreddits=None, listings=None, max_rank=None, exclude=()):
+    # picks a post and marks it in progress in one write transaction, so concurrent jobs never
+    # download the same post; the caller settles it with set_post_status or hands it back with release_post
+    with transaction() as connection:
+        posts = find_pending_posts(target_resolution, subreddits, listings, max_rank, exclude, limit=1)
+        if not posts:
+            return None
+        connection.execute("UPDATE posts SET status = 'in-progress', claimed_at = ? WHERE url = ?", (time.time(), posts[0]["url"]))
+        return posts[0]
+
+
+def release_post(url):
+    # a claimed post that was not settled becomes pending again
+    with transaction() as connection:
+        connection.execute("UPDATE posts SET status = 'pending', claimed_at = NULL WHERE url = ? AND status = 'in-progress'", (url,))
+
+
+def find_pending_posts(target_resolution, subreddits=None, listings=None, max_rank=None, exclude=(), limit=1):
+    # random posts that were never tried and whose download covers target_resolution; listings are
+    # (sort, timeframe) pairs the post must have been seen in, within its first max_rank posts.
+    # A claim older than CLAIM_TIMEOUT was left by a process that died and counts as pending
+    width, height = target_resolution
+    query = """
+        SELECT * FROM posts WHERE (status = 'pending' OR (status = 'in-progress' AND claimed_at < ?))
+        AND width >= ? AND height >= ? AND download_width >= ? AND download_height >= ?
+    """
+    parameters = [time.time() - CLAIM_TIMEOUT, width, height, width, height]
+    subreddits = [subreddit.lower() for subreddit in subreddits or ()]
+    if listings:
+        keys = [get_listing_key(sort, timeframe) for sort, timeframe in listings]
+        query += " AND EXISTS (SELECT 1 FROM post_listings WHERE post_listings.url = posts.url"
+        query += f" AND ({' OR '.join('(sort = ? AND timeframe = ?)' for _ in keys)})"
+        parameters += [item for key in keys for item in key]
+        if subreddits:
+            query += f" AND post_listings.subreddit IN ({', '.join('?' for _ in subreddits)})"
+            parameters += subreddits
+        if max_rank is not None:
+            query += " AND rank < ?"
+            parameters.append(max_rank)
+        query += ")"
+    elif subreddits:
+        query += f" AND lower(subreddit) IN ({', '.join('?' for _ in subreddits)})"
+        parameters += subreddits
+    if exclude:
+        query += f" AND url NOT IN ({', '.join('?' for _ in exclude)})"
+        parameters += list(exclude)
+    rows = get_connection().execute(query + " ORDER BY RANDOM() LIMIT ?", (*parameters, limit)).fetchall()  # nosec B608
+    return [dict(row) for row in rows]
+
+
+def find_settled_urls(urls):
+    # urls already downloaded, found too small, failed or claimed by another job; unknown urls count as pending
+    settled = set()
+    urls = list(urls)
+    expired = time.time() - CLAIM_TIMEOUT
+    for start in range(0, len(urls), 500):
+        chunk = urls[start : start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        query = f"SELECT url FROM posts WHERE status != 'pending' AND NOT (status = 'in-progress' AND claimed_at < ?) AND url IN ({placeholders})"  # nosec B608
+        settled.update(row["url"] for row in get_connection().execute(query, (expired, *chunk)))
+    return settled
+
+
+def find_image_by_sha256(sha256):
+    row = get_connection().execute("SELECT path FROM images WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()
+    return row["path"] if row else None
+
+
+def find_phash_candidates(phash):
+    clauses = " OR ".join("(band = ? AND value = ?)" for _ in range(PHASH_BANDS))
+    parameters = [item for band_value in phash_bands(phash) for item in band_value]
+    rows = get_connection().execute(
+        f"SELECT DISTINCT images.path, images.phash FROM phash_bands JOIN images ON images.path = phash_bands.path WHERE {clauses}",  # nosec B608
+        parameters,
+    )
+    return [(row["path"], row["phash"] & ((1 << 64) - 1)) for row in rows]
+
+
+def get_unhashed_images():
+    return [row["path"] for row in get_connection().execute("SELECT path FROM images WHERE sha256 IS NULL")]
+
+
+def find_image_rows(filter_dict):
+    where, parameters = filter_clause(filter_dict)
+    return get_connection().execute(f"SELECT path, last_shown FROM images WHERE {where}", parameters).fetchall()  # nosec B608
+
+
+def image_matches(filepath, filter_dict):
+    where, parameters = filter_clause(filter_dict)
+    query = f"SELECT 1 FROM images WHERE path = ? AND {where}"  # nosec B608
+    return get_connection().execute(query, (filepath, *parameters)).fetchone() is not None
+
+
+def fill_shuffle_bag(bag, entries):
+    with transaction() as connection:
+        connection.execute("DELETE FROM shuffle_bags WHERE bag = ?", (bag,))
+        connection.executemany("INSERT OR REPLACE INTO shuffle_bags (bag, position, path) VALUES (?, ?, ?)", ((bag, p, path) for path, p in entries))
+
+
+def pop_shuffle_bag(bag, filter_dict, exclude=None):
+    # drawn entries stay in the bag until it is refilled, so add_to_shuffle_bag cannot put them
+    # back this cycle; entries that stopped matching the filter are dropped on the way
+    where, parameters = filter_clause(filter_dict)
+    with transaction() as connection:
+        while True:
+            row = connection.execute("SELECT path FROM shuffle_bags WHERE bag = ? AND drawn = 0 ORDER BY position LIMIT 1", (bag,)).fetchone()
+            if row is None:
+                return None
+            path = row["path"]
+            query = f"SELECT 1 FROM images WHERE path = ? AND {where}"  # nosec B608
+            if not connection.execute(query, (path, *parameters)).fetchone():
+                connection.execute("DELETE FROM shuffle_bags WHERE bag = ? AND path = ?", (bag, path))
+                continue
+            connection.execute("UPDATE shuffle_bags SET drawn = 1 WHERE bag = ? AND path = ?", (bag, path))
+            if path != exclude:
+                return path
+
+
+def get_shuffle_bags():
+    return [row["bag"] for row in get_connection().execute("SELECT DISTINCT bag FROM shuffle_bags")]
+
+
+def add_to_shuffle_bag(bag, filepath, position):
+    with transaction() as connection:
+        connection.execute("INSERT OR IGNORE INTO shuffle_bags (bag, position, path) VALUES (?, ?, ?)", (bag, position, filepath))
+
+
+def remove_from_shuffle_bag(bag, filepath):
+    # a drawn entry is kept, so an image that stops and starts matching again is not redrawn this cycle
+    with transaction() as connection:
+        connection.execute("DELETE FROM shuffle_bags WHERE bag = ? AND path = ? AND drawn = 0", (bag, filepath))
+
+
+def get_library_snapshot(directory):
+    # {path: (size, mtime_ns)} as last seen in directory, plus the directory's own mtime
+    connection = get_connection()
+    row = connection.execute("SELECT mtime_ns FROM library_directories WHERE directory = ?", (directory,)).fetchone()
+    rows = connection.execute("SELECT path, size, mtime_ns FROM library_files WHERE directory = ?", (directory,))
+    return {row["path"]: (row["size"], row["mtime_ns"]) for row in rows}, row["mtime_ns"] if row else None
+
+
+def get_library_file(filepath):
+    row = get_connection().execute("SELECT size, mtime_ns FROM library_files WHERE path = ?", (filepath,)).fetchone()
+    return (row["size"], row["mtime_ns"]) if row else None
+
+
+def update_library_snapshot(directory, changed, removed, directory_mtime_ns=None):
+    # changed is {path: (size, mtime_ns)}; new files are registered as images, removed ones dropped
+    with transaction() as connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO library_files (path, directory, size, mtime_ns) VALUES (?, ?, ?, ?)",
+            ((path, directory, size, mtime_ns) for path, (size, mtime_ns) in changed.items()),
+        )
+        connection.executemany("INSERT OR IGNORE INTO images (path) VALUES (?)", ((path,) for path in changed))
+        for path in removed:
+            connection.execute("DELETE FROM library_files WHERE path = ?", (path,))
+            remove_image(path)
+        if directory_mtime_ns is not None:
+            connection.execute("INSERT OR REPLACE INTO library_directories (directory, mtime_ns) VALUES (?, ?)", (directory, directory_mtime_ns))
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import pathlib
+import tempfile
+
+from PIL import Image, PngImagePlugin
+
+from wallgarden.config import THUMBNAIL_DIR_PATH
+
+# thumbnails follow the freedesktop layout: md5 of the file uri, with the
+# source mtime stored in the Thumb::MTime text chunk to detect stale entries
+THUMBNAIL_WIDTH = 200
+
+
+def get_thumbnail_path(filepath, width=THUMBNAIL_WIDTH):
+    uri = pathlib.Path(filepath).absolute().as_uri()
+    digest = hashlib.md5(uri.encode()).hexdigest()  # nosec B324
+    return os.path.join(THUMBNAIL_DIR_PATH, str(width), f"{digest}.png")
+
+
+def get_cached_thumbnail(filepath, width=THUMBNAIL_WIDTH):
+    thumbnail_path = get_thumbnail_path(filepath, width)
+    try:
+        mtime = str(int(os.path.getmtime(filepath)))
+        with Image.open(thumbnail_path) as thumbnail:
+            if thumbnail.text.get("Thumb::MTime") == mtime:
+                return thumbnail_path
+    except (OSError, AttributeError):
+        pass
+    return None
+
+
+def create_thumbnail(filepath, width=THUMBNAIL_WIDTH):
+    thumbnail_path = get_thumbnail_path(filepath, width)
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    mtime = str(int(os.path.getmtime(filepath)))
+    with Image.open(filepath) as image:
+        height = max(1, round(image.height * width / image.width))
+        image.draft("RGB", (width, height))
+        thumbnail = image.convert("RGB").resize((width, height), Image.Resampling.LANCZOS)
+
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Thumb::URI", pathlib.Path(filepath).absolute().as_uri())
+    info.add_text("Thumb::MTime", mtime)
+    # write to a temp file first so readers never see a half-written thumbnail
+    fd, temp_path = tempfile.mkstemp(suffix=".png", dir=os.path.dirname(thumbnail_path))
+    with os.fdopen(fd, "wb") as temp_file:
+        thumbnail.save(temp_file, "PNG", pnginfo=info)
+    os.replace(temp_path, thumbnail_path)
+    return thumbnail_path
+
+
+def ensure_thumbnail(filepath, width=THUMBNAIL_WIDTH):
+    return get_cached_thumbnail(filepath, width) or create_thumbnail(filepath, width)
@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from wallgarden.config import PROFILE
+
+# spans are only recorded with WALLGARDEN_PROFILE set or after enable(), a disabled span costs one flag check
+_enabled = PROFILE
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def is_enabled():
+    return _enabled
+
+
+@contextmanager
+def span(name):
+    if not _enabled:
+        yield
+        return
+    # nested spans are named after their parents, e.g. "download/resize"
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(name)
+    path = "/".join(stack)
+    started = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        with _lock:
+            _spans.append({"name": path, "start": started, "duration_s": duration, "thread": threading.current_thread().name})
+
+
+def get_spans():
+    with _lock:
+        return list(_spans)
+
+
+def reset():
+    # long running processes report per cycle, so spans do not pile up
+    with _lock:
+        _spans.clear()
+
+
+def summarize(spans=None):
+    # {name: (count, total seconds, max seconds)} in order of first completion, parents after children
+    summary = {}
+    for entry in get_spans() if spans is None else spans:
+        count, total, longest = summary.get(entry["name"], (0, 0.0, 0.0))
+        summary[entry["name"]] = (count + 1, total + entry["duration_s"], max(longest, entry["duration_s"]))
+    return summary
+
+
+def print_breakdown():
+    summary = summarize()
+    if not summary:
+        print("No timings recorded.")
+        return
+    print(f"{'stage':<40} {'count':>6} {'total':>10} {'max':>10}")
+    for name in sorted(summary):
+        count, total, longest = summary[name]
+        depth = name.count("/")
+        label = "  " * depth + name.rsplit("/", 1)[-1]
+        print(f"{label:<40} {count:>6} {total:>9.3f}s {longest:>9.3f}s")
+
+
+def write_jsonl(path):
+    with open(path, "a") as file:
+        for entry in get_spans():
+            file.write(json.dumps(entry) + "\n")
+
+
+def write_prometheus(path):
+    # node_exporter textfile format, replaced atomically so a scrape never sees half a file
+    lines = [
+        "# HELP wallgarden_stage_seconds Time spent in each stage during the last run.",
+        "# TYPE wallgarden_stage_seconds gauge",
+    ]
+    summary = summarize()
+    for name, (_, total, _) in sorted(summary.items()):
+        lines.append(f'wallgarden_stage_seconds{{stage="{name}"}} {total:.6f}')
+    lines += ["# HELP wallgarden_stage_count Times each stage ran during the last run.", "# TYPE wallgarden_stage_count gauge"]
+    for name, (count, _, _) in sorted(summary.items()):
+        lines.append(f'wallgarden_stage_count{{stage="{name}"}} {count}')
+    lines += ["# HELP wallgarden_last_run_timestamp_seconds When the last run finished.", "# TYPE wallgarden_last_run_timestamp_seconds gauge"]
+    lines.append(f"wallgarden_last_run_timestamp_seconds {time.time():.3f}")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(suffix=".prom", dir=directory)
+    with os.fdopen(fd, "w") as file:
+        file.write("\n".join(lines) + "\n")
+    os.chmod(temp_path, 0o644)  # nosec B103
+    os.replace(temp_path, path)
+
+
+def write_reports(breakdown=True, jsonl_path=None, textfile_path=None):
+    if breakdown:
+        print_breakdown()
+    try:
+        if jsonl_path:
+            write_jsonl(jsonl_path)
+        if textfile_path:
+            write_prometheus(textfile_path)
+    except OSError as e:
+        print(f"Error writing timings: {e}")
@@ -0,0 +1,157 @@
+import os
+import re
+import subprocess  # nosec B404
+
+from wallgarden import selection, store, timing
+from wallgarden.config import RENDITION_DIR_PATH
+from wallgarden.utils import ESCAPE_FLATPAK, is_gnome
+
+DRM_DIR = "/sys/class/drm/"
+BACKGROUND_SCHEMA = "org.gnome.desktop.background"
+BACKGROUND_KEYS = ("picture-uri", "picture-uri-dark")
+
+_background_settings = None
+
+
+@timing.span("set_background")
+def set_gnome_background(image_path):
+    if not is_gnome():
+        return
+    with timing.span("monitors"):
+        resolution = get_monitor_resolutions()
+    with timing.span("rendition"):
+        picture_path = find_rendition(image_path, resolution)
+    apply_gnome_background(image_path, picture_path)
+
+
+def apply_gnome_background(image_path, picture_path):
+    # picture_path is the already rendered file for image_path
+    try:
+        with timing.span("gsettings"):
+            write_background_settings(f"file://{picture_path}")
+    except subprocess.CalledProcessError as e:
+        print(f"Error setting GNOME background: {e}")
+    else:
+        store.set_current_image(image_path)
+
+
+def get_background_settings():
+    # in-process Gio.Settings, or None inside flatpak (where dconf is the sandbox's)
+    # or when PyGObject/the schema is unavailable
+    global _background_settings
+    if _background_settings is None:
+        _background_settings = False
+        if ESCAPE_FLATPAK:
+            return None
+        try:
+            import gi
+
+            gi.require_version("Gio", "2.0")
+            from gi.repository import Gio
+        except (ImportError, ValueError):
+            return None
+        schema_source = Gio.SettingsSchemaSource.get_default()
+        # Gio.Settings.new aborts the process on a missing schema, so look it up first
+        if schema_source and schema_source.lookup(BACKGROUND_SCHEMA, True):
+            _background_settings = Gio.Settings.new(BACKGROUND_SCHEMA)
+    return _background_settings or None
+
+
+def write_background_settings(picture_uri):
+    settings = get_background_settings()
+    if settings:
+        # both keys land in a single dconf write
+        settings.delay()
+        for key in BACKGROUND_KEYS:
+            settings.set_string(key, picture_uri)
+        settings.apply()
+        settings.sync()
+        return
+
+    for key in BACKGROUND_KEYS:
+        subprocess.run(ESCAPE_FLATPAK + ["gsettings", "set", BACKGROUND_SCHEMA, key, picture_uri], check=True)  # nosec B607, B603
+
+
+def get_current_wallgarden_background():
+    return store.get_set_image()
+
+
+def get_connected_resolutions():
+    # preferred mode of every connected output, largest first
+    resolution_pattern = re.compile(r"(\d+)x(\d+)")
+
+    resolutions = set()
+    if not os.path.isdir(DRM_DIR):
+        return []
+    for connector in os.listdir(DRM_DIR):
+        status_path = os.path.join(DRM_DIR, connector, "status")
+        modes_path = os.path.join(DRM_DIR, connector, "modes")
+        if not os.path.exists(status_path) or not os.path.exists(modes_path):
+            continue
+        with open(status_path, "r") as file:
+            if file.read().strip() != "connected":
+                continue
+        with open(modes_path, "r") as file:
+            match = resolution_pattern.match(file.readline().strip())
+            if match:
+                resolutions.add((int(match.group(1)), int(match.group(2))))
+
+    return sorted(resolutions, key=lambda r: r[0] * r[1], reverse=True)
+
+
+def get_monitor_resolutions():
+    connected_resolutions = get_connected_resolutions()
+    if connected_resolutions:
+        return connected_resolutions[0]
+
+    # Regex to extract resolution
+    resolution_pattern = re.compile(r"(\d+)x(\d+)")
+
+    width, height = (0, 0)
+    if not os.path.isdir(DRM_DIR):
+        return width, height
+    for card in os.listdir(DRM_DIR):
+        modes_path = os.path.join(DRM_DIR, card, "modes")
+        if os.path.exists(modes_path):
+            with open(modes_path, "r") as file:
+                for mode in file:
+                    match = resolution_pattern.match(mode.strip())
+                    if match:
+                        this_width, this_height = match.groups()
+                        this_width = int(this_width)
+                        this_height = int(this_height)
+                        if this_width * this_height > width * height:
+                            width = this_width
+                            height = this_height
+
+    return width, height
+
+
+def get_random_image(filter_dict=None, weighting="uniform"):
+    return selection.draw(filter_dict, weighting)
+
+
+def get_random_pinned_image(weighting="uniform"):
+    return get_random_image(filter_dict={"hidden": False, "pinned": True}, weighting=weighting)
+
+
+def get_rendition_path(image_path, resolution):
+    width, height = resolution
+    return os.path.join(RENDITION_DIR_PATH, f"{width}x{height}", os.path.basename(image_path))
+
+
+def find_rendition(image_path, resolution):
+    # existing renditions and images already at the right size are resolved
+    # without decoding anything, PIL is only loaded for a new resolution
+    if not resolution or not all(resolution):
+        return image_path
+    rendition_path = get_rendition_path(image_path, resolution)
+    if os.path.exists(rendition_path):
+        return rendition_path
+    properties = store.get_image_properties(image_path) or {}
+    if (properties.get("width"), properties.get("height")) == tuple(resolution):
+        return image_path
+
+    from wallgarden.core import get_rendition
+
+    return get_rendition(image_path, resolution)